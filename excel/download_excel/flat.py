@@ -0,0 +1,100 @@
+import csv
+import importlib.util
+import json
+from typing import IO, Any, Iterator, List, Tuple
+
+from django.db.models import F
+from upload_excel.models import CellRangeModel, ExcelSheetModel
+
+range_fields: Tuple[str, ...] = (
+    "excel_sheet_id", "cell_range_id_by_order", "cell_range_id",
+    "column_start", "column_end", "row_start", "row_end",
+    "min_col", "max_col", "min_row", "max_row",
+    "effective_cell_width", "effective_cell_height",
+) + CellRangeModel.flag_names
+flat_fields: Tuple[str, ...] = range_fields + ("cell_content",)
+
+content_types: dict[str, str] = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def has_parquet() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def import_pyarrow() -> Tuple[Any, Any]:
+    # pyarrow is optional and slow to import, so it is loaded by the
+    # first parquet export rather than with the views
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    return pa, pq
+
+
+def iter_flat_records(sheets: List[ExcelSheetModel],
+                      chunk_size: int = 2000) -> Iterator[dict[str, Any]]:
+    values: Iterator[dict[str, Any]] = CellRangeModel.objects.\
+        filter(excel_sheet__in=sheets).\
+        order_by("excel_sheet_id", "cell_range_id_by_order").\
+        values(*range_fields, cell_content=F("cell_text__text")).\
+        iterator(chunk_size=chunk_size)
+    for value in values:
+        value["excel_sheet_id"] = str(value["excel_sheet_id"])
+        value["cell_range_id"] = str(value["cell_range_id"])
+        yield value
+
+
+class Echo:
+    # csv.writer needs a file; this one hands the written line back
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv(records: Iterator[dict[str, Any]]) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    # BOM so that Excel opens the Japanese text as UTF-8
+    yield "﻿" + writer.writerow(flat_fields)
+    for record in records:
+        yield writer.writerow([record[field] for field in flat_fields])
+
+
+def iter_jsonl(records: Iterator[dict[str, Any]]) -> Iterator[str]:
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def get_parquet_schema() -> Any:
+    pa, _ = import_pyarrow()
+    types: dict[str, Any] = {
+        "excel_sheet_id": pa.string(),
+        "cell_range_id": pa.string(),
+        "column_start": pa.string(),
+        "column_end": pa.string(),
+        "row_start": pa.string(),
+        "row_end": pa.string(),
+        "cell_content": pa.string(),
+    }
+    types.update({flag: pa.bool_() for flag in CellRangeModel.flag_names})
+    return pa.schema([(field, types.get(field, pa.int64())) for field in flat_fields])
+
+
+def write_parquet(records: Iterator[dict[str, Any]],
+                  fp: IO[bytes],
+                  chunk_size: int = 2000) -> None:
+    if not has_parquet():
+        raise ImportError("pyarrow is required to export parquet files.")
+
+    # one row group per chunk keeps at most 'chunk_size' rows in memory
+    pa, pq = import_pyarrow()
+    schema: Any = get_parquet_schema()
+    with pq.ParquetWriter(fp, schema) as writer:
+        batch: List[dict[str, Any]] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if len(batch) > 0:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
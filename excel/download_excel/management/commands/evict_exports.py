@@ -0,0 +1,26 @@
+from typing import Any, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from download_excel.models import DownloadedExcelSheetModel
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Delete the least recently downloaded export artifacts "
+        "until their total size fits in the cache size."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--max-bytes",
+            type=int,
+            default=settings.EXPORT_CACHE_MAX_BYTES,
+            help="Total size of artifacts to keep. Defaults to EXPORT_CACHE_MAX_BYTES.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        evicted: List[str] = DownloadedExcelSheetModel.evict(options["max_bytes"])
+        for name in evicted:
+            self.stdout.write(f"evicted {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(evicted)} artifacts evicted."))
@@ -0,0 +1,82 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0009_cellsearchmodel"),
+        ("download_excel", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="artifact",
+            field=models.FileField(
+                blank=True,
+                max_length=255,
+                upload_to="exports/",
+                verbose_name="出力ファイル",
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="created_time",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="出力日時"
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="excel_sheet",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="downloads",
+                to="upload_excel.excelsheetmodel",
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="export_format",
+            field=models.CharField(
+                default="xlsx", max_length=10, verbose_name="出力形式"
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="file_size",
+            field=models.PositiveBigIntegerField(
+                default=0, verbose_name="ファイルサイズ"
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="last_accessed_time",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="Used to evict the least recently downloaded artifacts first.",
+                verbose_name="最終ダウンロード日時",
+            ),
+        ),
+        migrations.AddField(
+            model_name="downloadedexcelsheetmodel",
+            name="sheet_version",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="The version of the sheet when the artifact was exported.",
+                verbose_name="シートのバージョン",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="downloadedexcelsheetmodel",
+            constraint=models.UniqueConstraint(
+                fields=("excel_sheet", "sheet_version", "export_format"),
+                name="unique_export_artifact",
+            ),
+        ),
+    ]
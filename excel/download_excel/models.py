@@ -1,9 +1,17 @@
+import os
+import tempfile
 import uuid
-from typing import List, TypeVar
+from typing import IO, Callable, List, Optional, TypeVar
 
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, models, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from download_excel.writer import source_mtimes, writers
+from upload_excel.models import ExcelSheetModel
 
 _F = TypeVar("_F", bound=models.Field)
+_DESM = TypeVar("_DESM", bound="DownloadedExcelSheetModel")
 
 class DownloadedExcelSheetModel(models.Model):
     downloaded_key: _F = models.UUIDField(
@@ -13,5 +21,161 @@ class DownloadedExcelSheetModel(models.Model):
         null=False,
         default=uuid.uuid4(),
     )
+    excel_sheet: _F = models.ForeignKey(
+        ExcelSheetModel,
+        on_delete=models.CASCADE,
+        related_name="downloads",
+        null=True,
+    )
+    sheet_version: _F = models.PositiveIntegerField(
+        verbose_name="シートのバージョン",
+        blank=False,
+        null=False,
+        default=1,
+        help_text=(
+            "The version of the sheet when the artifact was exported."
+        )
+    )
+    export_format: _F = models.CharField(
+        verbose_name="出力形式",
+        blank=False,
+        null=False,
+        default="xlsx",
+        max_length=10,
+    )
+    artifact: _F = models.FileField(
+        verbose_name="出力ファイル",
+        blank=True,
+        upload_to="exports/",
+        max_length=255,
+    )
+    file_size: _F = models.PositiveBigIntegerField(
+        verbose_name="ファイルサイズ",
+        blank=False,
+        null=False,
+        default=0,
+    )
+    created_time: _F = models.DateTimeField(
+        verbose_name="出力日時",
+        blank=False,
+        null=False,
+        default=timezone.now,
+    )
+    last_accessed_time: _F = models.DateTimeField(
+        verbose_name="最終ダウンロード日時",
+        blank=False,
+        null=False,
+        default=timezone.now,
+        help_text=(
+            "Used to evict the least recently downloaded artifacts first."
+        )
+    )
+    artifact_dir: str = "exports"
+
     class Meta:
         db_table: str = "downloaded_excel_sheet"
+        constraints: List[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["excel_sheet", "sheet_version", "export_format"],
+                name="unique_export_artifact",
+            ),
+        ]
+
+    @classmethod
+    def get_artifact_name(cls, excel_sheet: ExcelSheetModel, export_format: str) -> str:
+        return os.path.join(cls.artifact_dir,
+                            str(excel_sheet.sheet_id),
+                            f"{excel_sheet.sheet_version}.{export_format}")
+
+    @classmethod
+    def write_artifact(cls,
+                       excel_sheet: ExcelSheetModel,
+                       export_format: str,
+                       name: str) -> int:
+        writer: Callable[[ExcelSheetModel, IO[bytes]], None] = writers[export_format]
+        path: str = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Written next to the destination and renamed, so a reader never
+        # sees a half written file.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                writer(excel_sheet, fp)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return os.path.getsize(path)
+
+    @classmethod
+    def get_or_create_artifact(cls,
+                               excel_sheet: ExcelSheetModel,
+                               export_format: str = "xlsx") -> _DESM:
+        if export_format not in writers:
+            raise KeyError(f"'export_format' must be one of {list(writers)}.")
+
+        artifact: Optional[_DESM] = cls.objects.filter(
+            excel_sheet=excel_sheet,
+            sheet_version=excel_sheet.sheet_version,
+            export_format=export_format).first()
+        if artifact is not None and default_storage.exists(artifact.artifact.name) \
+                and not artifact.is_outdated():
+            artifact.touch()
+            return artifact
+
+        name: str = cls.get_artifact_name(excel_sheet, export_format)
+        file_size: int = cls.write_artifact(excel_sheet, export_format, name)
+        if artifact is not None:
+            artifact.file_size = file_size
+            artifact.created_time = timezone.now()
+            artifact.save(update_fields=["file_size", "created_time"])
+            artifact.touch()
+            return artifact
+
+        try:
+            with transaction.atomic():
+                return cls.objects.create(downloaded_key=uuid.uuid4(),
+                                          excel_sheet=excel_sheet,
+                                          sheet_version=excel_sheet.sheet_version,
+                                          export_format=export_format,
+                                          artifact=name,
+                                          file_size=file_size)
+        except IntegrityError:
+            # the same artifact has been exported concurrently
+            return cls.objects.get(excel_sheet=excel_sheet,
+                                   sheet_version=excel_sheet.sheet_version,
+                                   export_format=export_format)
+
+    @classmethod
+    def evict(cls, max_bytes: int) -> List[str]:
+        total: int = cls.objects.aggregate(total=Sum("file_size"))["total"] or 0
+        evicted: List[str] = []
+        for artifact in cls.objects.order_by("last_accessed_time").iterator():
+            if total <= max_bytes:
+                break
+            total -= artifact.file_size
+            evicted.append(artifact.artifact.name)
+            artifact.delete_artifact()
+        return evicted
+
+    @property
+    def path(self) -> str:
+        return self.artifact.path
+
+    def is_outdated(self) -> bool:
+        get_mtime: Optional[Callable[[ExcelSheetModel], float]] = source_mtimes.get(self.export_format, None)
+        if get_mtime is None:
+            return False
+        return self.created_time.timestamp() < get_mtime(self.excel_sheet)
+
+    def touch(self) -> None:
+        self.last_accessed_time = timezone.now()
+        DownloadedExcelSheetModel.objects.\
+            filter(downloaded_key=self.downloaded_key).\
+            update(last_accessed_time=self.last_accessed_time)
+
+    def delete_artifact(self) -> None:
+        if self.artifact.name and default_storage.exists(self.artifact.name):
+            default_storage.delete(self.artifact.name)
+        self.delete()
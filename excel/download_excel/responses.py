@@ -0,0 +1,80 @@
+import os
+import re
+from typing import IO, Iterator, Optional, Tuple
+
+from django.http import (FileResponse, HttpRequest, HttpResponse,
+                         StreamingHttpResponse)
+from django.utils.http import quote_etag
+
+range_matcher = re.compile(r"^bytes=(\d*)-(\d*)$").match
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Only a single range is served partially; anything else gets the
+    # whole file, which RFC 9110 allows.
+    match = range_matcher(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if start == "" and end == "":
+        return None
+    if start == "":
+        # suffix range; the last 'end' bytes
+        length: int = int(end)
+        return (max(size - length, 0), size - 1)
+    end_idx: int = size - 1 if end == "" else min(int(end), size - 1)
+    return (int(start), end_idx)
+
+
+def iter_file_range(fp: IO[bytes],
+                    start: int,
+                    length: int,
+                    block_size: int = FileResponse.block_size) -> Iterator[bytes]:
+    try:
+        fp.seek(start)
+        while length > 0:
+            data: bytes = fp.read(min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        fp.close()
+
+
+def ranged_file_response(request: HttpRequest,
+                         path: str,
+                         filename: str,
+                         content_type: str,
+                         etag: Optional[str] = None) -> HttpResponse:
+    size: int = os.path.getsize(path)
+    header: str = request.headers.get("Range", "")
+    if_range: str = request.headers.get("If-Range", "")
+    # a stale 'If-Range' means the client's partial copy is outdated
+    use_range: bool = header != "" and (if_range == "" or (etag is not None and if_range == quote_etag(etag)))
+
+    bounds: Optional[Tuple[int, int]] = parse_range(header, size) if use_range else None
+    if bounds is None:
+        response: HttpResponse = FileResponse(open(path, "rb"),
+                                              as_attachment=True,
+                                              filename=filename,
+                                              content_type=content_type)
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    start, end = bounds
+    if start >= size or start > end:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    length: int = end - start + 1
+    response = StreamingHttpResponse(iter_file_range(open(path, "rb"), start, length),
+                                     status=206,
+                                     content_type=content_type)
+    response["Content-Length"] = str(length)
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
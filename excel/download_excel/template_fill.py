@@ -0,0 +1,121 @@
+import os
+from functools import lru_cache
+from typing import (TYPE_CHECKING, IO, Iterator, List, Optional, Tuple,
+                    TypeVar, Union)
+
+from django.conf import settings
+from upload_excel.models import CellRangeModel, ExcelSheetModel
+from upload_excel.utils.titles import find_title, get_section_title
+
+# openpyxl is imported when a template is read or filled, not with the views
+if TYPE_CHECKING:
+    from openpyxl import Workbook
+    from openpyxl.worksheet.cell_range import CellRange
+    from openpyxl.worksheet.worksheet import Worksheet
+
+_ESM = TypeVar("_ESM", bound=ExcelSheetModel)
+
+# title -> (worksheet title, coordinate of the cell the section is written to)
+_Layout = dict[str, Tuple[str, str]]
+# include_title, is_end_of_sheet, cell_content
+_Range = Tuple[bool, bool, str]
+
+
+def get_template_path(template_name: str) -> str:
+    return os.path.join(settings.ES_TEMPLATE_DIR, f"{template_name}.xlsx")
+
+
+def get_template_mtime(excel_sheet: _ESM) -> float:
+    return os.path.getmtime(get_template_path(excel_sheet.sheet_type))
+
+
+def get_merged_range(worksheet: "Worksheet", row: int, column: int) -> "CellRange":
+    from openpyxl.worksheet.cell_range import CellRange
+
+    for merged in worksheet.merged_cells.ranges:
+        if merged.min_row <= row <= merged.max_row and merged.min_col <= column <= merged.max_col:
+            return merged
+    return CellRange(min_col=column, min_row=row, max_col=column, max_row=row)
+
+
+def is_blank(worksheet: "Worksheet", cell_range: "CellRange") -> bool:
+    value: Optional[str] = worksheet.cell(row=cell_range.min_row, column=cell_range.min_col).value
+    return value is None or str(value).strip() == ""
+
+
+def find_target(worksheet: "Worksheet", title_range: "CellRange") -> str:
+    # A section is written to the blank cell below its title, or right of
+    # it when titles are stacked in a column.
+    from openpyxl.utils.cell import get_column_letter
+
+    below: CellRange = get_merged_range(worksheet, title_range.max_row + 1, title_range.min_col)
+    right: CellRange = get_merged_range(worksheet, title_range.min_row, title_range.max_col + 1)
+    target: CellRange = below
+    if not is_blank(worksheet, below) and is_blank(worksheet, right):
+        target = right
+    return f"{get_column_letter(target.min_col)}{target.min_row}"
+
+
+@lru_cache(maxsize=32)
+def compile_template(path: str, mtime: float) -> _Layout:
+    # 'mtime' is a part of the cache key, so a replaced template is compiled again.
+    from openpyxl import load_workbook
+
+    workbook: Workbook = load_workbook(path)
+    layout: _Layout = {}
+    for worksheet in workbook.worksheets:
+        for row in worksheet.iter_rows():
+            for cell in row:
+                title: Optional[str] = find_title(cell.value if isinstance(cell.value, str) else None)
+                if title is None or title in layout:
+                    continue
+                title_range: CellRange = get_merged_range(worksheet, cell.row, cell.column)
+                layout[title] = (worksheet.title, find_target(worksheet, title_range))
+    workbook.close()
+    return layout
+
+
+def get_layout(template_name: str) -> _Layout:
+    path: str = get_template_path(template_name)
+    return compile_template(path, os.path.getmtime(path))
+
+
+def iter_ranges(excel_sheet: _ESM, chunk_size: int = 2000) -> Iterator[_Range]:
+    return CellRangeModel.objects.\
+        filter(excel_sheet=excel_sheet).\
+        order_by("min_row", "min_col").\
+        values_list("include_title", "is_end_of_sheet", "cell_text__text").\
+        iterator(chunk_size=chunk_size)
+
+
+def get_sections(ranges: Iterator[_Range]) -> dict[str, str]:
+    # A section is made of the ranges between a title and the next one.
+    sections: dict[str, List[str]] = {}
+    current: Optional[List[str]] = None
+    for is_title, is_end_of_sheet, content in ranges:
+        if is_end_of_sheet or not content:
+            continue
+        title: Optional[str] = get_section_title(content, is_title)
+        if title is not None:
+            current = sections.setdefault(title, [])
+        elif current is not None:
+            current.append(content)
+    return {title: "\n".join(lines) for title, lines in sections.items()}
+
+
+def fill_template(excel_sheet: _ESM,
+                  fp: Union[str, IO[bytes]],
+                  chunk_size: int = 2000) -> None:
+    from openpyxl import load_workbook
+    from openpyxl.utils.cell import coordinate_to_tuple
+
+    layout: _Layout = get_layout(excel_sheet.sheet_type)
+    sections: dict[str, str] = get_sections(iter_ranges(excel_sheet, chunk_size))
+
+    workbook: Workbook = load_workbook(get_template_path(excel_sheet.sheet_type))
+    for title, (sheet_title, coordinate) in layout.items():
+        if title not in sections:
+            continue
+        row, column = coordinate_to_tuple(coordinate)
+        workbook[sheet_title].cell(row=row, column=column, value=sections[title])
+    workbook.save(fp)
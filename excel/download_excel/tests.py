@@ -1,3 +1,158 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from download_excel.models import DownloadedExcelSheetModel
+from download_excel.responses import ranged_file_response
+from upload_excel.models import ExcelSheetModel
+from upload_excel.tests import (asgi_get, create_sheet, make_workbook,
+                                sheet_sizes)
+from upload_excel.utils.queries import query_budget
+
+
+class QueryBudgetTests(TransactionTestCase):
+    # AsyncDownloadExcelView exports in a worker thread, which only sees
+    # committed rows, so the test does not run in a transaction.
+    def setUp(self) -> None:
+        self.media_root: str = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_download_get(self) -> None:
+        # The export reads the ranges with a single iterator, so a cold
+        # download costs the same for every size; a cached one less.
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                url: str = reverse("download_excel:download", kwargs={"user_id": str(esm.sheet_id)})
+                for label, budget in [("AsyncDownloadExcelView.get (export)", 6),
+                                      ("AsyncDownloadExcelView.get (cached)", 4)]:
+                    with query_budget(budget, label):
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    response.close()
+
+
+class FillTemplateTests(TestCase):
+    def setUp(self) -> None:
+        directory: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.template_path: str = os.path.join(directory, "templates", "profile.xlsx")
+        os.makedirs(os.path.dirname(self.template_path))
+        with open(self.template_path, "wb") as fp:
+            fp.write(make_workbook(20))
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(directory, "media"),
+                                              ES_TEMPLATE_DIR=os.path.dirname(self.template_path))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.esm: ExcelSheetModel = create_sheet(20)
+        self.url: str = reverse("download_excel:fill_template", kwargs={"user_id": str(self.esm.sheet_id)})
+
+    def test_if_none_match(self) -> None:
+        response: HttpResponse = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        etag: str = response["ETag"]
+
+        DownloadedExcelSheetModel.objects.all().delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        # answered before anything is exported
+        self.assertFalse(DownloadedExcelSheetModel.objects.exists())
+
+    def test_template_replaced(self) -> None:
+        response: HttpResponse = self.client.get(self.url)
+        response.close()
+        mtime: float = os.path.getmtime(self.template_path) + 10
+        os.utime(self.template_path, (mtime, mtime))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+
+class FlatExportTests(TestCase):
+    def test_asgi(self) -> None:
+        esm: ExcelSheetModel = create_sheet(60)
+        ranges: int = esm.cell_ranges.count()
+        for export_format in ["jsonl", "csv"]:
+            with self.subTest(export_format=export_format):
+                url: str = reverse("download_excel:export",
+                                   kwargs={"user_id": str(esm.sheet_id), "export_format": export_format})
+                status, body = asgi_get(url)
+                self.assertEqual(status, 200)
+                text: str = body.decode("utf-8-sig")
+                if export_format == "csv":
+                    # the header and the rows; a cell may hold line breaks
+                    self.assertEqual(len(list(csv.reader(io.StringIO(text)))), ranges + 1)
+                else:
+                    self.assertEqual(len(text.splitlines()), ranges)
+
+
+class RangedFileResponseTests(SimpleTestCase):
+    factory: RequestFactory = RequestFactory()
+    data: bytes = bytes(range(100))
+
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(self.data)
+        self.addCleanup(os.remove, self.path)
+
+    def get(self, **headers: str) -> HttpResponse:
+        response: HttpResponse = ranged_file_response(self.factory.get("/", **headers),
+                                                      self.path,
+                                                      filename="sheet.xlsx",
+                                                      content_type="application/octet-stream",
+                                                      etag="1-abc")
+        self.addCleanup(response.close)
+        return response
+
+    def test_range(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response.getvalue(), self.data[10:20])
+
+    def test_open_range(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=90-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 90-99/100")
+        self.assertEqual(response.getvalue(), self.data[90:])
+
+    def test_suffix_range(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=-30")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 70-99/100")
+        self.assertEqual(response.getvalue(), self.data[70:])
+
+    def test_unsatisfiable_range(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=100-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_if_range(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"1-abc"')
+        self.assertEqual(response.status_code, 206)
+        # the client's partial copy is of another version
+        response = self.get(HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"0-abc"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.getvalue(), self.data)
+
+    def test_multiple_ranges(self) -> None:
+        response: HttpResponse = self.get(HTTP_RANGE="bytes=0-9,20-29")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response.getvalue(), self.data)
@@ -5,6 +5,26 @@ app_name = "download_excel"
 urlpatterns = [
     path(
         "user=?<str:user_id>?/download-excel/",
-        views.DownloadExcelView.as_view(), name="download"
+        views.AsyncDownloadExcelView.as_view(), name="download"
     ),
-]
\ No newline at end of file
+    path(
+        "bulk-download-excel/",
+        views.BulkDownloadExcelView.as_view(), name="bulk_download"
+    ),
+    path(
+        "user=?<str:user_id>?/fill-template/",
+        views.FillTemplateView.as_view(), name="fill_template"
+    ),
+    path(
+        "bulk-fill-template/",
+        views.BulkFillTemplateView.as_view(), name="bulk_fill_template"
+    ),
+    path(
+        "user=?<str:user_id>?/export-<str:export_format>/",
+        views.FlatExportView.as_view(), name="export"
+    ),
+    path(
+        "export-<str:export_format>/",
+        views.FlatExportView.as_view(), name="bulk_export"
+    ),
+]
@@ -1,23 +1,257 @@
+import os
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import (Any, Callable, Iterator, List, Optional, Tuple, TypeVar,
+                    Union)
 
-from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
-
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse
-from django.shortcuts import redirect, render
+from django.http import (FileResponse, Http404, HttpRequest, HttpResponse,
+                         JsonResponse, StreamingHttpResponse)
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.generic import TemplateView, View
+from download_excel import flat
+from download_excel.models import DownloadedExcelSheetModel
+from download_excel.responses import ranged_file_response
+from download_excel.template_fill import get_template_mtime
+from download_excel.writer import (content_types, extensions,
+                                   get_export_filename)
+from download_excel.zipstream import iter_zip
+from upload_excel.conditions import async_sheet_condition, sheet_condition
 from upload_excel.models import ExcelSheetModel
+from upload_excel.utils.spool import spool_lines
+from upload_excel.workers import run_in_worker
 
 # Create your views here.
 
+@sheet_condition
 class DownloadExcelView(TemplateView):
     template_name: str = "download_excel/download.html"
+    export_format: str = "xlsx"
 
     def get(self, request: HttpRequest,
             *args: Tuple[Any, ...],
             **kwargs: dict[str, Any]) -> HttpResponse:
-        context: dict[str, Any] = {}
         excel_id: str = self.kwargs.get("user_id", None)
+        esm: ExcelSheetModel = get_object_or_404(ExcelSheetModel, sheet_id=excel_id)
+
+        # an unchanged sheet is served from the artifact exported before
+        artifact: DownloadedExcelSheetModel = DownloadedExcelSheetModel.\
+            get_or_create_artifact(esm, export_format=self.export_format)
+        return ranged_file_response(request,
+                                    artifact.path,
+                                    filename=get_export_filename(esm, extensions[self.export_format]),
+                                    content_type=content_types[self.export_format],
+                                    etag=esm.etag)
+
+
+class AsyncDownloadExcelView(DownloadExcelView):
+    @async_sheet_condition
+    async def get(self, request: HttpRequest,
+                  *args: Tuple[Any, ...],
+                  **kwargs: dict[str, Any]) -> HttpResponse:
+        try:
+            esm: ExcelSheetModel = await ExcelSheetModel.objects.aget(sheet_id=self.kwargs.get("user_id", None))
+        except (ExcelSheetModel.DoesNotExist, ValidationError):
+            raise Http404("No ExcelSheetModel matches the given query.")
+
+        # exporting is CPU bound, so it runs on the bounded workers
+        artifact: DownloadedExcelSheetModel = await run_in_worker(
+            DownloadedExcelSheetModel.get_or_create_artifact, esm, export_format=self.export_format
+        )
+        return ranged_file_response(request,
+                                    artifact.path,
+                                    filename=get_export_filename(esm, extensions[self.export_format]),
+                                    content_type=content_types[self.export_format],
+                                    etag=esm.etag)
+
+
+class FillTemplateView(View):
+    export_format: str = "template"
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        excel_id: str = self.kwargs.get("user_id", None)
+        esm: ExcelSheetModel = get_object_or_404(ExcelSheetModel, sheet_id=excel_id)
+        try:
+            mtime: int = int(get_template_mtime(esm))
+        except FileNotFoundError:
+            raise Http404(f"No template workbook for '{esm.sheet_type}'.")
+
+        # the template may be replaced without any change of the sheet, so
+        # the check of the sheet's own etag in 'sheet_condition' won't do
+        etag: str = quote_etag(f"{esm.etag}-{mtime}")
+        response: Optional[HttpResponse] = get_conditional_response(request, etag=etag)
+        if response is None:
+            artifact: DownloadedExcelSheetModel = DownloadedExcelSheetModel.\
+                get_or_create_artifact(esm, export_format=self.export_format)
+            response = ranged_file_response(request,
+                                            artifact.path,
+                                            filename=get_export_filename(esm, extensions[self.export_format]),
+                                            content_type=content_types[self.export_format],
+                                            etag=etag)
+        response["ETag"] = etag
+        return response
+
+
+def export_artifact(excel_sheet: ExcelSheetModel, export_format: str) -> Tuple[str, str]:
+    # runs in a worker thread, which has its own DB connection
+    try:
+        artifact: DownloadedExcelSheetModel = DownloadedExcelSheetModel.\
+            get_or_create_artifact(excel_sheet, export_format=export_format)
+        return get_export_filename(excel_sheet, extensions[export_format]), artifact.path
+    finally:
+        connections.close_all()
+
+
+class BulkDownloadExcelView(View):
+    export_format: str = "xlsx"
+    archive_name: str = "sheets.zip"
+    max_sheets: int = 1000
+
+    def get_sheets(self, request: HttpRequest) -> QuerySet:
+        params: Any = request.POST if request.method == "POST" else request.GET
+        sheet_ids: List[str] = params.getlist("sheet_id")
+        sheet_type: Optional[str] = params.get("sheet_type", None)
+        updated_after: Optional[str] = params.get("updated_after", None)
+        updated_before: Optional[str] = params.get("updated_before", None)
+        if len(sheet_ids) == 0 and sheet_type is None and updated_after is None and updated_before is None:
+            raise ValueError(
+                "Either 'sheet_id' or a filter of 'sheet_type', 'updated_after' "
+                "or 'updated_before' is required."
+            )
+
+        sheets: QuerySet = ExcelSheetModel.objects.order_by("sheet_create_time")
+        if len(sheet_ids) > 0:
+            sheets = sheets.filter(sheet_id__in=sheet_ids)
+        if sheet_type is not None:
+            sheets = sheets.filter(sheet_type=sheet_type)
+        for key, lookup in [(updated_after, "sheet_update_time__gte"),
+                            (updated_before, "sheet_update_time__lt")]:
+            if key is None:
+                continue
+            time = parse_datetime(key)
+            if time is None:
+                raise ValueError(f"'{key}' is not an ISO 8601 datetime.")
+            if timezone.is_naive(time):
+                time = timezone.make_aware(time)
+            sheets = sheets.filter(**{lookup: time})
+        return sheets
+
+    def iter_entries(self, sheets: List[ExcelSheetModel]) -> Iterator[Tuple[str, str]]:
+        # Workbooks are added in the order they finish, not the requested one.
+        executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS)
+        errors: List[str] = []
+        try:
+            futures: dict[Future, ExcelSheetModel] = {
+                executor.submit(export_artifact, esm, self.export_format): esm
+                for esm in sheets
+            }
+            for future in as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    errors.append(f"{futures[future].sheet_id}: {e!r}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if len(errors) > 0:
+            # failures are reported inside the archive; the headers are gone
+            with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as fp:
+                fp.write("\n".join(errors) + "\n")
+            try:
+                yield "errors.txt", fp.name
+            finally:
+                os.remove(fp.name)
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        try:
+            sheets: List[ExcelSheetModel] = list(self.get_sheets(request)[:self.max_sheets + 1])
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except ValidationError as e:
+            return JsonResponse({"error": " ".join(e.messages)}, status=400)
+        if len(sheets) > self.max_sheets:
+            return JsonResponse({"error": f"At most {self.max_sheets} sheets can be exported at once."}, status=400)
+
+        response: StreamingHttpResponse = StreamingHttpResponse(
+            iter_zip(self.iter_entries(sheets)), content_type="application/zip"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{self.archive_name}"'
+        return response
+
+    def post(self, request: HttpRequest,
+             *args: Tuple[Any, ...],
+             **kwargs: dict[str, Any]) -> HttpResponse:
+        return self.get(request, *args, **kwargs)
+
+
+class BulkFillTemplateView(BulkDownloadExcelView):
+    export_format: str = "template"
+    archive_name: str = "filled_sheets.zip"
+
+
+class FlatExportView(BulkDownloadExcelView):
+    chunk_size: int = 2000
+    # the exports are assembled on disk beyond this size
+    spool_size: int = 1024 * 1024
+
+    def get_target_sheets(self, request: HttpRequest) -> List[ExcelSheetModel]:
+        excel_id: Optional[str] = self.kwargs.get("user_id", None)
         if excel_id is not None:
-            esm: ExcelSheetModel = ExcelSheetModel.objects.get(sheet_id=excel_id)
-        return render(request, self.template_name, context=context)
\ No newline at end of file
+            return [get_object_or_404(ExcelSheetModel, sheet_id=excel_id)]
+
+        sheets: List[ExcelSheetModel] = list(self.get_sheets(request)[:self.max_sheets + 1])
+        if len(sheets) > self.max_sheets:
+            raise ValueError(f"At most {self.max_sheets} sheets can be exported at once.")
+        return sheets
+
+    def get_filename(self, sheets: List[ExcelSheetModel], export_format: str) -> str:
+        if "user_id" in self.kwargs:
+            return get_export_filename(sheets[0], export_format)
+        return f"sheets.{export_format}"
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        export_format: str = self.kwargs["export_format"]
+        if export_format not in flat.content_types:
+            return JsonResponse({"error": f"'export_format' must be one of {list(flat.content_types)}."}, status=400)
+        if export_format == "parquet" and not flat.has_parquet():
+            return JsonResponse({"error": "pyarrow is not installed on this server."}, status=501)
+
+        try:
+            sheets: List[ExcelSheetModel] = self.get_target_sheets(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except ValidationError as e:
+            return JsonResponse({"error": " ".join(e.messages)}, status=400)
+
+        filename: str = self.get_filename(sheets, export_format)
+        records: Iterator[dict[str, Any]] = flat.iter_flat_records(sheets, chunk_size=self.chunk_size)
+        if export_format == "parquet":
+            # parquet writes its footer last, so it cannot be streamed
+            buffer: tempfile.SpooledTemporaryFile = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+            flat.write_parquet(records, buffer, chunk_size=self.chunk_size)
+            buffer.seek(0)
+            return FileResponse(buffer,
+                                as_attachment=True,
+                                filename=filename,
+                                content_type=flat.content_types[export_format])
+
+        # the records are read here, as the ASGI handler streams on the event loop
+        lines: Iterator[str] = flat.iter_csv(records) if export_format == "csv" else flat.iter_jsonl(records)
+        return FileResponse(spool_lines(lines, self.spool_size),
+                            as_attachment=True,
+                            filename=filename,
+                            content_type=flat.content_types[export_format])
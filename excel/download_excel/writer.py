@@ -0,0 +1,95 @@
+from typing import (TYPE_CHECKING, IO, Any, Callable, Iterator, List, Tuple,
+                    TypeVar, Union)
+
+from download_excel.template_fill import fill_template, get_template_mtime
+from upload_excel.models import (CellRangeModel, ExcelSheetModel,
+                                 empty_text_hash)
+
+# openpyxl is imported when a workbook is written, not with the views
+if TYPE_CHECKING:
+    from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+
+_ESM = TypeVar("_ESM", bound=ExcelSheetModel)
+
+xlsx_content_type: str = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+)
+# min_row, min_col, max_row, max_col, is_end_of_sheet, cell_content
+_Range = Tuple[int, int, int, int, bool, str]
+
+
+def iter_content_ranges(excel_sheet: _ESM,
+                        chunk_size: int = 2000) -> Iterator[_Range]:
+    # Ranges without text are gaps filled at ingestion, not merged cells.
+    return CellRangeModel.objects.\
+        filter(excel_sheet=excel_sheet).\
+        exclude(cell_text=empty_text_hash).\
+        order_by("min_row", "min_col").\
+        values_list("min_row", "min_col", "max_row", "max_col",
+                    "is_end_of_sheet", "cell_text__text").\
+        iterator(chunk_size=chunk_size)
+
+
+def iter_rows(ranges: Iterator[_Range],
+              worksheet: "WriteOnlyWorksheet") -> Iterator[List[Any]]:
+    # Ranges come sorted by their top row, so a row is complete as soon as
+    # a range starting below it shows up; only the current row is held.
+    from openpyxl.worksheet.cell_range import CellRange
+
+    current_row: int = 1
+    values: dict[int, str] = {}
+    min_row: int
+    min_col: int
+    max_row: int
+    max_col: int
+    for min_row, min_col, max_row, max_col, is_end_of_sheet, content in ranges:
+        while current_row < min_row:
+            yield [values.get(col, None) for col in range(1, max(values, default=0) + 1)]
+            values = {}
+            current_row += 1
+
+        values.setdefault(min_col, content)
+        # margins around the sheet overlap each other, so they are not merged
+        is_merged: bool = (max_row > min_row) or (max_col > min_col)
+        if is_merged and not is_end_of_sheet:
+            worksheet.merged_cells.add(CellRange(min_col=min_col, min_row=min_row,
+                                                 max_col=max_col, max_row=max_row))
+
+    if len(values) > 0:
+        yield [values.get(col, None) for col in range(1, max(values) + 1)]
+
+
+def write_workbook(excel_sheet: _ESM,
+                   fp: Union[str, IO[bytes]],
+                   chunk_size: int = 2000) -> None:
+    # write-only mode keeps rows out of memory; they are streamed to
+    # a temporary file by openpyxl until the archive is assembled.
+    from openpyxl import Workbook
+
+    workbook: Workbook = Workbook(write_only=True)
+    worksheet: "WriteOnlyWorksheet" = workbook.create_sheet(title=excel_sheet.sheet_type)
+    for row in iter_rows(iter_content_ranges(excel_sheet, chunk_size), worksheet):
+        worksheet.append(row)
+    workbook.save(fp)
+
+
+def get_export_filename(excel_sheet: _ESM, extension: str = "xlsx") -> str:
+    return f"{excel_sheet.sheet_type}_{excel_sheet.sheet_id}.{extension}"
+
+
+writers: dict[str, Callable[[_ESM, IO[bytes]], None]] = {
+    "xlsx": write_workbook,
+    "template": fill_template,
+}
+content_types: dict[str, str] = {
+    "xlsx": xlsx_content_type,
+    "template": xlsx_content_type,
+}
+extensions: dict[str, str] = {
+    "xlsx": "xlsx",
+    "template": "xlsx",
+}
+# Artifacts older than the files their format depends on are exported again.
+source_mtimes: dict[str, Callable[[_ESM], float]] = {
+    "template": get_template_mtime,
+}
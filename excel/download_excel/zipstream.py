@@ -0,0 +1,46 @@
+import io
+import zipfile
+from typing import Iterator, List, Tuple
+
+# (name in the archive, path of the file to store)
+_Entry = Tuple[str, str]
+
+
+class StreamBuffer(io.RawIOBase):
+    # A write-only sink which is not seekable, so that zipfile writes
+    # data descriptors instead of seeking back to patch local headers.
+    def __init__(self) -> None:
+        super().__init__()
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self) -> bytes:
+        output: bytes = b"".join(self.chunks)
+        self.chunks = []
+        return output
+
+
+def iter_zip(entries: Iterator[_Entry],
+             block_size: int = 64 * 1024,
+             compression: int = zipfile.ZIP_STORED) -> Iterator[bytes]:
+    # Entries are copied block by block and handed out right away; only one
+    # block of the archive is held at any time. xlsx is a zip file already,
+    # so it is stored without compressing it again by default.
+    buffer: StreamBuffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=compression, allowZip64=True) as archive:
+        for arcname, path in entries:
+            with open(path, "rb") as src, archive.open(arcname, mode="w", force_zip64=True) as dst:
+                while True:
+                    data: bytes = src.read(block_size)
+                    if not data:
+                        break
+                    dst.write(data)
+                    yield buffer.pop()
+            yield buffer.pop()
+    yield buffer.pop()
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "upload_excel.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -124,3 +125,35 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Exported files are cached under MEDIA_ROOT/exports and trimmed to this size
+# by 'python manage.py evict_exports'.
+EXPORT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# Threads generating workbooks for a bulk export.
+EXPORT_WORKERS = 4
+# Template workbooks filled by the 'template' export, one '<sheet_type>.xlsx'
+# for each name of ESTemplateNamesModel.
+ES_TEMPLATE_DIR = os.path.join(BASE_DIR, 'sheet_templates')
+# Edit history of a sheet older than this many versions is squashed
+# by 'python manage.py compact_history'.
+CONTENT_HISTORY_KEEP_VERSIONS = 20
+# Threads parsing uploads and rendering sheets for the async views.
+INGEST_WORKERS = 4
+# Processes of one deployment share their metrics through JSON files in this
+# directory; it should be emptied when the deployment starts. With None, each
+# process reports only its own requests on /metrics.
+METRICS_DIR = None
+# Seconds between two writes of a process's metrics file.
+METRICS_FLUSH_INTERVAL = 5
+# Profile the memory of every ingestion with tracemalloc and keep the result in
+# IngestDiagnosticsModel. A single upload asks for it with the header
+# 'X-ES-Memory-Profile: 1'. Tracing slows the whole process down while it runs.
+INGEST_MEMORY_PROFILE = False
+# Uploads over this size are spooled to a temporary file by Django and mapped
+# while they are parsed, so the raw workbook never sits in the heap. It is
+# lower than Django's 2.5 MB default, since a workbook inflates several times.
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+# Reader of uploaded workbooks: "native" parses the sheet XML straight into
+# arrays and hands files it does not support to openpyxl; "openpyxl" always
+# uses openpyxl.
+INGEST_READER = "native"
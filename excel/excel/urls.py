@@ -17,14 +17,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from upload_excel import views
+from upload_excel.metrics import metrics_view
 
 from excel import settings
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("", views.UploadExcelView.as_view(), name="index"),
+    path("", views.AsyncUploadExcelView.as_view(), name="index"),
     path("upload_excel/", include("upload_excel.urls")),
     path("download_excel/", include("download_excel.urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UploadExcelConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "upload_excel"
+
+    def ready(self) -> None:
+        # connects the query observer of the metrics to every new connection
+        from upload_excel import metrics  # noqa: F401
@@ -0,0 +1,171 @@
+import asyncio
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Awaitable, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.test import RequestFactory
+from django.urls import ResolverMatch, resolve, reverse
+from django.utils import timezone
+from upload_excel.models import ContentModel, ExcelSheetModel
+from upload_excel.utils.sheet_data import readers
+from upload_excel.utils.stages import StageRecorder, ingest_stages
+from upload_excel.utils.synthetic import WorkbookGenerator
+
+view_stages: tuple = ("display", "edit")
+startup_stages: Tuple[str, ...] = ("process", "setup", "urls")
+# libraries only the ingestion and the exports should load
+heavy_modules: Tuple[str, ...] = ("numpy", "openpyxl", "pyarrow")
+
+# Run in a fresh interpreter, since the modules of this process are loaded
+# already. It prints the seconds of django.setup() and of the URLconf, which
+# imports every view, and the heavy modules loaded by them.
+startup_script: str = """
+import importlib, json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+end = time.perf_counter()
+print(json.dumps({"setup": setup - start, "urls": end - setup,
+                  "heavy": [name for name in %r if name in sys.modules]}))
+"""
+
+
+async def _await(awaitable: Awaitable[HttpResponse]) -> HttpResponse:
+    return await awaitable
+
+
+def call_view(request: HttpRequest) -> HttpResponse:
+    # The routes may point to async views; they are awaited in place.
+    match: ResolverMatch = resolve(request.path_info)
+    response: Any = match.func(request, *match.args, **match.kwargs)
+    if asyncio.iscoroutine(response):
+        response = async_to_sync(_await)(response)
+    if response.status_code != 200:
+        raise RuntimeError(f"{request.method} {request.path_info} answered {response.status_code}.")
+    return response
+
+
+def time_views(excel_sheet: ExcelSheetModel, recorder: StageRecorder) -> None:
+    factory: RequestFactory = RequestFactory()
+    with recorder.stage("display"):
+        call_view(factory.get(reverse("upload_excel:upload", kwargs={"user_id": excel_sheet.sheet_id})))
+
+    content: Optional[ContentModel] = ContentModel.objects.\
+        filter(excel_sheet=excel_sheet, is_end_of_sheet=False).\
+        order_by("cell_range_id_by_order").\
+        first()
+    if content is None:
+        return
+    url: str = reverse("upload_excel:update", kwargs={"user_id": excel_sheet.sheet_id,
+                                                      "cell_id": content.cell_range_id_by_order,
+                                                      "cell_uuid": content.cell_range_id})
+    with recorder.stage("edit"):
+        call_view(factory.post(url, {"cell_content": "benchmark"}))
+
+
+def run_once(generator: WorkbookGenerator, reader: str = "native") -> dict[str, float]:
+    buffer: io.BytesIO = io.BytesIO()
+    generator.save(buffer)
+    buffer.seek(0)
+
+    recorder: StageRecorder = StageRecorder()
+    esm: ExcelSheetModel = ExcelSheetModel.create_from_binary(buffer, recorder=recorder, reader=reader)
+    if esm.sheet_reader != reader:
+        esm.delete()
+        raise RuntimeError(f"the {reader} reader handed the workbook to {esm.sheet_reader}.")
+    try:
+        time_views(esm, recorder)
+    finally:
+        esm.delete()
+    return dict(recorder.durations)
+
+
+def run_benchmark(repeat: int = 5, seed: int = 0, reader: str = "native", **params: Any) -> dict[str, Any]:
+    # Every round ingests the same workbook, so the rounds only differ by noise.
+    rounds: List[dict[str, float]] = [
+        run_once(WorkbookGenerator(seed=seed, **params), reader=reader) for _ in range(repeat)
+    ]
+    stages: dict[str, dict[str, float]] = {}
+    for name in ingest_stages + view_stages:
+        durations: List[float] = [durations[name] for durations in rounds if name in durations]
+        if len(durations) == 0:
+            continue
+        stages[name] = {
+            "median": statistics.median(durations),
+            "min": min(durations),
+            "max": max(durations),
+        }
+    return {
+        "params": dict(WorkbookGenerator(seed=seed, **params).params, seed=seed),
+        "reader": reader,
+        "repeat": repeat,
+        "created_time": timezone.now().isoformat(),
+        "stages": stages,
+    }
+
+
+def time_startup() -> dict[str, Any]:
+    start: float = time.perf_counter()
+    process: subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, "-c", startup_script % (heavy_modules, )],
+        cwd=settings.BASE_DIR, env=dict(os.environ), capture_output=True, text=True,
+    )
+    elapsed: float = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"the startup failed:\n{process.stderr}")
+    result: dict[str, Any] = json.loads(process.stdout.strip().splitlines()[-1])
+    result["process"] = elapsed
+    return result
+
+
+def run_startup_benchmark(repeat: int = 5) -> dict[str, Any]:
+    rounds: List[dict[str, Any]] = [time_startup() for _ in range(repeat)]
+    stages: dict[str, dict[str, float]] = {}
+    for name in startup_stages:
+        durations: List[float] = [result[name] for result in rounds]
+        stages[name] = {
+            "median": statistics.median(durations),
+            "min": min(durations),
+            "max": max(durations),
+        }
+    return {
+        "repeat": repeat,
+        "created_time": timezone.now().isoformat(),
+        "heavy_modules": sorted({name for result in rounds for name in result["heavy"]}),
+        "stages": stages,
+    }
+
+
+def compare(results: dict[str, Any],
+            baseline: dict[str, Any],
+            tolerance: float = 0.2) -> List[dict[str, Any]]:
+    rows: List[dict[str, Any]] = []
+    for name, current in results["stages"].items():
+        base: Optional[dict[str, float]] = baseline.get("stages", {}).get(name, None)
+        if base is None or base["median"] <= 0:
+            continue
+        ratio: float = current["median"] / base["median"]
+        rows.append({
+            "stage": name,
+            "baseline": base["median"],
+            "current": current["median"],
+            "ratio": ratio,
+            "regressed": ratio > 1.0 + tolerance,
+        })
+    return rows
+
+
+def compare_readers(repeat: int = 5, seed: int = 0, **params: Any) -> dict[str, dict[str, Any]]:
+    # The same workbook through each reader; openpyxl is the reference.
+    return {reader: run_benchmark(repeat=repeat, seed=seed, reader=reader, **params) for reader in readers}
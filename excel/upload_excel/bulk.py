@@ -0,0 +1,226 @@
+import io
+import os
+import time
+import traceback
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import IO, Any, Callable, List, Optional, Set, Tuple
+
+import django
+from django.db import connections, transaction
+from upload_excel.models import ExcelSheetModel
+from upload_excel.utils.hashing import hash_stream
+from upload_excel.utils.mapped import MappedFile
+from upload_excel.utils.sort import AbstractListMaker
+
+# Ingests a directory, or a ZIP archive, of workbooks in a process pool.
+# A sheet keeps the hash of the workbook it came from, so a rerun skips the
+# workbooks stored already and tries the failed ones again. A workbook found
+# twice in one run is ingested once.
+
+extensions: Tuple[str, ...] = (".xlsx", ".xlsm")
+statuses: Tuple[str, ...] = ("ingested", "skipped", "failed")
+
+
+def is_workbook(name: str) -> bool:
+    # '~$' files are the locks Excel leaves next to an open workbook
+    basename: str = os.path.basename(name)
+    return name.lower().endswith(extensions) and not basename.startswith("~$") and not name.startswith("__MACOSX/")
+
+
+def find_sources(path: str) -> List[dict[str, Any]]:
+    # A source is a workbook file, or a workbook inside a ZIP archive.
+    sources: List[dict[str, Any]] = []
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if not is_workbook(name):
+                    continue
+                file_path: str = os.path.join(root, name)
+                sources.append({"name": file_path, "path": file_path, "member": None,
+                                "size": os.path.getsize(file_path)})
+    elif is_workbook(path):
+        sources.append({"name": path, "path": path, "member": None, "size": os.path.getsize(path)})
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_workbook(info.filename):
+                    continue
+                sources.append({"name": os.path.join(path, info.filename), "path": path,
+                                "member": info.filename, "size": info.file_size})
+    else:
+        raise ValueError(f"{path} is neither a directory, a workbook nor a ZIP archive.")
+    return sources
+
+
+def open_source(source: dict[str, Any]) -> IO[bytes]:
+    if source["member"] is not None:
+        with zipfile.ZipFile(source["path"]) as archive:
+            return io.BytesIO(archive.read(source["member"]))
+    if source["size"] > 0:
+        return MappedFile(source["path"])
+    return open(source["path"], "rb")
+
+
+def init_worker() -> None:
+    # Forked workers inherit the configured Django; spawned ones set it up.
+    django.setup()
+
+
+def hash_source(source: dict[str, Any]) -> str:
+    binary: IO[bytes] = open_source(source)
+    try:
+        return hash_stream(binary)
+    finally:
+        binary.close()
+
+
+def get_stored_hashes(hashes: List[str], chunk_size: int = 500) -> Set[str]:
+    stored: Set[str] = set()
+    for start in range(0, len(hashes), chunk_size):
+        stored.update(
+            ExcelSheetModel.objects.
+            filter(source_hash__in=hashes[start:start + chunk_size]).
+            values_list("source_hash", flat=True)
+        )
+    return stored
+
+
+def plan_sources(sources: List[dict[str, Any]],
+                 resume: bool = True) -> Tuple[List[dict[str, Any]], List[dict[str, Any]]]:
+    # The sources are hashed here, before any is ingested, so a workbook
+    # found twice in one run is ingested once even with parallel workers.
+    # Returns the sources to ingest and the results of the others.
+    pending: List[dict[str, Any]] = []
+    results: List[dict[str, Any]] = []
+    first_names: dict[str, str] = {}
+    for source in sources:
+        start: float = time.perf_counter()
+        try:
+            source_hash: str = hash_source(source)
+        except Exception as e:
+            results.append({"name": source["name"], "size": source["size"], "status": "failed",
+                            "error": type(e).__name__, "message": str(e),
+                            "traceback": traceback.format_exc(),
+                            "seconds": time.perf_counter() - start})
+            continue
+        if source_hash in first_names:
+            results.append({"name": source["name"], "size": source["size"], "status": "skipped",
+                            "source_hash": source_hash, "duplicate_of": first_names[source_hash],
+                            "seconds": time.perf_counter() - start})
+            continue
+        first_names[source_hash] = source["name"]
+        pending.append(dict(source, source_hash=source_hash))
+
+    stored: Set[str] = get_stored_hashes([source["source_hash"] for source in pending]) if resume else set()
+    if len(stored) == 0:
+        return pending, results
+    for source in pending:
+        if source["source_hash"] in stored:
+            results.append({"name": source["name"], "size": source["size"], "status": "skipped",
+                            "source_hash": source["source_hash"], "seconds": 0.0})
+    return [source for source in pending if source["source_hash"] not in stored], results
+
+
+def ingest_source(source: dict[str, Any],
+                  sheet_type: str = "profile",
+                  reader: Optional[str] = None) -> dict[str, Any]:
+    # Errors come back in the result, so that one workbook never stops the run.
+    start: float = time.perf_counter()
+    result: dict[str, Any] = {"name": source["name"], "size": source["size"]}
+    binary: Optional[IO[bytes]] = None
+    try:
+        binary = open_source(source)
+        if source.get("source_hash", None) is not None:
+            result["source_hash"] = source["source_hash"]
+        else:
+            result["source_hash"] = hash_stream(binary)
+            binary.seek(0)
+        # a workbook failing half way leaves no sheet behind
+        with transaction.atomic():
+            sheet_id: Any = ExcelSheetModel.create_from_binary(binary,
+                                                               sheet_type=sheet_type,
+                                                               reader=reader,
+                                                               source_hash=result["source_hash"]).sheet_id
+        result["status"] = "ingested"
+        result["sheet_id"] = str(sheet_id)
+    except Exception as e:
+        result.update(status="failed", error=type(e).__name__, message=str(e), traceback=traceback.format_exc())
+    finally:
+        if binary is not None:
+            binary.close()
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+class IngestProgress(AbstractListMaker):
+    # The finished workbooks are the values, so the bar and the remaining
+    # time of AbstractListMaker follow the run.
+    def __init__(self,
+                 max_size: int,
+                 write: Optional[Callable[[str], None]] = None) -> None:
+        super().__init__(max_size=max_size, init=[])
+        self.write: Optional[Callable[[str], None]] = write
+        self.counts: dict[str, int] = {status: 0 for status in statuses}
+        self.ingested_bytes: int = 0
+
+    def add_result(self, result: dict[str, Any]) -> None:
+        self.add(result["name"])
+        self.counts[result["status"]] += 1
+        if result["status"] == "ingested":
+            self.ingested_bytes += result["size"]
+        self.progress_bar()
+
+    @property
+    def files_per_second(self) -> float:
+        return self.list_size / max(self.total_time, 1e-9)
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.ingested_bytes / max(self.total_time, 1e-9)
+
+    def progress_text(self) -> str:
+        counts: str = " ".join(f"{status} {count}" for status, count in self.counts.items())
+        return f"{super().progress_text().rstrip()}  {self.files_per_second:.2f} files/s  {counts}  "
+
+    def progress_bar(self) -> None:
+        if self.write is not None:
+            self.write(self.progress_text())
+
+
+def run_ingestion(sources: List[dict[str, Any]],
+                  on_result: Callable[[dict[str, Any]], None],
+                  sheet_type: str = "profile",
+                  reader: Optional[str] = None,
+                  workers: int = 1,
+                  resume: bool = True) -> None:
+    pending: List[dict[str, Any]]
+    results: List[dict[str, Any]]
+    pending, results = plan_sources(sources, resume)
+    for planned in results:
+        on_result(planned)
+
+    # With no workers, the workbooks are ingested in this process.
+    if workers == 0:
+        for source in pending:
+            on_result(ingest_source(source, sheet_type, reader))
+        return
+
+    # the connections of this process must not be shared with forked workers
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures: dict[Future, dict[str, Any]] = {
+            executor.submit(ingest_source, source, sheet_type, reader): source
+            for source in pending
+        }
+        for future in as_completed(futures):
+            try:
+                result: dict[str, Any] = future.result()
+            except Exception as e:
+                # the worker died, e.g. killed for its memory, which breaks
+                # the pool; the workbooks left are reported as failed too
+                source: dict[str, Any] = futures[future]
+                result = {"name": source["name"], "size": source["size"], "status": "failed",
+                          "error": type(e).__name__, "message": str(e), "seconds": 0.0}
+            on_result(result)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+from upload_excel.models import ExcelSheetModel
+
+_validators_attr: str = "_excel_sheet_validators"
+
+
+def _get_sheet_validators(request: HttpRequest,
+                          user_id: str) -> Optional[dict[str, Any]]:
+    # 'condition' asks for the etag and the last modified time separately,
+    # so the validators are cached on the request to query them only once.
+    if not hasattr(request, _validators_attr):
+        setattr(request, _validators_attr, ExcelSheetModel.get_validators(user_id))
+    return getattr(request, _validators_attr)
+
+
+def sheet_etag(request: HttpRequest,
+               *args: Tuple[Any, ...],
+               user_id: str = "",
+               **kwargs: dict[str, Any]) -> Optional[str]:
+    validators: Optional[dict[str, Any]] = _get_sheet_validators(request, user_id)
+    if validators is None:
+        return None
+    return ExcelSheetModel.make_etag(user_id, validators["sheet_version"])
+
+
+def sheet_last_modified(request: HttpRequest,
+                        *args: Tuple[Any, ...],
+                        user_id: str = "",
+                        **kwargs: dict[str, Any]) -> Optional[datetime]:
+    validators: Optional[dict[str, Any]] = _get_sheet_validators(request, user_id)
+    if validators is None:
+        return None
+    return validators["sheet_update_time"]
+
+
+# 304 is answered before the decorated handler builds any display or tree.
+sheet_condition = method_decorator(
+    condition(etag_func=sheet_etag, last_modified_func=sheet_last_modified),
+    name="get"
+)
+
+
+def async_sheet_condition(func: Callable[..., Awaitable[HttpResponse]]) -> Callable[..., Awaitable[HttpResponse]]:
+    # 'condition' calls the view synchronously, so an async handler is
+    # wrapped here with the same checks and headers.
+    @wraps(func)
+    async def inner(self: Any, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        validators: Optional[dict[str, Any]] = await sync_to_async(_get_sheet_validators)(
+            request, kwargs.get("user_id", "")
+        )
+        etag: Optional[str] = sheet_etag(request, *args, **kwargs)
+        etag = quote_etag(etag) if etag is not None else None
+        last_modified: Optional[int] = None
+        if validators is not None:
+            last_modified = int(validators["sheet_update_time"].timestamp())
+
+        response: Optional[HttpResponse] = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = await func(self, request, *args, **kwargs)
+
+        if request.method in ("GET", "HEAD"):
+            if last_modified and not response.has_header("Last-Modified"):
+                response.headers["Last-Modified"] = http_date(last_modified)
+            if etag:
+                response.headers.setdefault("ETag", etag)
+        return response
+
+    return inner
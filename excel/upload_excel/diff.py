@@ -0,0 +1,76 @@
+from typing import Any, List, Tuple, TypeVar
+
+from django.db.models import F
+from upload_excel.models import CellRangeModel, ExcelSheetModel, empty_text_hash
+
+_ESM = TypeVar("_ESM", bound=ExcelSheetModel)
+
+diff_fields: Tuple[str, ...] = (
+    "cell_range_id_by_order", "cell_range_id", "coord_hash",
+    "column_start", "column_end", "row_start", "row_end",
+)
+
+
+def get_entries(excel_sheet: _ESM, chunk_size: int = 2000) -> dict[str, dict[str, Any]]:
+    # Margins around the sheet are not contents, so they are left out.
+    return {
+        value["coord_hash"]: value
+        for value in CellRangeModel.objects.
+        filter(excel_sheet=excel_sheet, is_end_of_sheet=False).
+        order_by("cell_range_id_by_order").
+        values(*diff_fields, content_hash=F("cell_text_id"), cell_content=F("cell_text__text")).
+        iterator(chunk_size=chunk_size)
+    }
+
+
+def describe(value: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "cell_range_id_by_order": value["cell_range_id_by_order"],
+        "cell_range_id": str(value["cell_range_id"]),
+        "coord": f"{value['column_start']}{value['row_start']}:{value['column_end']}{value['row_end']}",
+        "content": value["cell_content"],
+    }
+
+
+def diff_entries(old: dict[str, dict[str, Any]],
+                 new: dict[str, dict[str, Any]]) -> dict[str, List[dict[str, Any]]]:
+    # Ranges at the same bounds are compared by their content hash; the
+    # rest are paired by content hash to find moved cells. Blank ranges
+    # only fill gaps of a layout, so they never count as added or removed.
+    edited: List[dict[str, Any]] = [
+        {"old": describe(old[coord]), "new": describe(new[coord])}
+        for coord in old.keys() & new.keys()
+        if old[coord]["content_hash"] != new[coord]["content_hash"]
+    ]
+
+    removed_by_content: dict[str, List[dict[str, Any]]] = {}
+    for coord in old.keys() - new.keys():
+        if old[coord]["content_hash"] != empty_text_hash:
+            removed_by_content.setdefault(old[coord]["content_hash"], []).append(old[coord])
+
+    moved: List[dict[str, Any]] = []
+    added: List[dict[str, Any]] = []
+    for coord in new.keys() - old.keys():
+        value: dict[str, Any] = new[coord]
+        if value["content_hash"] == empty_text_hash:
+            continue
+        candidates: List[dict[str, Any]] = removed_by_content.get(value["content_hash"], [])
+        if len(candidates) > 0:
+            moved.append({"old": describe(candidates.pop(0)), "new": describe(value)})
+        else:
+            added.append(describe(value))
+
+    removed: List[dict[str, Any]] = [
+        describe(value) for values in removed_by_content.values() for value in values
+    ]
+
+    return {
+        "added": sorted(added, key=lambda item: item["cell_range_id_by_order"]),
+        "removed": sorted(removed, key=lambda item: item["cell_range_id_by_order"]),
+        "moved": sorted(moved, key=lambda item: item["new"]["cell_range_id_by_order"]),
+        "edited": sorted(edited, key=lambda item: item["new"]["cell_range_id_by_order"]),
+    }
+
+
+def diff_sheets(old_sheet: _ESM, new_sheet: _ESM) -> dict[str, List[dict[str, Any]]]:
+    return diff_entries(get_entries(old_sheet), get_entries(new_sheet))
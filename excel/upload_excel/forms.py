@@ -9,31 +9,58 @@ class UploadForm(forms.Form):
         widget=forms.ClearableFileInput(attrs={'multiple': True}))
 
 
-class ColumnForm(forms.ModelForm):
+class _AxisForm(forms.ModelForm):
+    # Columns and rows share 'cell_range' with prefixed names,
+    # so their bounds are edited through the proxy's aliases.
+    cell_start = forms.CharField(max_length=10)
+    cell_end = forms.CharField(max_length=10)
+    alias_fields: Tuple[str, ...] = ("cell_start", "cell_end")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        if self.instance.pk is not None:
+            for field in self.alias_fields:
+                self.initial.setdefault(field, getattr(self.instance, field))
+
+    def save(self, commit: bool = True):
+        for field in self.alias_fields:
+            setattr(self.instance, field, self.cleaned_data[field])
+        return super().save(commit)
+
+
+class ColumnForm(_AxisForm):
+    cell_start = forms.RegexField(regex=r"^[A-Z]+$", max_length=10)
+    cell_end = forms.RegexField(regex=r"^[A-Z]+$", max_length=10)
+
     class Meta:
         model: ColumnModel = ColumnModel
-        fields: Tuple[str, ...] = (
-            "cell_start", "cell_end"
-        )
+        fields: Tuple[str, ...] = ()
+
 
+class RowForm(_AxisForm):
+    cell_start = forms.RegexField(regex=r"^[0-9]+$", max_length=10)
+    cell_end = forms.RegexField(regex=r"^[0-9]+$", max_length=10)
 
-class RowForm(forms.ModelForm):
     class Meta:
         model: RowModel = RowModel
-        fields: Tuple[str, ...] = (
-            "cell_start", "cell_end"
-        )
+        fields: Tuple[str, ...] = ()
 
 
 class ContentForm(forms.ModelForm):
+    # The text lives in the shared string table, so it is not a model field.
+    cell_content = forms.CharField(required=False)
+
     class Meta:
         model: ContentModel = ContentModel
-        fields: Tuple[str, ...] = (
-            "cell_content",
-        )
+        fields: Tuple[str, ...] = ()
 
     def __init__(self, *args, initial_text: str = "", **kwargs):
         super().__init__(*args, **kwargs)
 
         self.fields['cell_content'].initial = initial_text
         self.fields['cell_content'].widget = forms.Textarea(attrs={'cols': '100', 'rows': '20'})
+
+    def save(self, commit: bool = True):
+        self.instance.cell_content = self.cleaned_data["cell_content"]
+        return super().save(commit)
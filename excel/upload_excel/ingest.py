@@ -0,0 +1,380 @@
+import re
+import string
+import uuid
+from typing import Any, List, Optional, Tuple, Type, TypeVar, Union
+
+import numpy as np
+from django.conf import settings
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+from upload_excel import metrics
+from upload_excel.models import (CellRangeModel, CellSearchModel,
+                                 CellTextModel, ExcelSheetModel,
+                                 IngestDiagnosticsModel, SheetRasterModel)
+from upload_excel.utils.cell_tree import CellNode, CellTree
+from upload_excel.utils.raster import dump_cell_map, dump_raster
+from upload_excel.utils.sheet_data import (SheetData, as_sheet_data,
+                                           load_sheet_data)
+from upload_excel.utils.sort import A2ZListMaker
+from upload_excel.utils.stages import MemoryStageRecorder, StageRecorder
+
+# The ingestion of a workbook. numpy and openpyxl are imported here and not
+# by the models, so that only the processes ingesting workbooks load them.
+
+_CRM = TypeVar("_CRM", bound=CellRangeModel)
+_ESM = TypeVar("_ESM", bound=ExcelSheetModel)
+
+# 改行パターン
+br_pattern: str = "?#$%&@!?*+"
+
+
+getters = {
+    "digit": re.compile(r"\d+").findall,
+    "alphabet": re.compile(r"([A-Z]+)").findall
+}
+
+
+def get_bound_items(cell_range: CellRange,
+                    bound_type: str = "digit") -> Tuple[str, str]:
+    # preparations
+    if bound_type not in getters:
+        raise KeyError("'bound_type' must be either ''digit' or 'alphabet'")
+
+    getter: str = getters[bound_type]
+    str_coord: str = cell_range.coord
+
+    if ":" not in str_coord:
+        str_coord = ":".join([str_coord, str_coord])
+
+    # set
+    start: str
+    end: str
+    start, end = str_coord.split(":")
+    start = getter(start)[0]
+    end = getter(end)[0]
+
+    return start, end
+
+
+def get_cell_value(val: Optional[Any], concat_size: int = 0) -> Optional[str]:
+    output: str = ""
+    if val is not None:
+        if concat_size > 0:
+            output += br_pattern
+        output += str(val)
+    return output
+
+
+def get_text(val):
+    output = ""
+    if val is not None:
+        output += str(val)
+    return output
+
+
+def create_from_binary(model: Type[_ESM],
+                       binary: Any,
+                       sheet_type: str = "profile",
+                       recorder: Optional[StageRecorder] = None,
+                       reader: Optional[str] = None,
+                       source_hash: Optional[str] = None) -> _ESM:
+    recorder = recorder if recorder is not None else StageRecorder()
+    sheet: Optional[SheetData] = None
+    # closed on a failure as well, which gives tracemalloc and the open
+    # archive or map of the sheet back
+    try:
+        with recorder.stage("load"):
+            sheet = load_sheet_data(binary, reader=reader or settings.INGEST_READER)
+
+        excel_sheet_model: _ESM = model(sheet_id=uuid.uuid4(),
+                                        sheet_type=sheet_type,
+                                        col_size=sheet.max_column,
+                                        row_size=sheet.max_row,
+                                        source_hash=source_hash)
+        excel_sheet_model.excel_matrix =\
+            np.zeros((100, sheet.max_column))
+        excel_sheet_model.save(force_update=True)
+
+        excel_sheet_model.sheet_reader = sheet.reader
+        create_cell_ranges(excel_sheet_model, sheet, recorder=recorder)
+    finally:
+        if sheet is not None:
+            sheet.close()
+        recorder.close()
+    if isinstance(recorder, MemoryStageRecorder):
+        IngestDiagnosticsModel.record(excel_sheet_model, recorder)
+    return excel_sheet_model
+
+
+def create_cell_ranges(excel_sheet: ExcelSheetModel,
+                       worksheet: Union[SheetData, Worksheet],
+                       recorder: Optional[StageRecorder] = None) -> None:
+    recorder = recorder if recorder is not None else StageRecorder()
+    sheet: SheetData = as_sheet_data(worksheet)
+
+    with recorder.stage("raster"):
+        list_maker = A2ZListMaker(max_size=sheet.max_column, init=string.ascii_uppercase)
+        list_maker.create()
+        excel_array, out_map, rect = create_raster(excel_sheet, sheet, list_maker)
+
+    with recorder.stage("gap_fill"):
+        fill_gaps(excel_array, out_map, rect, list_maker)
+
+    # ここでリサイズは完了してる。横の幅は葉の数なので、これ以上は小さくならない
+    with recorder.stage("tree"):
+        tree = CellTree.create_tree(excel_array,
+                                    child_rate=excel_sheet.child_rate,
+                                    cell_content=out_map)
+
+    with recorder.stage("classify"):
+        cell_range_models: List[CellRangeModel] = [
+            build_cell_range(CellRangeModel,
+                             excel_sheet,
+                             sheet=sheet,
+                             cell_range=outs["merged_cell"],
+                             idx=idx,
+                             node=tree.tree[idx])
+            for idx, outs in out_map.items()
+        ]
+
+    with recorder.stage("persist"):
+        CellTextModel.intern([crm.cell_content for crm in cell_range_models])
+        CellRangeModel.objects.bulk_create(cell_range_models, batch_size=excel_sheet.bulk_batch_size)
+        CellSearchModel.index_cell_ranges(cell_range_models, is_new=True)
+        # kept so that the sheet can be analysed again without its workbook
+        SheetRasterModel.record(excel_sheet, dump_raster(tree.excel_array), dump_cell_map(out_map))
+
+    metrics.observe_ingestion(recorder.durations, ranges=len(cell_range_models), nodes=len(tree.tree))
+
+
+def create_raster(excel_sheet: ExcelSheetModel,
+                  sheet: SheetData,
+                  list_maker: A2ZListMaker) -> Tuple[np.ndarray, dict[int, dict[str, Any]], dict[str, int]]:
+    cell_ranges: MultiCellRange = sheet.merged_cells
+    excel_array = np.zeros((sheet.max_row, sheet.max_column))
+    ranges: CellRange
+    idx: int
+
+    coord_list: List[str] = []
+    for idx, ranges in enumerate(cell_ranges):
+        coords = ranges.coord.split(":")
+
+        out = []
+        for c in coords:
+            out += getters["alphabet"](c)
+            out += getters["digit"](c)
+        coord_list.append(out)
+
+    out_map = {}
+    rect: dict[str, int] = {
+        "min_row": 10000,
+        "max_row": 0,
+        "min_col": 10000,
+        "max_col": 0
+    }
+    for n, out in enumerate(coord_list):
+        cs, rs, ce, re = out
+        txt = ""
+        for values in sheet.iter_values(cell_ranges.ranges[n]):
+            for value in values:
+                txt += get_text(value)
+
+        if len(txt) < 1 or excel_sheet.is_ng_sentence(txt):
+            continue
+
+        cs = list_maker.values.index(cs)
+        ce = list_maker.values.index(ce) + 1
+        rs = int(rs) - 1
+        re = int(re)
+
+        rect["min_row"] = min([rect["min_row"], rs])
+        rect["max_row"] = max([rect["max_row"], re])
+        rect["min_col"] = min([rect["min_col"], cs])
+        rect["max_col"] = max([rect["max_col"], ce])
+
+        # TODO null部分を縦1x横上に合わせて最大の長方形として全て定義し直す。値は空。
+        array_mask = excel_array[rs:re, cs:ce] == 0
+        excel_array[rs:re, cs:ce][array_mask] = n + 1
+        out_map[n + 1] = {
+            "text": txt, "ranges": [(cs, ce), (rs, re)],
+            "merged_cell": cell_ranges.ranges[n]
+        }
+
+    return excel_array, out_map, rect
+
+
+def fill_gaps(excel_array: np.ndarray,
+              out_map: dict[int, dict[str, Any]],
+              rect: dict[str, int],
+              list_maker: A2ZListMaker) -> None:
+    excel_mask = np.ones_like(excel_array, dtype=bool)
+    excel_mask[rect["min_row"]:rect["max_row"], rect["min_col"]:rect["max_col"]] = False
+    excel_array[excel_mask] = None
+    count = int(np.nanmax(excel_array)) + 1
+
+    for row_idx, row in enumerate(excel_array):
+        width_list = []
+        null_row = row == 0
+        if not np.any(null_row):
+            continue
+
+        if null_row[0]:
+            init = np.ones
+        else:
+            init = np.zeros
+
+        shift_null = np.r_[init((1, ), dtype=bool), null_row[:-1]]
+
+        start_points = (null_row & ~shift_null).nonzero()[0]
+        end_points = (~null_row & shift_null).nonzero()[0]
+
+        if null_row[0]:
+            start_points = np.r_[np.array([0]), start_points]
+
+        if len(start_points) > len(end_points):
+            end_points = np.r_[end_points, np.array([None])]
+
+        for s, e in zip(start_points, end_points):
+            width_list.append(s)
+            width_list.append(e)
+
+        for i in range(len(width_list)//2):
+            start = width_list[2 * i]
+            end = width_list[2 * i + 1]
+
+            if end is not None:
+                if np.any(excel_array[row_idx, start:end] > 0):
+                    raise IndexError()
+                excel_array[row_idx, start:end] = count
+            else:
+                if np.any(excel_array[row_idx, start:] > 0):
+                    raise IndexError()
+                excel_array[row_idx, start:] = count
+
+            if end is None:
+                end = len(row) - 1
+
+            start_cell = list_maker.values[start] + str(row_idx + 1)
+            end_cell = list_maker.values[end - 1] + str(row_idx + 1)
+            merged_cell = start_cell + ":" + end_cell
+            merged_cell = CellRange(range_string=merged_cell)
+
+            out_map[count] = {
+                "text": "", "ranges": [(start, end + 1), (row_idx, row_idx + 1)],
+                "merged_cell": merged_cell
+            }
+            count += 1
+
+    # zero 梅
+    col_start = 0
+    row_start = 0
+    row_end, col_end = excel_array.shape
+
+    # header
+    if rect["min_row"] > 0:
+        excel_array[row_start:rect["min_row"], col_start:col_end] = count
+        count += 1
+
+        start_cell = list_maker.values[col_start] + str(row_start + 1)
+        end_cell = list_maker.values[col_end - 1] + str(rect["min_row"])
+        merged_cell = start_cell + ":" + end_cell
+        merged_cell = CellRange(range_string=merged_cell)
+
+        out_map[count] = {
+            "text": "", "ranges": [(col_start, col_end + 1), (row_start, rect["min_row"] + 1)],
+            "merged_cell": merged_cell,
+            "info": {"is_EOS": True}
+        }
+
+    # footer
+    if rect["max_row"] < row_end:
+        excel_array[rect["max_row"]:row_end, col_start:col_end] = count
+        count += 1
+
+        start_cell = list_maker.values[col_start] + str(rect["max_row"] + 1)
+        end_cell = list_maker.values[col_end - 1] + str(row_end)
+        merged_cell = start_cell + ":" + end_cell
+        merged_cell = CellRange(range_string=merged_cell)
+
+        out_map[count] = {
+            "text": "", "ranges": [(col_start, col_end + 1), (rect["max_row"], row_end + 1)],
+            "merged_cell": merged_cell,
+            "info": {"is_EOS": True}
+        }
+
+    # lefter
+    if rect["min_col"] > 0:
+        excel_array[row_start:row_end, col_start:rect["min_col"]] = count
+        count += 1
+
+        start_cell = list_maker.values[col_start] + str(row_start + 1)
+        end_cell = list_maker.values[rect["min_col"] - 1] + str(row_end)
+        merged_cell = start_cell + ":" + end_cell
+        merged_cell = CellRange(range_string=merged_cell)
+
+        out_map[count] = {
+            "text": "", "ranges": [(col_start, rect["min_col"] + 1), (row_start, row_end + 1)],
+            "merged_cell": merged_cell,
+            "info": {"is_EOS": True}
+        }
+
+    # righter
+    if rect["max_col"] < col_end:
+        excel_array[row_start:row_end, rect["max_col"]:col_end] = count
+
+        start_cell = list_maker.values[rect["max_col"]] + str(row_start + 1)
+        end_cell = list_maker.values[col_end - 1] + str(row_end)
+        merged_cell = start_cell + ":" + end_cell
+        merged_cell = CellRange(range_string=merged_cell)
+
+        out_map[count] = {
+            "text": "", "ranges": [(rect["max_col"], col_end + 1), (row_start, row_end + 1)],
+            "merged_cell": merged_cell,
+            "info": {"is_EOS": True}
+        }
+
+    if np.nansum(excel_array == 0) > 0:
+        raise ValueError(
+            "No Zero must be included, "
+            f"but there is {np.nansum(excel_array == 0)} zeros in 'excel_array'")
+
+
+def build_cell_range(model: Type[_CRM],
+                     excel_sheet: ExcelSheetModel,
+                     sheet: SheetData,
+                     cell_range: CellRange,
+                     idx: int = 0,
+                     node: Optional[CellNode] = None) -> _CRM:
+    # Columns, rows and content of a range are kept in the same row,
+    # so a range costs a single INSERT.
+    node = node if node is not None else CellNode()
+    col_start, col_end = get_bound_items(cell_range, bound_type="alphabet")
+    row_start, row_end = get_bound_items(cell_range, bound_type="digit")
+    crm: _CRM = model(excel_sheet=excel_sheet,
+                      cell_range_id=uuid.uuid4(),
+                      cell_range_id_by_order=idx,
+                      column_start=col_start,
+                      column_end=col_end,
+                      column_size=cell_range.max_col - cell_range.min_col + 1,
+                      row_start=row_start,
+                      row_end=row_end,
+                      row_size=cell_range.max_row - cell_range.min_row + 1,
+                      min_col=cell_range.min_col,
+                      max_col=cell_range.max_col,
+                      min_row=cell_range.min_row,
+                      max_row=cell_range.max_row,
+                      cell_content=extract_cell_content(sheet, cell_range),
+                      **model.get_tree_fields(node),
+                      )
+    crm.set_hashes()
+    return crm
+
+
+def extract_cell_content(sheet: Union[SheetData, Worksheet],
+                         cell_range: CellRange) -> str:
+    output: str = ""
+    for values in as_sheet_data(sheet).iter_values(cell_range):
+        for value in values:
+            concat_size = len(output)
+            output += get_cell_value(value, concat_size)
+    return output.replace(br_pattern, "\n")
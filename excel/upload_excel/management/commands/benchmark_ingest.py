@@ -0,0 +1,113 @@
+import json
+from typing import Any, List
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from upload_excel.benchmark import compare, compare_readers, run_benchmark
+from upload_excel.utils.sheet_data import readers
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Ingest synthetic profile workbooks, time each stage of the pipeline "
+        "and the display and edit views, and compare them with a baseline "
+        "or between the workbook readers."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--rows", type=int, default=60)
+        parser.add_argument("--columns", type=int, default=30,
+                            help="Columns of the workbook; 26 or more.")
+        parser.add_argument("--merge-density", type=float, default=0.8,
+                            help="Chance of a column band of a row to be merged.")
+        parser.add_argument("--text-length", type=int, default=40,
+                            help="Longest free text of a cell.")
+        parser.add_argument("--sections", type=int, default=5,
+                            help="Title sections of the workbook.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--reader", choices=readers, default="native",
+                            help="Reader parsing the workbook.")
+        parser.add_argument("--compare-readers", action="store_true",
+                            help="Ingest the workbook with every reader and compare them with openpyxl.")
+        parser.add_argument("--output", default=None,
+                            help="JSON file the results are written to.")
+        parser.add_argument("--baseline", default=None,
+                            help="JSON file of earlier results to compare with.")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Slowdown of a median allowed before it counts as a regression.")
+
+    def write_stages(self, results: dict[str, Any]) -> None:
+        for name, stage in results["stages"].items():
+            self.stdout.write(f"{name:>10}: median {stage['median'] * 1000:9.2f} ms"
+                              f"  (min {stage['min'] * 1000:.2f}, max {stage['max'] * 1000:.2f})")
+
+    def write_rows(self, rows: List[dict[str, Any]]) -> None:
+        for row in rows:
+            line: str = (f"{row['stage']:>10}: {row['baseline'] * 1000:9.2f} ms -> "
+                         f"{row['current'] * 1000:9.2f} ms  x{row['ratio']:.2f}")
+            self.stdout.write(self.style.ERROR(line) if row["regressed"] else line)
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        params: dict[str, Any] = {
+            "repeat": options["repeat"],
+            "seed": options["seed"],
+            "rows": options["rows"],
+            "columns": options["columns"],
+            "merge_density": options["merge_density"],
+            "text_length": options["text_length"],
+            "sections": options["sections"],
+        }
+        if options["compare_readers"]:
+            return self.handle_readers(params, options)
+
+        try:
+            results: dict[str, Any] = run_benchmark(reader=options["reader"], **params)
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        self.write_stages(results)
+
+        if options["output"] is not None:
+            with open(options["output"], "w") as fp:
+                json.dump(results, fp, indent=2)
+            self.stdout.write(f"results written to {options['output']}")
+
+        if options["baseline"] is None:
+            return
+        with open(options["baseline"]) as fp:
+            baseline: dict[str, Any] = json.load(fp)
+        if baseline.get("params") != results["params"]:
+            self.stderr.write("the baseline was taken with other parameters: "
+                              f"{baseline.get('params')}")
+
+        if baseline.get("reader", "openpyxl") != results["reader"]:
+            self.stderr.write(f"the baseline was taken with the {baseline.get('reader', 'openpyxl')} reader")
+
+        rows: List[dict[str, Any]] = compare(results, baseline, tolerance=options["tolerance"])
+        self.write_rows(rows)
+
+        regressed: List[str] = [row["stage"] for row in rows if row["regressed"]]
+        if len(regressed) > 0:
+            raise CommandError(f"slower than the baseline: {', '.join(regressed)}")
+        self.stdout.write(self.style.SUCCESS("no stage is slower than the baseline."))
+
+    def handle_readers(self, params: dict[str, Any], options: dict[str, Any]) -> None:
+        try:
+            results: dict[str, dict[str, Any]] = compare_readers(**params)
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(str(e))
+
+        for reader, result in results.items():
+            self.stdout.write(f"{reader}:")
+            self.write_stages(result)
+
+        if options["output"] is not None:
+            with open(options["output"], "w") as fp:
+                json.dump(results, fp, indent=2)
+            self.stdout.write(f"results written to {options['output']}")
+
+        for reader, result in results.items():
+            if reader == "openpyxl":
+                continue
+            self.stdout.write(f"openpyxl -> {reader}:")
+            self.write_rows(compare(result, results["openpyxl"], tolerance=options["tolerance"]))
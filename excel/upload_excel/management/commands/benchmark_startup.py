@@ -0,0 +1,57 @@
+import json
+from typing import Any, List
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from upload_excel.benchmark import compare, run_startup_benchmark
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Time a fresh process setting Django up and importing the URLconf, "
+        "check that numpy, openpyxl and pyarrow are not loaded by it, "
+        "and compare the times with a baseline."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--output", default=None,
+                            help="JSON file the results are written to.")
+        parser.add_argument("--baseline", default=None,
+                            help="JSON file of earlier results to compare with.")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Slowdown of a median allowed before it counts as a regression.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            results: dict[str, Any] = run_startup_benchmark(repeat=options["repeat"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        for name, stage in results["stages"].items():
+            self.stdout.write(f"{name:>10}: median {stage['median'] * 1000:9.2f} ms"
+                              f"  (min {stage['min'] * 1000:.2f}, max {stage['max'] * 1000:.2f})")
+
+        if options["output"] is not None:
+            with open(options["output"], "w") as fp:
+                json.dump(results, fp, indent=2)
+            self.stdout.write(f"results written to {options['output']}")
+
+        failures: List[str] = []
+        if len(results["heavy_modules"]) > 0:
+            failures.append(f"loaded at startup: {', '.join(results['heavy_modules'])}")
+
+        if options["baseline"] is not None:
+            with open(options["baseline"]) as fp:
+                baseline: dict[str, Any] = json.load(fp)
+            rows: List[dict[str, Any]] = compare(results, baseline, tolerance=options["tolerance"])
+            for row in rows:
+                line: str = (f"{row['stage']:>10}: {row['baseline'] * 1000:9.2f} ms -> "
+                             f"{row['current'] * 1000:9.2f} ms  x{row['ratio']:.2f}")
+                self.stdout.write(self.style.ERROR(line) if row["regressed"] else line)
+            regressed: List[str] = [row["stage"] for row in rows if row["regressed"]]
+            if len(regressed) > 0:
+                failures.append(f"slower than the baseline: {', '.join(regressed)}")
+
+        if len(failures) > 0:
+            raise CommandError("; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("the startup loads no heavy module."))
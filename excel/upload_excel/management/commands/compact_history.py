@@ -0,0 +1,33 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from upload_excel.models import ContentHistoryModel, ExcelSheetModel
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Squash the edit history older than the last versions of each sheet "
+        "into a single base version."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--keep-versions",
+            type=int,
+            default=settings.CONTENT_HISTORY_KEEP_VERSIONS,
+            help="Versions of each sheet kept as they are. Defaults to CONTENT_HISTORY_KEEP_VERSIONS.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        keep_versions: int = options["keep_versions"]
+        sheets = ExcelSheetModel.objects.\
+            filter(history__isnull=False, sheet_version__gt=keep_versions).\
+            distinct()
+        total: int = 0
+        for esm in sheets.iterator():
+            deleted: int = ContentHistoryModel.compact(esm, keep_versions)
+            if deleted > 0:
+                self.stdout.write(f"compacted {esm.sheet_id}: {deleted} rows")
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(f"{total} history rows deleted."))
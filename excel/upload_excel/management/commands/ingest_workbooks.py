@@ -0,0 +1,85 @@
+import json
+import os
+from typing import IO, Any, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from upload_excel.bulk import IngestProgress, find_sources, run_ingestion
+from upload_excel.models import validate_sheet_type
+from upload_excel.utils.sheet_data import readers
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Ingest every workbook of a directory or a ZIP archive in a pool of "
+        "processes. Workbooks stored by an earlier run, or found twice, are "
+        "skipped, and the ones failing are written to a report."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", help="Directory, ZIP archive or workbook to ingest.")
+        parser.add_argument("--sheet-type", default="profile",
+                            help="Sheet type of the ingested sheets.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Processes ingesting the workbooks; 0 ingests them in this process.")
+        parser.add_argument("--reader", choices=readers, default=None,
+                            help="Reader parsing the workbooks. Defaults to INGEST_READER.")
+        parser.add_argument("--no-resume", action="store_true",
+                            help="Ingest the workbooks stored by an earlier run again.")
+        parser.add_argument("--report", default="ingest_failures.jsonl",
+                            help="JSON lines file the failed workbooks are written to.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            validate_sheet_type(options["sheet_type"])
+        except ValidationError as e:
+            raise CommandError(e.messages[0])
+        if options["workers"] < 0:
+            raise CommandError("--workers must be 0 or more.")
+
+        try:
+            sources: List[dict[str, Any]] = find_sources(options["path"])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if len(sources) == 0:
+            raise CommandError(f"no workbook found in {options['path']}.")
+        self.stdout.write(f"{len(sources)} workbooks found.")
+
+        progress: IngestProgress = IngestProgress(
+            len(sources),
+            write=(lambda text: self.stdout.write(text, ending="")) if options["verbosity"] > 0 else None,
+        )
+        report: Optional[IO[str]] = None
+
+        def on_result(result: dict[str, Any]) -> None:
+            nonlocal report
+            if result["status"] == "failed":
+                # written as they come, so a stopped run keeps its report
+                if report is None:
+                    report = open(options["report"], "w")
+                report.write(json.dumps(result, ensure_ascii=False) + "\n")
+                report.flush()
+            progress.add_result(result)
+
+        try:
+            run_ingestion(sources,
+                          on_result,
+                          sheet_type=options["sheet_type"],
+                          reader=options["reader"],
+                          workers=options["workers"],
+                          resume=not options["no_resume"])
+        finally:
+            if report is not None:
+                report.close()
+
+        self.stdout.write("")
+        counts: dict[str, int] = progress.counts
+        self.stdout.write(f"{counts['ingested']} ingested, {counts['skipped']} skipped and "
+                          f"{counts['failed']} failed in {progress.total_time:.1f} s "
+                          f"({progress.files_per_second:.2f} files/s, "
+                          f"{progress.bytes_per_second / 1e6:.2f} MB/s ingested).")
+        if counts["failed"] > 0:
+            self.stderr.write(f"the failed workbooks are listed in {options['report']}; "
+                              "a rerun tries them again.")
+        else:
+            self.stdout.write(self.style.SUCCESS("every workbook is stored."))
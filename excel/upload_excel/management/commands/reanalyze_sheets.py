@@ -0,0 +1,51 @@
+import time
+from typing import Any, List, Optional
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db.models import QuerySet
+from upload_excel.models import ExcelSheetModel
+
+
+class Command(BaseCommand):
+    help: str = (
+        "Rebuild the cell tree of stored sheets from the raster kept at their "
+        "ingestion and update the flags and sizes of their ranges."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("sheet_ids", nargs="*",
+                            help="Sheets to analyse again; every sheet with a raster if none is given.")
+        parser.add_argument("--child-rate", type=float, default=None,
+                            help="child_rate of the cell tree. Defaults to ExcelSheetModel.child_rate.")
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        child_rate: Optional[float] = options["child_rate"]
+        if child_rate is not None and not 0 <= child_rate < 1:
+            raise CommandError("--child-rate must be 0 or more and less than 1.")
+
+        sheets: QuerySet = ExcelSheetModel.objects.filter(raster__isnull=False)
+        if len(options["sheet_ids"]) > 0:
+            try:
+                sheets = sheets.filter(sheet_id__in=options["sheet_ids"])
+                found: set = {str(sheet_id) for sheet_id in sheets.values_list("sheet_id", flat=True)}
+            except ValidationError as e:
+                raise CommandError(e.messages[0])
+            missing: List[str] = sorted(set(options["sheet_ids"]) - found)
+            if len(missing) > 0:
+                self.stderr.write(f"no raster is stored for {', '.join(missing)}; they need to be uploaded again.")
+
+        count: int = 0
+        changed: int = 0
+        start: float = time.perf_counter()
+        for esm in sheets.iterator():
+            sheet_start: float = time.perf_counter()
+            ranges: int = esm.reanalyze(child_rate=child_rate)
+            changed += ranges
+            count += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{esm.sheet_id}: {ranges} ranges changed "
+                                  f"in {(time.perf_counter() - sheet_start) * 1000:.1f} ms")
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} sheets analysed again in {time.perf_counter() - start:.2f} s; {changed} ranges changed."
+        ))
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest, HttpResponse
+
+prefix: str = "esloader"
+
+# name -> (help, buckets)
+histograms: dict[str, Tuple[str, Tuple[float, ...]]] = {
+    "request_duration_seconds": (
+        "Latency of a request by view.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    ),
+    "request_db_queries": (
+        "DB queries run by a request.",
+        (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    ),
+    "request_db_seconds": (
+        "Time a request spent in the DB.",
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    ),
+    "upload_bytes": (
+        "Size of an uploaded request body.",
+        (10e3, 50e3, 100e3, 500e3, 1e6, 5e6, 10e6, 50e6),
+    ),
+    "ingest_stage_seconds": (
+        "Duration of a stage of an ingestion.",
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    "sheet_ranges": (
+        "Cell ranges stored for an ingested sheet.",
+        (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    ),
+    "sheet_nodes": (
+        "Nodes of the cell tree of an ingested sheet.",
+        (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    ),
+}
+
+# name -> label key -> {"buckets": per-bucket counts, "sum": float, "count": int}
+_Values = dict[str, dict[str, dict[str, Any]]]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.values: _Values = {}
+        self.flushed: float = 0.0
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        buckets: Tuple[float, ...] = histograms[name][1]
+        key: str = json.dumps(sorted(labels.items()))
+        with self.lock:
+            series: dict[str, Any] = self.values.setdefault(name, {}).setdefault(
+                key, {"buckets": [0] * (len(buckets) + 1), "sum": 0.0, "count": 0}
+            )
+            n: int = next((n for n, bound in enumerate(buckets) if value <= bound), len(buckets))
+            series["buckets"][n] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> _Values:
+        with self.lock:
+            return json.loads(json.dumps(self.values))
+
+    def get_path(self) -> Optional[str]:
+        directory: Optional[str] = getattr(settings, "METRICS_DIR", None)
+        if directory is None:
+            return None
+        return os.path.join(directory, f"{os.getpid()}.json")
+
+    def flush(self, force: bool = False) -> None:
+        # Every process keeps its own file; the file is replaced whole, so
+        # a reader never sees half of it.
+        path: Optional[str] = self.get_path()
+        if path is None:
+            return
+        now: float = time.monotonic()
+        if not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+            return
+        self.flushed = now
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            json.dump(self.snapshot(), fp)
+        os.replace(temp, path)
+
+
+registry: Registry = Registry()
+
+
+def merge(values: List[_Values]) -> _Values:
+    merged: _Values = {}
+    for value in values:
+        for name, series in value.items():
+            for key, data in series.items():
+                target: Optional[dict[str, Any]] = merged.setdefault(name, {}).get(key, None)
+                if target is None:
+                    merged[name][key] = json.loads(json.dumps(data))
+                    continue
+                target["buckets"] = [a + b for a, b in zip(target["buckets"], data["buckets"])]
+                target["sum"] += data["sum"]
+                target["count"] += data["count"]
+    return merged
+
+
+def collect() -> _Values:
+    path: Optional[str] = registry.get_path()
+    if path is None:
+        return registry.snapshot()
+
+    registry.flush(force=True)
+    values: List[_Values] = []
+    for filename in os.listdir(os.path.dirname(path)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(os.path.dirname(path), filename)) as fp:
+                values.append(json.load(fp))
+        except (OSError, ValueError):
+            # a file of a process being replaced; it is read on the next scrape
+            continue
+    return merge(values)
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def format_labels(labels: List[Tuple[str, str]]) -> str:
+    if len(labels) == 0:
+        return ""
+    escaped: List[str] = [
+        '{}="{}"'.format(key, str(val).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, val in labels
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def iter_exposition(values: _Values) -> Iterator[str]:
+    for name, (help_text, buckets) in histograms.items():
+        full_name: str = f"{prefix}_{name}"
+        yield f"# HELP {full_name} {help_text}"
+        yield f"# TYPE {full_name} histogram"
+        for key, data in sorted(values.get(name, {}).items()):
+            labels: List[Tuple[str, str]] = [tuple(item) for item in json.loads(key)]
+            cumulative: int = 0
+            for bound, count in zip(buckets + (math.inf,), data["buckets"]):
+                cumulative += count
+                yield f"{full_name}_bucket{format_labels(labels + [('le', format_value(bound))])} {cumulative}"
+            yield f"{full_name}_sum{format_labels(labels)} {format_value(data['sum'])}"
+            yield f"{full_name}_count{format_labels(labels)} {data['count']}"
+
+
+class QueryStats:
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.seconds: float = 0.0
+
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def observe_query(execute: Callable, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+    stats: Optional[QueryStats] = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.seconds += time.perf_counter() - start
+
+
+def install_query_observer(sender: Any, connection: Any, **kwargs: Any) -> None:
+    # Connections are opened per thread, including the ingest workers, so
+    # the observer is added to each one as it connects.
+    if observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(observe_query)
+
+
+connection_created.connect(install_query_observer)
+
+
+def observe_ingestion(durations: dict[str, float], ranges: int, nodes: int) -> None:
+    for stage, seconds in durations.items():
+        registry.observe("ingest_stage_seconds", seconds, stage=stage)
+    registry.observe("sheet_ranges", ranges)
+    registry.observe("sheet_nodes", nodes)
+
+
+def get_view_name(request: HttpRequest) -> str:
+    match: Any = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    sync_capable: bool = True
+    async_capable: bool = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        # the async views are served without a thread hop for this middleware
+        if asyncio.iscoroutinefunction(self.get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request: HttpRequest) -> Any:
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats: QueryStats = QueryStats()
+        token: Any = _query_stats.set(stats)
+        start: float = time.perf_counter()
+        try:
+            response: HttpResponse = self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.observe(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        stats: QueryStats = QueryStats()
+        token: Any = _query_stats.set(stats)
+        start: float = time.perf_counter()
+        try:
+            response: HttpResponse = await self.get_response(request)
+        finally:
+            _query_stats.reset(token)
+        self.observe(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def observe(self, request: HttpRequest, response: HttpResponse, elapsed: float, stats: QueryStats) -> None:
+        view: str = get_view_name(request)
+        if view == "metrics":
+            return
+        labels: dict[str, str] = {"view": view, "method": request.method}
+        registry.observe("request_duration_seconds", elapsed, status=str(response.status_code), **labels)
+        registry.observe("request_db_queries", stats.count, **labels)
+        registry.observe("request_db_seconds", stats.seconds, **labels)
+        if request.content_type == "multipart/form-data":
+            registry.observe("upload_bytes", int(request.META.get("CONTENT_LENGTH") or 0), view=view)
+        registry.flush()
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    body: str = "\n".join(iter_exposition(collect())) + "\n"
+    return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0006_alter_cellrangemodel_cell_range_id_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="excelsheetmodel",
+            name="sheet_version",
+            field=models.PositiveIntegerField(
+                default=1,
+                editable=False,
+                help_text="A counter bumped on every content edit. It is used as a validator of conditional requests.",
+                verbose_name="シートのバージョン",
+            ),
+        ),
+    ]
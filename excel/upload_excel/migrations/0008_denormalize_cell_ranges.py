@@ -0,0 +1,229 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:45
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from openpyxl.utils import column_index_from_string
+
+chunk_size = 2000
+
+
+def _latest(model, field):
+    # the display used '.last()' on each child, so the newest child wins.
+    return Subquery(
+        model.objects.filter(cell_range=OuterRef("pk"))
+        .order_by("-pk")
+        .values(field)[:1]
+    )
+
+
+def move_children_into_cell_range(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+    ColumnModel = apps.get_model("upload_excel", "ColumnModel")
+    RowModel = apps.get_model("upload_excel", "RowModel")
+    ContentModel = apps.get_model("upload_excel", "ContentModel")
+
+    CellRangeModel.objects.filter(columns__isnull=False).update(
+        column_start=_latest(ColumnModel, "cell_start"),
+        column_end=_latest(ColumnModel, "cell_end"),
+        column_size=_latest(ColumnModel, "cell_size"),
+    )
+    CellRangeModel.objects.filter(rows__isnull=False).update(
+        row_start=_latest(RowModel, "cell_start"),
+        row_end=_latest(RowModel, "cell_end"),
+        row_size=_latest(RowModel, "cell_size"),
+    )
+    CellRangeModel.objects.filter(content__isnull=False).update(
+        cell_content=_latest(ContentModel, "cell_content"),
+    )
+
+    # integer coordinates are derived from the labels
+    fields = ("min_col", "max_col", "min_row", "max_row")
+    batch = []
+    for crm in CellRangeModel.objects.only(
+        "column_start", "column_end", "row_start", "row_end"
+    ).iterator(chunk_size=chunk_size):
+        crm.min_col = column_index_from_string(crm.column_start)
+        crm.max_col = column_index_from_string(crm.column_end)
+        crm.min_row = int(crm.row_start)
+        crm.max_row = int(crm.row_end)
+        batch.append(crm)
+        if len(batch) >= chunk_size:
+            CellRangeModel.objects.bulk_update(batch, fields)
+            batch = []
+    CellRangeModel.objects.bulk_update(batch, fields)
+
+
+def split_cell_range_into_children(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+    ColumnModel = apps.get_model("upload_excel", "ColumnModel")
+    RowModel = apps.get_model("upload_excel", "RowModel")
+    ContentModel = apps.get_model("upload_excel", "ContentModel")
+
+    columns, rows, contents = [], [], []
+    for crm in CellRangeModel.objects.iterator(chunk_size=chunk_size):
+        columns.append(
+            ColumnModel(
+                cell_range=crm,
+                cell_start=crm.column_start,
+                cell_end=crm.column_end,
+                cell_size=crm.column_size,
+                cell_range_id_by_order=crm.cell_range_id_by_order,
+            )
+        )
+        rows.append(
+            RowModel(
+                cell_range=crm,
+                cell_start=crm.row_start,
+                cell_end=crm.row_end,
+                cell_size=crm.row_size,
+                cell_range_id_by_order=crm.cell_range_id_by_order,
+            )
+        )
+        contents.append(
+            ContentModel(
+                cell_range=crm,
+                cell_content=crm.cell_content,
+                cell_range_id_by_order=crm.cell_range_id_by_order,
+            )
+        )
+        if len(columns) >= chunk_size:
+            ColumnModel.objects.bulk_create(columns)
+            RowModel.objects.bulk_create(rows)
+            ContentModel.objects.bulk_create(contents)
+            columns, rows, contents = [], [], []
+    ColumnModel.objects.bulk_create(columns)
+    RowModel.objects.bulk_create(rows)
+    ContentModel.objects.bulk_create(contents)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0007_excelsheetmodel_sheet_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="cell_content",
+            field=models.TextField(
+                blank=True, default="", null=True, verbose_name="セルの内容"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="column_end",
+            field=models.CharField(
+                default="A", max_length=10, verbose_name="セルのカラム終端位置"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="column_size",
+            field=models.PositiveIntegerField(
+                default=1, verbose_name="セルの列方向サイズ"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="column_start",
+            field=models.CharField(
+                default="A", max_length=10, verbose_name="セルのカラム初期位置"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="max_col",
+            field=models.PositiveIntegerField(
+                default=1, verbose_name="セルのカラム終端番号"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="max_row",
+            field=models.PositiveIntegerField(
+                default=1, verbose_name="セルのロー終端番号"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="min_col",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="1-based column index where the range starts, as in openpyxl.",
+                verbose_name="セルのカラム初期番号",
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="min_row",
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text="1-based row index where the range starts, as in openpyxl.",
+                verbose_name="セルのロー初期番号",
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="row_end",
+            field=models.CharField(
+                default="1", max_length=10, verbose_name="セルのロー終端位置"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="row_size",
+            field=models.PositiveIntegerField(
+                default=1, verbose_name="セルの行方向サイズ"
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="row_start",
+            field=models.CharField(
+                default="1", max_length=10, verbose_name="セルのロー初期位置"
+            ),
+        ),
+        migrations.RunPython(
+            move_children_into_cell_range, split_cell_range_into_children
+        ),
+        migrations.DeleteModel(
+            name="ColumnModel",
+        ),
+        migrations.DeleteModel(
+            name="ContentModel",
+        ),
+        migrations.DeleteModel(
+            name="RowModel",
+        ),
+        migrations.CreateModel(
+            name="ColumnModel",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("upload_excel.cellrangemodel",),
+        ),
+        migrations.CreateModel(
+            name="ContentModel",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("upload_excel.cellrangemodel",),
+        ),
+        migrations.CreateModel(
+            name="RowModel",
+            fields=[],
+            options={
+                "proxy": True,
+                "indexes": [],
+                "constraints": [],
+            },
+            bases=("upload_excel.cellrangemodel",),
+        ),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+from upload_excel.utils.ngram import to_document
+
+chunk_size = 2000
+
+postgresql_forwards = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX cell_search_ngram_gin ON cell_search "
+    "USING gin (to_tsvector('simple', ngram_text))",
+    "CREATE INDEX cell_range_content_trgm ON cell_range "
+    "USING gin (cell_content gin_trgm_ops)",
+]
+postgresql_backwards = [
+    "DROP INDEX IF EXISTS cell_range_content_trgm",
+    "DROP INDEX IF EXISTS cell_search_ngram_gin",
+]
+# external content FTS5 table kept in sync with cell_search by triggers
+sqlite_forwards = [
+    "CREATE VIRTUAL TABLE cell_search_fts USING fts5("
+    "ngram_text, content='cell_search', content_rowid='cell_range_id')",
+    "CREATE TRIGGER cell_search_ai AFTER INSERT ON cell_search BEGIN "
+    "INSERT INTO cell_search_fts(rowid, ngram_text) "
+    "VALUES (new.cell_range_id, new.ngram_text); END",
+    "CREATE TRIGGER cell_search_ad AFTER DELETE ON cell_search BEGIN "
+    "INSERT INTO cell_search_fts(cell_search_fts, rowid, ngram_text) "
+    "VALUES ('delete', old.cell_range_id, old.ngram_text); END",
+    "CREATE TRIGGER cell_search_au AFTER UPDATE ON cell_search BEGIN "
+    "INSERT INTO cell_search_fts(cell_search_fts, rowid, ngram_text) "
+    "VALUES ('delete', old.cell_range_id, old.ngram_text); "
+    "INSERT INTO cell_search_fts(rowid, ngram_text) "
+    "VALUES (new.cell_range_id, new.ngram_text); END",
+]
+sqlite_backwards = [
+    "DROP TRIGGER IF EXISTS cell_search_au",
+    "DROP TRIGGER IF EXISTS cell_search_ad",
+    "DROP TRIGGER IF EXISTS cell_search_ai",
+    "DROP TABLE IF EXISTS cell_search_fts",
+]
+
+
+def _execute(schema_editor, statements):
+    statements = statements.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_indexes(apps, schema_editor):
+    _execute(
+        schema_editor,
+        {"postgresql": postgresql_forwards, "sqlite": sqlite_forwards},
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    _execute(
+        schema_editor,
+        {"postgresql": postgresql_backwards, "sqlite": sqlite_backwards},
+    )
+
+
+def index_existing_contents(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+    CellSearchModel = apps.get_model("upload_excel", "CellSearchModel")
+
+    entries = []
+    values = (
+        CellRangeModel.objects.exclude(cell_content="")
+        .exclude(cell_content__isnull=True)
+        .values_list("pk", "excel_sheet_id", "cell_content")
+        .iterator(chunk_size=chunk_size)
+    )
+    for pk, excel_sheet_id, cell_content in values:
+        entries.append(
+            CellSearchModel(
+                cell_range_id=pk,
+                excel_sheet_id=excel_sheet_id,
+                ngram_text=to_document(cell_content),
+            )
+        )
+        if len(entries) >= chunk_size:
+            CellSearchModel.objects.bulk_create(entries)
+            entries = []
+    CellSearchModel.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0008_denormalize_cell_ranges"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CellSearchModel",
+            fields=[
+                (
+                    "cell_range",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search",
+                        serialize=False,
+                        to="upload_excel.cellrangemodel",
+                    ),
+                ),
+                (
+                    "ngram_text",
+                    models.TextField(
+                        blank=True,
+                        default="",
+                        editable=False,
+                        help_text="Space separated tokens of the cell content. ASCII words are kept whole and the other texts are split into bi-grams.",
+                        verbose_name="検索用のn-gram",
+                    ),
+                ),
+                (
+                    "excel_sheet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_entries",
+                        to="upload_excel.excelsheetmodel",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "cell_search",
+            },
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(index_existing_contents, migrations.RunPython.noop),
+    ]
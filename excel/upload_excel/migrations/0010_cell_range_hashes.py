@@ -0,0 +1,64 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:56
+
+from django.db import migrations, models
+from upload_excel.utils.hashing import hash_content, hash_coord
+
+chunk_size = 2000
+
+
+def hash_existing_ranges(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+
+    ranges = []
+    for cell_range in CellRangeModel.objects.only(
+        "min_row", "min_col", "max_row", "max_col", "cell_content"
+    ).iterator(chunk_size=chunk_size):
+        cell_range.coord_hash = hash_coord(
+            cell_range.min_row,
+            cell_range.min_col,
+            cell_range.max_row,
+            cell_range.max_col,
+        )
+        cell_range.content_hash = hash_content(cell_range.cell_content)
+        ranges.append(cell_range)
+        if len(ranges) >= chunk_size:
+            CellRangeModel.objects.bulk_update(ranges, ["coord_hash", "content_hash"])
+            ranges = []
+    CellRangeModel.objects.bulk_update(ranges, ["coord_hash", "content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0009_cellsearchmodel"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="blake2b digest of the content, used to diff two sheets.",
+                max_length=32,
+                verbose_name="内容のハッシュ",
+            ),
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="coord_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="blake2b digest of the bounds, used to diff two sheets.",
+                max_length=32,
+                verbose_name="座標のハッシュ",
+            ),
+        ),
+        migrations.RunPython(hash_existing_ranges, migrations.RunPython.noop),
+    ]
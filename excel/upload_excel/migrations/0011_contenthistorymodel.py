@@ -0,0 +1,75 @@
+# Generated by Django 4.1.2 on 2026-10-19 17:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0010_cell_range_hashes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContentHistoryModel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sheet_version",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="The content is valid from this version of the sheet until the next row of the same cell range. Version 0 holds the content before the first edit.",
+                        verbose_name="シートのバージョン",
+                    ),
+                ),
+                (
+                    "cell_content",
+                    models.TextField(
+                        blank=True, default="", null=True, verbose_name="セルの内容"
+                    ),
+                ),
+                (
+                    "created_time",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="編集日時"
+                    ),
+                ),
+                (
+                    "cell_range",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="history",
+                        to="upload_excel.cellrangemodel",
+                    ),
+                ),
+                (
+                    "excel_sheet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="history",
+                        to="upload_excel.excelsheetmodel",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "content_history",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="contenthistorymodel",
+            constraint=models.UniqueConstraint(
+                fields=("cell_range", "sheet_version"),
+                name="unique_content_history_version",
+            ),
+        ),
+    ]
@@ -0,0 +1,146 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+from upload_excel.utils.hashing import hash_content
+
+chunk_size = 2000
+
+postgresql_forwards = [
+    "CREATE INDEX cell_text_text_trgm ON cell_text USING gin (text gin_trgm_ops)",
+]
+postgresql_backwards = [
+    "DROP INDEX IF EXISTS cell_text_text_trgm",
+]
+# the index on cell_range.cell_content is dropped together with the column
+postgresql_range_index = [
+    "CREATE INDEX cell_range_content_trgm ON cell_range "
+    "USING gin (cell_content gin_trgm_ops)",
+]
+
+
+def _execute(schema_editor, statements):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in statements:
+            schema_editor.execute(statement)
+
+
+def create_text_index(apps, schema_editor):
+    _execute(schema_editor, postgresql_forwards)
+
+
+def drop_text_index(apps, schema_editor):
+    _execute(schema_editor, postgresql_backwards)
+
+
+def create_range_index(apps, schema_editor):
+    _execute(schema_editor, postgresql_range_index)
+
+
+def intern_contents(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+    CellTextModel = apps.get_model("upload_excel", "CellTextModel")
+
+    def flush(ranges, texts):
+        CellTextModel.objects.bulk_create(
+            [CellTextModel(text_hash=key, text=text) for key, text in texts.items()],
+            ignore_conflicts=True,
+        )
+        CellRangeModel.objects.bulk_update(ranges, ["cell_text"])
+
+    ranges = []
+    texts = {hash_content(""): ""}
+    for cell_range in CellRangeModel.objects.only("cell_content").iterator(
+        chunk_size=chunk_size
+    ):
+        text = cell_range.cell_content or ""
+        cell_range.cell_text_id = hash_content(text)
+        texts[cell_range.cell_text_id] = text
+        ranges.append(cell_range)
+        if len(ranges) >= chunk_size:
+            flush(ranges, texts)
+            ranges = []
+            texts = {}
+    flush(ranges, texts)
+
+
+def restore_contents(apps, schema_editor):
+    CellRangeModel = apps.get_model("upload_excel", "CellRangeModel")
+
+    ranges = []
+    for cell_range in (
+        CellRangeModel.objects.select_related("cell_text")
+        .only("cell_text__text")
+        .iterator(chunk_size=chunk_size)
+    ):
+        cell_range.cell_content = cell_range.cell_text.text
+        cell_range.content_hash = cell_range.cell_text_id
+        ranges.append(cell_range)
+        if len(ranges) >= chunk_size:
+            CellRangeModel.objects.bulk_update(ranges, ["cell_content", "content_hash"])
+            ranges = []
+    CellRangeModel.objects.bulk_update(ranges, ["cell_content", "content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0011_contenthistorymodel"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CellTextModel",
+            fields=[
+                (
+                    "text_hash",
+                    models.CharField(
+                        help_text="blake2b digest of the text; identical texts of any sheet share a row.",
+                        max_length=32,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="内容のハッシュ",
+                    ),
+                ),
+                (
+                    "text",
+                    models.TextField(blank=True, default="", verbose_name="セルの内容"),
+                ),
+            ],
+            options={
+                "db_table": "cell_text",
+            },
+        ),
+        migrations.AddField(
+            model_name="cellrangemodel",
+            name="cell_text",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="cell_ranges",
+                to="upload_excel.celltextmodel",
+            ),
+        ),
+        migrations.RunPython(intern_contents, restore_contents),
+        migrations.RunPython(migrations.RunPython.noop, create_range_index),
+        migrations.RemoveField(
+            model_name="cellrangemodel",
+            name="cell_content",
+        ),
+        migrations.RemoveField(
+            model_name="cellrangemodel",
+            name="content_hash",
+        ),
+        migrations.AlterField(
+            model_name="cellrangemodel",
+            name="cell_text",
+            field=models.ForeignKey(
+                default="cae66941d9efbd404e4d88758ea67670",
+                help_text="The key is the hash of the text, so it is also used to diff two sheets.",
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="cell_ranges",
+                to="upload_excel.celltextmodel",
+            ),
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0012_cell_text"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestDiagnosticsModel",
+            fields=[
+                (
+                    "excel_sheet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="diagnostics",
+                        serialize=False,
+                        to="upload_excel.excelsheetmodel",
+                    ),
+                ),
+                (
+                    "stage_durations",
+                    models.JSONField(
+                        default=dict,
+                        help_text="Seconds spent in each stage of the ingestion.",
+                        verbose_name="ステージ毎の処理時間",
+                    ),
+                ),
+                (
+                    "memory",
+                    models.JSONField(
+                        blank=True,
+                        default=None,
+                        help_text="Peak and retained bytes of each stage and the lines allocating the most, taken by tracemalloc when the upload asked for a memory profile.",
+                        null=True,
+                        verbose_name="ステージ毎のメモリ使用量",
+                    ),
+                ),
+                (
+                    "created_time",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="記録日時"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "ingest_diagnostics",
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:27
+
+from django.db import migrations, models
+import upload_excel.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0013_ingestdiagnosticsmodel"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="excelsheetmodel",
+            name="sheet_type",
+            field=models.CharField(
+                default="profile",
+                help_text="Set a name of template sheet.'profile' that is default sheet type is a template we designed as typical profile in our officeEven before you don't generate your custom template, you can use two template types of 'profile' and 'project'",
+                max_length=10,
+                validators=[upload_excel.models.validate_sheet_type],
+                verbose_name="シートタイプ",
+            ),
+        ),
+    ]
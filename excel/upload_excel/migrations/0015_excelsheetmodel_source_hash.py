@@ -0,0 +1,27 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0014_sheet_type_validator"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="excelsheetmodel",
+            name="source_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default=None,
+                editable=False,
+                help_text="blake2b digest of the workbook a bulk ingestion read the sheet from. A rerun skips the workbooks already stored.",
+                max_length=32,
+                null=True,
+                verbose_name="元ファイルのハッシュ",
+            ),
+        ),
+    ]
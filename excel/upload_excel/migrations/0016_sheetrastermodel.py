@@ -0,0 +1,62 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0015_excelsheetmodel_source_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SheetRasterModel",
+            fields=[
+                (
+                    "excel_sheet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="raster",
+                        serialize=False,
+                        to="upload_excel.excelsheetmodel",
+                    ),
+                ),
+                (
+                    "labels",
+                    models.BinaryField(
+                        help_text="Compressed NumPy archive of the label raster the cell tree was built from; each cell holds the label of the range covering it.",
+                        verbose_name="ラベル配列",
+                    ),
+                ),
+                (
+                    "cell_map",
+                    models.JSONField(
+                        default=dict,
+                        help_text="Text, coordinate and info of each label, as read at the ingestion.",
+                        verbose_name="ラベル毎のセル範囲",
+                    ),
+                ),
+                (
+                    "child_rate",
+                    models.FloatField(
+                        default=0.5,
+                        help_text="child_rate the flags of the ranges were last computed with.",
+                        verbose_name="子ノードの閾値",
+                    ),
+                ),
+                (
+                    "analysis_time",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="解析日時"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "sheet_raster",
+            },
+        ),
+    ]
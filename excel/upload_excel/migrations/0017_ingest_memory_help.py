@@ -0,0 +1,24 @@
+# Generated by Django 4.1.2 on 2026-10-19 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("upload_excel", "0016_sheetrastermodel"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ingestdiagnosticsmodel",
+            name="memory",
+            field=models.JSONField(
+                blank=True,
+                default=None,
+                help_text="Peak and retained bytes of each stage and the lines allocating the most, taken by tracemalloc when the upload asked for a memory profile. tracemalloc measures the whole process; a stage marked 'shared' ran along another profiled upload, whose allocations it includes.",
+                null=True,
+                verbose_name="ステージ毎のメモリ使用量",
+            ),
+        ),
+    ]
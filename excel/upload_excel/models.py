@@ -1,21 +1,30 @@
-import re
-import string
+import time
 import uuid
-from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
-
-import numpy as np
-import openpyxl
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.db import models
-from django.db.utils import ProgrammingError
+from typing import (IO, TYPE_CHECKING, Any, Iterable, Iterator, List,
+                    Optional, Tuple, TypeVar, Union)
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.db import models, transaction
+from django.db.models import F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.db.utils import DatabaseError
 from django.http import HttpRequest
 from django.utils import timezone
-from openpyxl import Workbook
-from openpyxl.cell.cell import Cell
-from openpyxl.worksheet.cell_range import CellRange
-from openpyxl.worksheet.worksheet import Worksheet
-from upload_excel.utils.cell_tree import CellNode, CellTree
-from upload_excel.utils.sort import A2ZListMaker
+from upload_excel.utils.hashing import hash_content, hash_coord
+from upload_excel.utils.mapped import MappedFile
+from upload_excel.utils.ngram import to_document
+from upload_excel.utils.stages import MemoryStageRecorder, StageRecorder
+
+# numpy and openpyxl are slow to import; upload_excel.ingest loads them
+# when a workbook is ingested for the first time.
+if TYPE_CHECKING:
+    import numpy as np
+    from openpyxl.worksheet.cell_range import CellRange
+    from openpyxl.worksheet.worksheet import Worksheet
+    from upload_excel.utils.cell_tree import CellNode
+    from upload_excel.utils.sheet_data import SheetData
 
 _T = TypeVar("_T", bound=models.Model)
 _F = TypeVar("_F", bound=models.Field)
@@ -25,55 +34,11 @@ _EST = TypeVar("_EST", bound="ESTemplateNamesModel")
 _CM = TypeVar("_CM", bound="ColumnModel")
 _RM = TypeVar("_RM", bound="RowModel")
 _CTM = TypeVar("_CTM", bound="ContentModel")
-
-# 改行パターン
-br_pattern: str = "?#$%&@!?*+"
-
-
-getters = {
-    "digit": re.compile(r"\d+").findall,
-    "alphabet": re.compile(r"([A-Z]+)").findall
-}
-
-
-def get_bound_items(cell_range: CellRange,
-                    bound_type: str = "digit") -> Tuple[str, str]:
-    # preparations
-    if bound_type not in getters:
-        raise KeyError("'bound_type' must be either ''digit' or 'alphabet'")
-
-    getter: str = getters[bound_type]
-    str_coord: str = cell_range.coord
-
-    if ":" not in str_coord:
-        str_coord = ":".join([str_coord, str_coord])
-
-    # set
-    start: str
-    end: str
-    start, end = str_coord.split(":")
-    start = getter(start)[0]
-    end = getter(end)[0]
-
-    return start, end
-
-
-def get_cell_value(cell: Cell, concat_size: int = 0) -> Optional[str]:
-    val: Optional[Any] = cell.value
-    output: str = ""
-    if val is not None:
-        if concat_size > 0:
-            output += br_pattern
-        output += str(val)
-    return output
-
-
-def get_text(cell):
-    val = cell.value
-    output = ""
-    if val is not None:
-        output += str(val)
-    return output
+_CSM = TypeVar("_CSM", bound="CellSearchModel")
+_CHM = TypeVar("_CHM", bound="ContentHistoryModel")
+_CTX = TypeVar("_CTX", bound="CellTextModel")
+_IDM = TypeVar("_IDM", bound="IngestDiagnosticsModel")
+_SRM = TypeVar("_SRM", bound="SheetRasterModel")
 
 
 class ESTemplateNamesModel(models.Model):
@@ -85,9 +50,14 @@ class ESTemplateNamesModel(models.Model):
         editable=True,
         max_length=20,
     )
-    init_choices: List[str] = [
+    init_choices: List[Tuple[int, str]] = [
         (1, "profile"), (2, "project")
     ]
+    # The names are read from the DB on first use, not at import, and kept
+    # for this many seconds by each process.
+    cache_seconds: float = 60.0
+    _cached_choices: Optional[List[Tuple[int, str]]] = None
+    _cached_time: float = 0.0
     class Meta:
         db_table: str = "template_names"
 
@@ -95,23 +65,47 @@ class ESTemplateNamesModel(models.Model):
     def add(cls, val: str) -> None:
         template_name_model: _EST = cls(name=val)
         template_name_model.save(force_insert=True)
+        cls.clear_cache()
 
     @classmethod
-    def _get_template_names(cls, *args, **kwargs) -> List[str]:
-        output: List[str] = [] + cls.init_choices
+    def clear_cache(cls) -> None:
+        cls._cached_choices = None
+
+    @classmethod
+    def _get_template_names(cls, *args, **kwargs) -> List[Tuple[int, str]]:
+        output: List[Tuple[int, str]] = [] + cls.init_choices
         count: int = 3
         _choices: List[str] = [c for _, c in cls.init_choices]
-        # exception process when using makemigration command as initialization.
+        for v in ESTemplateNamesModel.objects.all().values_list("name", flat=True):
+            if v in _choices:
+                continue
+            output += [(count, v)]
+            count += 1
+            _choices += [v]
+        return output
+
+    @classmethod
+    def get_template_choices(cls) -> List[Tuple[int, str]]:
+        now: float = time.monotonic()
+        if cls._cached_choices is not None and now - cls._cached_time < cls.cache_seconds:
+            return cls._cached_choices
         try:
-            for v in ESTemplateNamesModel.objects.all().values_list():
-                if v in _choices:
-                    continue
-                output += [(count, v)]
-                count += 1
-                _choices += [v]
-            return output
-        except ProgrammingError:
-            return output
+            cls._cached_choices = cls._get_template_names()
+        except DatabaseError:
+            # no table yet, or no DB; the built-in templates still work
+            return cls.init_choices
+        cls._cached_time = now
+        return cls._cached_choices
+
+    @classmethod
+    def get_template_names(cls) -> List[str]:
+        return [name for _, name in cls.get_template_choices()]
+
+
+def validate_sheet_type(value: str) -> None:
+    if value not in ESTemplateNamesModel.get_template_names():
+        raise ValidationError(f"'{value}' is not a sheet type of a template.", code="invalid_sheet_type")
+
 
 class ExcelSheetModel(models.Model):
     ng_words: List[str] = [
@@ -163,7 +157,7 @@ class ExcelSheetModel(models.Model):
             "Even before you don't generate your custom template, "
             "you can use two template types of 'profile' and 'project'"
         ),
-        choices=ESTemplateNamesModel._get_template_names()
+        validators=[validate_sheet_type],
     )
     col_size: _F = models.PositiveIntegerField(
         verbose_name="シートのカラムサイズ",
@@ -179,8 +173,33 @@ class ExcelSheetModel(models.Model):
         default=1,
         editable=True,
     )
-    excel_matrix: np.ndarray
+    sheet_version: _F = models.PositiveIntegerField(
+        verbose_name="シートのバージョン",
+        blank=False,
+        null=False,
+        default=1,
+        editable=False,
+        help_text=(
+            "A counter bumped on every content edit. "
+            "It is used as a validator of conditional requests."
+        )
+    )
+    source_hash: _F = models.CharField(
+        verbose_name="元ファイルのハッシュ",
+        blank=True,
+        null=True,
+        default=None,
+        editable=False,
+        max_length=32,
+        db_index=True,
+        help_text=(
+            "blake2b digest of the workbook a bulk ingestion read the sheet from. "
+            "A rerun skips the workbooks already stored."
+        )
+    )
+    excel_matrix: "np.ndarray"
     child_rate: float = 0.5
+    bulk_batch_size: int = 500
     class Meta:
         db_table: str = "excel_sheet"
 
@@ -196,33 +215,85 @@ class ExcelSheetModel(models.Model):
     @classmethod
     def get_binary_data(cls,
                         request: HttpRequest,
-                        file_key: str = "file") -> str:
-        file_data: List[InMemoryUploadedFile] = request.FILES[file_key]
+                        file_key: str = "file") -> IO[bytes]:
+        file_data: UploadedFile = request.FILES[file_key]
+        # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk by
+        # Django; they are mapped instead of being read into the heap.
+        if isinstance(file_data, TemporaryUploadedFile) and file_data.size > 0:
+            return MappedFile(file_data.temporary_file_path())
         return file_data.file
 
     @classmethod
     def create_model(cls,
                      request: HttpRequest,
                      file_key: str = "file",
-                     sheet_type: str = "profile") -> _ESM:
+                     sheet_type: str = "profile",
+                     recorder: Optional[StageRecorder] = None) -> _ESM:
         cls.is_valid_request(request, file_key)
-        binary: str = cls.get_binary_data(request, file_key)
-
-        workbook: Workbook = openpyxl.load_workbook(binary, data_only=True)
-        worksheet: Worksheet = workbook.active
+        binary: IO[bytes] = cls.get_binary_data(request, file_key)
+        if recorder is None and cls.wants_memory_profile(request):
+            recorder = MemoryStageRecorder()
+        try:
+            return cls.create_from_binary(binary, sheet_type=sheet_type, recorder=recorder)
+        finally:
+            if isinstance(binary, MappedFile):
+                binary.close()
 
-        excel_sheet_model: _ESM = cls(sheet_id=uuid.uuid4(),
-                                      sheet_type=sheet_type,
-                                      col_size=worksheet.max_column,
-                                      row_size=worksheet.max_row)
-        excel_sheet_model.excel_matrix =\
-            np.zeros((100, worksheet.max_column))
-        excel_sheet_model.save(force_update=True)
+    @classmethod
+    def wants_memory_profile(cls, request: HttpRequest) -> bool:
+        header: str = request.headers.get("X-ES-Memory-Profile", "")
+        return settings.INGEST_MEMORY_PROFILE or header.lower() in ("1", "true", "on")
 
-        excel_sheet_model.create_cell_ranges(worksheet)
+    @classmethod
+    def create_from_binary(cls,
+                           binary: Any,
+                           sheet_type: str = "profile",
+                           recorder: Optional[StageRecorder] = None,
+                           reader: Optional[str] = None,
+                           source_hash: Optional[str] = None) -> _ESM:
+        # numpy and openpyxl are loaded with the first ingestion
+        from upload_excel import ingest
+        return ingest.create_from_binary(cls, binary, sheet_type=sheet_type, recorder=recorder,
+                                         reader=reader, source_hash=source_hash)
 
-        workbook.close()
-        return excel_sheet_model
+    @classmethod
+    def get_validators(cls, sheet_id: str) -> Optional[dict[str, Any]]:
+        try:
+            return cls.objects.filter(sheet_id=sheet_id).\
+                values("sheet_version", "sheet_update_time").first()
+        except ValidationError:
+            return None
+
+    @staticmethod
+    def make_etag(sheet_id: str, sheet_version: int) -> str:
+        return f"{sheet_id}-{sheet_version}"
+
+    @property
+    def etag(self) -> str:
+        return self.make_etag(self.sheet_id, self.sheet_version)
+
+    def touch(self) -> None:
+        # Bump in SQL so that concurrent edits never share a version.
+        self.sheet_update_time = timezone.now()
+        ExcelSheetModel.objects.\
+            filter(sheet_id=self.sheet_id).\
+            update(sheet_version=F("sheet_version") + 1,
+                   sheet_update_time=self.sheet_update_time)
+        self.refresh_from_db(fields=["sheet_version"])
+
+    def update_contents(self, contents: List[_CTM]) -> None:
+        # All edits land in one UPDATE statement and bump the version once.
+        # The history is kept per sheet, so the contents must all be ours.
+        others: List[Any] = [content.pk for content in contents if content.excel_sheet_id != self.sheet_id]
+        if len(others) > 0:
+            raise ValueError(f"The cell ranges {others} do not belong to the sheet '{self.sheet_id}'.")
+        with transaction.atomic():
+            originals: dict[int, str] = ContentHistoryModel.get_unrecorded_contents(contents)
+            CellTextModel.intern([content.cell_content for content in contents])
+            ContentModel.objects.bulk_update(contents, ["cell_text"])
+            CellSearchModel.index_cell_ranges(contents)
+            self.touch()
+            ContentHistoryModel.record(self, contents, originals)
 
     def is_ng_sentence(self, text: str) -> bool:
         flg: bool = False
@@ -230,204 +301,56 @@ class ExcelSheetModel(models.Model):
             flg |= ng_word in text
         return flg
 
-    def create_cell_ranges(self, worksheet: Worksheet) -> None:
-        # TODO メソッドを細かく分ける
-        list_maker = A2ZListMaker(max_size=worksheet.max_column, init=string.ascii_uppercase)
-        list_maker.create()
-
-        cell_ranges: List[CellRange] = worksheet.merged_cells
-        excel_array = np.zeros((worksheet.max_row, worksheet.max_column))
-        ranges: CellRange
-        idx: int
-
-        coord_list: List[str] = []
-        for idx, ranges in enumerate(cell_ranges):
-            coords = ranges.coord.split(":")
-
-            out = []
-            for c in coords:
-                out += getters["alphabet"](c)
-                out += getters["digit"](c)
-            coord_list.append(out)
-
-        out_map = {}
-        rect: dict[str, int] = {
-            "min_row": 10000,
-            "max_row": 0,
-            "min_col": 10000,
-            "max_col": 0
-        }
-        for n, out in enumerate(coord_list):
-            cs, rs, ce, re = out
-            txt = ""
-            for cells in worksheet[cs+rs+":"+ce+re]:
-                for cell in cells:
-                    txt += get_text(cell)
-
-            if len(txt) < 1 or self.is_ng_sentence(txt):
-                continue
-
-            cs = list_maker.values.index(cs)
-            ce = list_maker.values.index(ce) + 1
-            rs = int(rs) - 1
-            re = int(re)
-
-            rect["min_row"] = min([rect["min_row"], rs])
-            rect["max_row"] = max([rect["max_row"], re])
-            rect["min_col"] = min([rect["min_col"], cs])
-            rect["max_col"] = max([rect["max_col"], ce])
-
-            # TODO null部分を縦1x横上に合わせて最大の長方形として全て定義し直す。値は空。
-            array_mask = excel_array[rs:re, cs:ce] == 0
-            excel_array[rs:re, cs:ce][array_mask] = n + 1
-            out_map[n + 1] = {
-                "text": txt, "ranges": [(cs, ce), (rs, re)],
-                "merged_cell": cell_ranges.ranges[n]
-            }
-
-        excel_mask = np.ones_like(excel_array, dtype=bool)
-        excel_mask[rect["min_row"]:rect["max_row"], rect["min_col"]:rect["max_col"]] = False
-        excel_array[excel_mask] = None
-        count = int(np.nanmax(excel_array)) + 1
-
-        for row_idx, row in enumerate(excel_array):
-            width_list = []
-            null_row = row == 0
-            if not np.any(null_row):
-                continue
-
-            if null_row[0]:
-                init = np.ones
-            else:
-                init = np.zeros
-
-            shift_null = np.r_[init((1, ), dtype=bool), null_row[:-1]]
-
-            start_points = (null_row & ~shift_null).nonzero()[0]
-            end_points = (~null_row & shift_null).nonzero()[0]
-
-            if null_row[0]:
-                start_points = np.r_[np.array([0]), start_points]
-
-            if len(start_points) > len(end_points):
-                end_points = np.r_[end_points, np.array([None])]
-
-            for s, e in zip(start_points, end_points):
-                width_list.append(s)
-                width_list.append(e)
-
-            for i in range(len(width_list)//2):
-                start = width_list[2 * i]
-                end = width_list[2 * i + 1]
-
-                if end is not None:
-                    if np.any(excel_array[row_idx, start:end] > 0):
-                        raise IndexError()
-                    excel_array[row_idx, start:end] = count
-                else:
-                    if np.any(excel_array[row_idx, start:] > 0):
-                        raise IndexError()
-                    excel_array[row_idx, start:] = count
-
-                if end is None:
-                    end = len(row) - 1
-
-                start_cell = list_maker.values[start] + str(row_idx + 1)
-                end_cell = list_maker.values[end - 1] + str(row_idx + 1)
-                merged_cell = start_cell + ":" + end_cell
-                merged_cell = CellRange(range_string=merged_cell)
-
-                out_map[count] = {
-                    "text": "", "ranges": [(start, end + 1), (row_idx, row_idx + 1)],
-                    "merged_cell": merged_cell
-                }
-                count += 1
-
-        # zero 梅
-        col_start = 0
-        row_start = 0
-        row_end, col_end = excel_array.shape
-
-        # header
-        if rect["min_row"] > 0:
-            excel_array[row_start:rect["min_row"], col_start:col_end] = count
-            count += 1
-
-            start_cell = list_maker.values[col_start] + str(row_start + 1)
-            end_cell = list_maker.values[col_end - 1] + str(rect["min_row"])
-            merged_cell = start_cell + ":" + end_cell
-            merged_cell = CellRange(range_string=merged_cell)
+    def create_cell_ranges(self,
+                           worksheet: Union["SheetData", "Worksheet"],
+                           recorder: Optional[StageRecorder] = None) -> None:
+        from upload_excel import ingest
+        ingest.create_cell_ranges(self, worksheet, recorder=recorder)
 
-            out_map[count] = {
-                "text": "", "ranges": [(col_start, col_end + 1), (row_start, rect["min_row"] + 1)],
-                "merged_cell": merged_cell,
-                "info": {"is_EOS": True}
-            }
+    def reanalyze(self, child_rate: Optional[float] = None) -> int:
+        # rebuilt from the stored raster; openpyxl is not loaded
+        from upload_excel import reanalysis
+        return reanalysis.reanalyze_sheet(self, child_rate=child_rate)
 
-        # footer
-        if rect["max_row"] < row_end:
-            excel_array[rect["max_row"]:row_end, col_start:col_end] = count
-            count += 1
 
-            start_cell = list_maker.values[col_start] + str(rect["max_row"] + 1)
-            end_cell = list_maker.values[col_end - 1] + str(row_end)
-            merged_cell = start_cell + ":" + end_cell
-            merged_cell = CellRange(range_string=merged_cell)
-
-            out_map[count] = {
-                "text": "", "ranges": [(col_start, col_end + 1), (rect["max_row"], row_end + 1)],
-                "merged_cell": merged_cell,
-                "info": {"is_EOS": True}
-            }
-
-        # lefter
-        if rect["min_col"] > 0:
-            excel_array[row_start:row_end, col_start:rect["min_col"]] = count
-            count += 1
-
-            start_cell = list_maker.values[col_start] + str(row_start + 1)
-            end_cell = list_maker.values[rect["min_col"] - 1] + str(row_end)
-            merged_cell = start_cell + ":" + end_cell
-            merged_cell = CellRange(range_string=merged_cell)
+class CellTextModel(models.Model):
+    text_hash: _F = models.CharField(
+        verbose_name="内容のハッシュ",
+        primary_key=True,
+        max_length=32,
+        help_text=(
+            "blake2b digest of the text; identical texts of any sheet share a row."
+        )
+    )
+    text: _F = models.TextField(
+        verbose_name="セルの内容",
+        blank=True,
+        null=False,
+        default="",
+    )
+    bulk_batch_size: int = 500
 
-            out_map[count] = {
-                "text": "", "ranges": [(col_start, rect["min_col"] + 1), (row_start, row_end + 1)],
-                "merged_cell": merged_cell,
-                "info": {"is_EOS": True}
-            }
+    class Meta:
+        db_table: str = "cell_text"
 
-        # righter
-        if rect["max_col"] < col_end:
-            excel_array[row_start:row_end, rect["max_col"]:col_end] = count
+    @classmethod
+    def intern(cls, texts: Iterable[Optional[str]]) -> None:
+        # Rows are never updated; a text already stored is skipped by the
+        # database, so concurrent uploads may intern the same text.
+        entries: dict[str, str] = {hash_content(text): text or "" for text in texts}
+        cls.objects.bulk_create([cls(text_hash=text_hash, text=text) for text_hash, text in entries.items()],
+                                batch_size=cls.bulk_batch_size,
+                                ignore_conflicts=True)
 
-            start_cell = list_maker.values[rect["max_col"]] + str(row_start + 1)
-            end_cell = list_maker.values[col_end - 1] + str(row_end)
-            merged_cell = start_cell + ":" + end_cell
-            merged_cell = CellRange(range_string=merged_cell)
 
-            out_map[count] = {
-                "text": "", "ranges": [(rect["max_col"], col_end + 1), (row_start, row_end + 1)],
-                "merged_cell": merged_cell,
-                "info": {"is_EOS": True}
-            }
+empty_text_hash: str = hash_content("")
 
-        if np.nansum(excel_array == 0) > 0:
-            raise ValueError(
-                "No Zero must be included, "
-                f"but there is {np.nansum(excel_array == 0)} zeros in 'excel_array'")
 
-        # ここでリサイズは完了してるので、横軸は最小公倍数をもとになんとか綺麗にする
-        tree = CellTree.create_tree(excel_array,
-                                    child_rate=self.child_rate,
-                                    cell_content=out_map)
+class CellRangeManager(models.Manager):
+    # The text of a range comes in the same query as the range.
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().select_related("cell_text")
 
-        for idx, outs in out_map.items():
-            CellRangeModel.\
-                create_model(self,
-                             worksheet=worksheet,
-                             cell_range=outs["merged_cell"],
-                             idx=idx,
-                             node=tree.tree[idx])
 
 class CellRangeModel(models.Model):
     excel_sheet: _F = models.ForeignKey(
@@ -522,216 +445,597 @@ class CellRangeModel(models.Model):
         default=False,
         editable=True,
     )
-    class Meta:
-        db_table: str = "cell_range"
-
-    @classmethod
-    def create_model(cls,
-                     excel_sheet: _ESM,
-                     worksheet: Worksheet,
-                     cell_range: CellRange,
-                     idx: int = 0,
-                     node: CellNode = CellNode()) -> _CRM:
-
-        # When creating a child model,
-        # an inputting parent model which has been defined
-        # as foreign key model at child must be saved before.
-        crm: _CRM = cls(excel_sheet=excel_sheet,
-                        cell_range_id=uuid.uuid4(),
-                        cell_range_id_by_order=idx,
-                        effective_cell_width=node.width,
-                        effective_cell_height=node.height,
-                        has_parent=node.has_parent(),
-                        is_dev_exp_id=node.is_dev_experience(),
-                        include_title=node.is_title(),
-                        is_end_of_sheet=node.is_end_of_sheet(),
-                        is_space=node.is_space(),
-                        )
-        crm.save(force_insert=True)
-        ColumnModel.create_model(cell_range_model=crm,
-                                 cell_range=cell_range,
-                                 idx=idx)
-        RowModel.create_model(cell_range_model=crm,
-                              cell_range=cell_range,
-                              idx=idx)
-        ContentModel.create_model(cell_range_model=crm,
-                                  worksheet=worksheet,
-                                  cell_range=cell_range,
-                                  idx=idx)
-        return crm
-
-
-class ColumnModel(models.Model):
-    cell_range: _F = models.ForeignKey(
-        CellRangeModel,
-        on_delete=models.CASCADE,
-        related_name="columns"
-    )
-    cell_start: _F = models.CharField(
+    column_start: _F = models.CharField(
         verbose_name="セルのカラム初期位置",
         blank=False,
         null=False,
-        default="A1",
+        default="A",
         editable=True,
         max_length=10,
     )
-    cell_end: _F = models.CharField(
+    column_end: _F = models.CharField(
         verbose_name="セルのカラム終端位置",
         blank=False,
         null=False,
-        default="A1",
+        default="A",
         editable=True,
         max_length=10,
     )
-    cell_size: _F = models.PositiveIntegerField(
+    column_size: _F = models.PositiveIntegerField(
         verbose_name="セルの列方向サイズ",
         blank=False,
         null=False,
         default=1,
         editable=True,
     )
-    cell_range_id_by_order: _F = models.IntegerField(
-        verbose_name="順序付きセル範囲ID",
-        blank=False,
-        null=False,
-        default=None,
-        editable=True,
-        help_text=(
-            "An ID based on merged order is assigned by cell range."
-        )
-    )
-
-    class Meta:
-        db_table: str = "column"
-
-    @classmethod
-    def create_model(cls,
-                     cell_range_model: _CRM,
-                     cell_range: CellRange,
-                     idx: int = 0) -> _CM:
-        start, end = get_bound_items(cell_range, bound_type="alphabet")
-        cell_size: int = cell_range.max_col - cell_range.min_col + 1
-        column: _CM = cls(cell_range=cell_range_model,
-                         cell_start=start,
-                         cell_end=end,
-                         cell_size=cell_size,
-                         cell_range_id_by_order=idx)
-        column.save(force_insert=True)
-        return column
-
-
-class RowModel(models.Model):
-    cell_range: _F = models.ForeignKey(
-        CellRangeModel,
-        on_delete=models.CASCADE,
-        related_name="rows"
-    )
-    cell_start: _F = models.CharField(
+    row_start: _F = models.CharField(
         verbose_name="セルのロー初期位置",
         blank=False,
         null=False,
-        default="A1",
+        default="1",
         editable=True,
         max_length=10,
     )
-    cell_end: _F = models.CharField(
+    row_end: _F = models.CharField(
         verbose_name="セルのロー終端位置",
         blank=False,
         null=False,
-        default="A1",
+        default="1",
         editable=True,
         max_length=10,
     )
-    cell_size: _F = models.PositiveIntegerField(
+    row_size: _F = models.PositiveIntegerField(
         verbose_name="セルの行方向サイズ",
         blank=False,
         null=False,
         default=1,
         editable=True,
     )
-    cell_range_id_by_order: _F = models.IntegerField(
-        verbose_name="順序付きセル範囲ID",
+    min_col: _F = models.PositiveIntegerField(
+        verbose_name="セルのカラム初期番号",
         blank=False,
         null=False,
-        default=None,
+        default=1,
         editable=True,
         help_text=(
-            "An ID based on merged order is assigned by cell range."
+            "1-based column index where the range starts, as in openpyxl."
+        )
+    )
+    max_col: _F = models.PositiveIntegerField(
+        verbose_name="セルのカラム終端番号",
+        blank=False,
+        null=False,
+        default=1,
+        editable=True,
+    )
+    min_row: _F = models.PositiveIntegerField(
+        verbose_name="セルのロー初期番号",
+        blank=False,
+        null=False,
+        default=1,
+        editable=True,
+        help_text=(
+            "1-based row index where the range starts, as in openpyxl."
         )
     )
+    max_row: _F = models.PositiveIntegerField(
+        verbose_name="セルのロー終端番号",
+        blank=False,
+        null=False,
+        default=1,
+        editable=True,
+    )
+    cell_text: _F = models.ForeignKey(
+        CellTextModel,
+        on_delete=models.PROTECT,
+        related_name="cell_ranges",
+        default=empty_text_hash,
+        help_text=(
+            "The key is the hash of the text, so it is also used to diff two sheets."
+        )
+    )
+    coord_hash: _F = models.CharField(
+        verbose_name="座標のハッシュ",
+        blank=True,
+        null=False,
+        default="",
+        max_length=32,
+        db_index=True,
+        editable=False,
+        help_text=(
+            "blake2b digest of the bounds, used to diff two sheets."
+        )
+    )
+    flag_names: Tuple[str, ...] = (
+        "has_parent", "is_dev_exp_id", "include_title",
+        "is_end_of_sheet", "is_space",
+    )
+    tree_fields: Tuple[str, ...] = (
+        "effective_cell_width", "effective_cell_height",
+    ) + flag_names
+    record_fields: Tuple[str, ...] = (
+        "cell_range_id_by_order", "cell_range_id",
+        "effective_cell_width", "effective_cell_height",
+        "column_start", "column_end", "column_size",
+        "row_start", "row_end", "row_size",
+        "min_col", "max_col", "min_row", "max_row",
+    ) + flag_names
+    objects: models.Manager = CellRangeManager()
 
     class Meta:
-        db_table: str = "row"
+        db_table: str = "cell_range"
+
+    @classmethod
+    def iter_records(cls,
+                     excel_sheet: _ESM,
+                     chunk_size: int = 2000,
+                     version: Optional[int] = None,
+                     **flags: bool) -> Iterator[dict[str, Any]]:
+        # 'iterator' streams the rows through a server-side cursor
+        # on PostgreSQL instead of caching the whole queryset.
+        for flag in flags:
+            if flag not in cls.flag_names:
+                raise KeyError(f"'{flag}' is not a flag of cell range.")
+
+        queryset: QuerySet = cls.objects.\
+            filter(excel_sheet=excel_sheet, **flags).\
+            order_by("cell_range_id_by_order")
+        content: Any = F("cell_text__text")
+        if version is not None:
+            content = ContentHistoryModel.get_version_content(version)
+        values: Iterator[dict[str, Any]] = queryset.\
+            values(*cls.record_fields, cell_content=content).\
+            iterator(chunk_size=chunk_size)
+
+        value: dict[str, Any]
+        for value in values:
+            yield {
+                "cell_range_id_by_order": value["cell_range_id_by_order"],
+                "cell_range_id": str(value["cell_range_id"]),
+                "column": {
+                    "start": value["column_start"],
+                    "end": value["column_end"],
+                    "size": value["column_size"],
+                },
+                "row": {
+                    "start": value["row_start"],
+                    "end": value["row_end"],
+                    "size": value["row_size"],
+                },
+                "bounds": {
+                    "min_col": value["min_col"],
+                    "max_col": value["max_col"],
+                    "min_row": value["min_row"],
+                    "max_row": value["max_row"],
+                },
+                "effective_cell_width": value["effective_cell_width"],
+                "effective_cell_height": value["effective_cell_height"],
+                "flags": {flag: value[flag] for flag in cls.flag_names},
+                "content": value["cell_content"],
+            }
+
+    @classmethod
+    def get_tree_fields(cls, node: "CellNode") -> dict[str, Any]:
+        # the fields the cell tree decides, set again by a re-analysis
+        return {
+            "effective_cell_width": node.width,
+            "effective_cell_height": node.height,
+            "has_parent": node.has_parent(),
+            "is_dev_exp_id": node.is_dev_experience(),
+            "include_title": node.is_title(),
+            "is_end_of_sheet": node.is_end_of_sheet(),
+            "is_space": node.is_space(),
+        }
+
+    @classmethod
+    def build_model(cls,
+                    excel_sheet: _ESM,
+                    sheet: "SheetData",
+                    cell_range: "CellRange",
+                    idx: int = 0,
+                    node: Optional["CellNode"] = None) -> _CRM:
+        from upload_excel import ingest
+        return ingest.build_cell_range(cls, excel_sheet, sheet, cell_range, idx, node)
 
     @classmethod
     def create_model(cls,
-                     cell_range_model: _CRM,
-                     cell_range: CellRange,
-                     idx: int = 0) -> _RM:
-        start, end = get_bound_items(cell_range, bound_type="digit")
-        cell_size: int = cell_range.max_row - cell_range.min_row + 1
-        row: _RM = cls(cell_range=cell_range_model,
-                       cell_start=start,
-                       cell_end=end,
-                       cell_size=cell_size,
-                       cell_range_id_by_order=idx)
-        row.save(force_insert=True)
-        return row
-
-
-
-class ContentModel(models.Model):
+                     excel_sheet: _ESM,
+                     sheet: Union["SheetData", "Worksheet"],
+                     cell_range: "CellRange",
+                     idx: int = 0,
+                     node: Optional["CellNode"] = None) -> _CRM:
+        from upload_excel.utils.sheet_data import as_sheet_data
+
+        # An inputting parent model which has been defined
+        # as foreign key model must be saved before.
+        crm: _CRM = cls.build_model(excel_sheet, as_sheet_data(sheet), cell_range, idx, node)
+        crm.save(force_insert=True)
+        return crm
+
+    def as_proxy(self, proxy: type) -> _T:
+        fields: List[models.Field] = self._meta.concrete_fields
+        output: _T = proxy.from_db(self._state.db,
+                                   [field.attname for field in fields],
+                                   [getattr(self, field.attname) for field in fields])
+        output.cell_content = self.cell_content
+        return output
+
+    @property
+    def cell_content(self) -> str:
+        # The text is loaded with the row by CellRangeManager, and an
+        # assigned text is addressed by its hash before it is interned.
+        if "_cell_content" not in self.__dict__:
+            self._cell_content = self.cell_text.text
+        return self._cell_content
+
+    @cell_content.setter
+    def cell_content(self, val: Optional[str]) -> None:
+        self._cell_content = val or ""
+        self.cell_text_id = hash_content(self._cell_content)
+
+    def set_hashes(self) -> None:
+        self.coord_hash = hash_coord(self.min_row, self.min_col, self.max_row, self.max_col)
+
+    def save(self, *args: Tuple[Any, ...], **kwargs: dict[str, Any]) -> None:
+        self.set_hashes()
+        CellTextModel.intern([self.cell_content])
+        super().save(*args, **kwargs)
+
+    @property
+    def column(self) -> _CM:
+        return self.as_proxy(ColumnModel)
+
+    @property
+    def row(self) -> _RM:
+        return self.as_proxy(RowModel)
+
+    @property
+    def content(self) -> _CTM:
+        return self.as_proxy(ContentModel)
+
+
+# Column, Row and Content used to be 1:1 children of a cell range.
+# They are kept as proxies over 'cell_range' so that their forms and
+# attribute names keep working on the denormalized row.
+class ColumnModel(CellRangeModel):
+    class Meta:
+        proxy: bool = True
+
+    @property
+    def cell_range(self) -> CellRangeModel:
+        return self
+
+    @property
+    def cell_start(self) -> str:
+        return self.column_start
+
+    @cell_start.setter
+    def cell_start(self, val: str) -> None:
+        self.column_start = val
+        from openpyxl.utils.cell import column_index_from_string
+        self.min_col = column_index_from_string(val)
+        self.column_size = self.max_col - self.min_col + 1
+
+    @property
+    def cell_end(self) -> str:
+        return self.column_end
+
+    @cell_end.setter
+    def cell_end(self, val: str) -> None:
+        self.column_end = val
+        from openpyxl.utils.cell import column_index_from_string
+        self.max_col = column_index_from_string(val)
+        self.column_size = self.max_col - self.min_col + 1
+
+    @property
+    def cell_size(self) -> int:
+        return self.column_size
+
+
+class RowModel(CellRangeModel):
+    class Meta:
+        proxy: bool = True
+
+    @property
+    def cell_range(self) -> CellRangeModel:
+        return self
+
+    @property
+    def cell_start(self) -> str:
+        return self.row_start
+
+    @cell_start.setter
+    def cell_start(self, val: str) -> None:
+        self.row_start = val
+        self.min_row = int(val)
+        self.row_size = self.max_row - self.min_row + 1
+
+    @property
+    def cell_end(self) -> str:
+        return self.row_end
+
+    @cell_end.setter
+    def cell_end(self, val: str) -> None:
+        self.row_end = val
+        self.max_row = int(val)
+        self.row_size = self.max_row - self.min_row + 1
+
+    @property
+    def cell_size(self) -> int:
+        return self.row_size
+
+
+class ContentModel(CellRangeModel):
+    class Meta:
+        proxy: bool = True
+
+    @property
+    def cell_range(self) -> CellRangeModel:
+        return self
+
+    @classmethod
+    def extract_cell_content(cls,
+                             sheet: Union["SheetData", "Worksheet"],
+                             cell_range: "CellRange") -> str:
+        from upload_excel import ingest
+        return ingest.extract_cell_content(sheet, cell_range)
+
+class CellSearchModel(models.Model):
+    cell_range: _F = models.OneToOneField(
+        CellRangeModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search"
+    )
+    excel_sheet: _F = models.ForeignKey(
+        ExcelSheetModel,
+        on_delete=models.CASCADE,
+        related_name="search_entries"
+    )
+    ngram_text: _F = models.TextField(
+        verbose_name="検索用のn-gram",
+        blank=True,
+        null=False,
+        default="",
+        editable=False,
+        help_text=(
+            "Space separated tokens of the cell content. "
+            "ASCII words are kept whole and the other texts are split into bi-grams."
+        )
+    )
+    bulk_batch_size: int = 500
+
+    class Meta:
+        db_table: str = "cell_search"
+
+    @classmethod
+    def index_cell_ranges(cls,
+                          cell_ranges: List[CellRangeModel],
+                          is_new: bool = False) -> None:
+        # Empty ranges of a new sheet have nothing to be found by,
+        # but an edited range must drop its previous tokens.
+        entries: List[_CSM] = [
+            cls(cell_range_id=crm.pk,
+                excel_sheet_id=crm.excel_sheet_id,
+                ngram_text=to_document(crm.cell_content))
+            for crm in cell_ranges
+            if not (is_new and len(crm.cell_content or "") == 0)
+        ]
+        with transaction.atomic():
+            if not is_new:
+                cls.objects.filter(cell_range_id__in=[entry.cell_range_id for entry in entries]).delete()
+            cls.objects.bulk_create(entries, batch_size=cls.bulk_batch_size)
+
+
+class ContentHistoryModel(models.Model):
     cell_range: _F = models.ForeignKey(
         CellRangeModel,
         on_delete=models.CASCADE,
-        related_name="content"
+        related_name="history"
+    )
+    excel_sheet: _F = models.ForeignKey(
+        ExcelSheetModel,
+        on_delete=models.CASCADE,
+        related_name="history"
+    )
+    sheet_version: _F = models.PositiveIntegerField(
+        verbose_name="シートのバージョン",
+        blank=False,
+        null=False,
+        default=0,
+        help_text=(
+            "The content is valid from this version of the sheet until the next row "
+            "of the same cell range. Version 0 holds the content before the first edit."
+        )
     )
     cell_content: _F = models.TextField(
         verbose_name="セルの内容",
         blank=True,
         null=True,
         default="",
-        editable=True,
     )
-    cell_range_id_by_order: _F = models.IntegerField(
-        verbose_name="順序付きセル範囲ID",
+    created_time: _F = models.DateTimeField(
+        verbose_name="編集日時",
+        blank=False,
+        null=False,
+        default=timezone.now,
+    )
+    bulk_batch_size: int = 500
+
+    class Meta:
+        db_table: str = "content_history"
+        constraints: List[models.BaseConstraint] = [
+            models.UniqueConstraint(
+                fields=["cell_range", "sheet_version"],
+                name="unique_content_history_version",
+            ),
+        ]
+
+    @classmethod
+    def get_unrecorded_contents(cls, contents: List[CellRangeModel]) -> dict[int, str]:
+        # Copy on write; a range keeps its ingested content only once
+        # it is edited for the first time.
+        pks: List[int] = [content.pk for content in contents]
+        recorded: set = set(
+            cls.objects.
+            filter(cell_range_id__in=pks).
+            values_list("cell_range_id", flat=True).
+            distinct()
+        )
+        return dict(
+            CellRangeModel.objects.
+            filter(pk__in=[pk for pk in pks if pk not in recorded]).
+            values_list("pk", "cell_text__text")
+        )
+
+    @classmethod
+    def record(cls,
+               excel_sheet: ExcelSheetModel,
+               contents: List[CellRangeModel],
+               originals: dict[int, str] = {}) -> None:
+        entries: List[_CHM] = [
+            cls(cell_range_id=pk, excel_sheet=excel_sheet, sheet_version=0, cell_content=content)
+            for pk, content in originals.items()
+        ]
+        entries += [
+            cls(cell_range_id=content.pk,
+                excel_sheet=excel_sheet,
+                sheet_version=excel_sheet.sheet_version,
+                cell_content=content.cell_content)
+            for content in contents
+        ]
+        cls.objects.bulk_create(entries, batch_size=cls.bulk_batch_size)
+
+    @classmethod
+    def get_version_content(cls, version: int) -> Coalesce:
+        # The latest row at or before 'version' is found through the
+        # (cell_range, sheet_version) index; a range never edited has
+        # no rows and keeps its current content.
+        historic: Subquery = Subquery(
+            cls.objects.
+            filter(cell_range=OuterRef("pk"), sheet_version__lte=version).
+            order_by("-sheet_version").
+            values("cell_content")[:1]
+        )
+        return Coalesce(historic, F("cell_text__text"))
+
+    @classmethod
+    def compact(cls, excel_sheet: ExcelSheetModel, keep_versions: int) -> int:
+        # Versions older than the last 'keep_versions' are squashed into
+        # version 0, so they all read as the oldest kept state.
+        cutoff: int = excel_sheet.sheet_version - keep_versions
+        if cutoff <= 0:
+            return 0
+
+        old: QuerySet = cls.objects.filter(excel_sheet=excel_sheet, sheet_version__lte=cutoff)
+        latest: Subquery = Subquery(
+            cls.objects.
+            filter(cell_range=OuterRef("cell_range"), sheet_version__lte=cutoff).
+            order_by("-sheet_version").
+            values("pk")[:1]
+        )
+        keep: List[int] = list(old.filter(pk=latest).values_list("pk", flat=True))
+        with transaction.atomic():
+            deleted, _ = old.exclude(pk__in=keep).delete()
+            cls.objects.filter(pk__in=keep).update(sheet_version=0)
+        return deleted
+
+
+class IngestDiagnosticsModel(models.Model):
+    excel_sheet: _F = models.OneToOneField(
+        ExcelSheetModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="diagnostics"
+    )
+    stage_durations: _F = models.JSONField(
+        verbose_name="ステージ毎の処理時間",
         blank=False,
         null=False,
+        default=dict,
+        help_text=(
+            "Seconds spent in each stage of the ingestion."
+        )
+    )
+    memory: _F = models.JSONField(
+        verbose_name="ステージ毎のメモリ使用量",
+        blank=True,
+        null=True,
         default=None,
-        editable=True,
         help_text=(
-            "An ID based on merged order is assigned by cell range."
+            "Peak and retained bytes of each stage and the lines allocating the most, "
+            "taken by tracemalloc when the upload asked for a memory profile. "
+            "tracemalloc measures the whole process; a stage marked 'shared' ran "
+            "along another profiled upload, whose allocations it includes."
         )
     )
+    created_time: _F = models.DateTimeField(
+        verbose_name="記録日時",
+        blank=False,
+        null=False,
+        default=timezone.now,
+    )
+
     class Meta:
-        db_table: str = "content"
+        db_table: str = "ingest_diagnostics"
 
     @classmethod
-    def extract_cell_content(cls,
-                             worksheet: Worksheet,
-                             cell_range: CellRange) -> str:
-        coord: str = cell_range.coord
-        if ":" not in coord:
-            coord = ":".join([coord, coord])
-
-        start, end = coord.split(":")
-        cell_info: Tuple[Tuple[Cell, ...]] = worksheet[start:end]
-        output: str = ""
-        for cell_row in cell_info:
-            for cell in cell_row:
-                concat_size = len(output)
-                output += get_cell_value(cell, concat_size)
-        return output.replace(br_pattern, "\n")
+    def record(cls, excel_sheet: ExcelSheetModel, recorder: StageRecorder) -> _IDM:
+        return cls.objects.create(excel_sheet=excel_sheet,
+                                  stage_durations=dict(recorder.durations),
+                                  memory=getattr(recorder, "memory", None))
+
+
+class SheetRasterModel(models.Model):
+    excel_sheet: _F = models.OneToOneField(
+        ExcelSheetModel,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="raster"
+    )
+    labels: _F = models.BinaryField(
+        verbose_name="ラベル配列",
+        blank=False,
+        null=False,
+        help_text=(
+            "Compressed NumPy archive of the label raster the cell tree was built from; "
+            "each cell holds the label of the range covering it."
+        )
+    )
+    cell_map: _F = models.JSONField(
+        verbose_name="ラベル毎のセル範囲",
+        blank=False,
+        null=False,
+        default=dict,
+        help_text=(
+            "Text, coordinate and info of each label, as read at the ingestion."
+        )
+    )
+    child_rate: _F = models.FloatField(
+        verbose_name="子ノードの閾値",
+        blank=False,
+        null=False,
+        default=0.5,
+        help_text=(
+            "child_rate the flags of the ranges were last computed with."
+        )
+    )
+    analysis_time: _F = models.DateTimeField(
+        verbose_name="解析日時",
+        blank=False,
+        null=False,
+        default=timezone.now,
+    )
+
+    class Meta:
+        db_table: str = "sheet_raster"
 
     @classmethod
-    def create_model(cls,
-                     cell_range_model: _CRM,
-                     worksheet: Worksheet,
-                     cell_range: CellRange,
-                     idx: int = 0) -> _CTM:
-        cell_content = cls.extract_cell_content(worksheet, cell_range)
-        content: _CTM = cls(cell_range=cell_range_model,
-                            cell_content=cell_content,
-                            cell_range_id_by_order=idx)
-        content.save(force_insert=True)
-        return content
+    def record(cls,
+               excel_sheet: ExcelSheetModel,
+               labels: bytes,
+               cell_map: dict[str, dict[str, Any]]) -> _SRM:
+        return cls.objects.create(excel_sheet=excel_sheet,
+                                  labels=labels,
+                                  cell_map=cell_map,
+                                  child_rate=excel_sheet.child_rate)
@@ -0,0 +1,50 @@
+from typing import Any, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+from upload_excel.models import CellRangeModel, ExcelSheetModel, SheetRasterModel
+from upload_excel.utils.cell_tree import CellNode, CellTree
+from upload_excel.utils.raster import load_cell_map, load_raster
+
+# A sheet is analysed again from the raster kept at its ingestion, so a
+# change of the classification or of child_rate reaches the stored sheets
+# without their workbooks. openpyxl is not needed here.
+
+
+def reanalyze_sheet(excel_sheet: ExcelSheetModel, child_rate: Optional[float] = None) -> int:
+    # Returns the number of ranges whose flags or sizes changed.
+    raster: SheetRasterModel = SheetRasterModel.objects.get(excel_sheet=excel_sheet)
+    child_rate = child_rate if child_rate is not None else excel_sheet.child_rate
+    tree: CellTree = CellTree.create_tree(load_raster(bytes(raster.labels)),
+                                          child_rate=child_rate,
+                                          cell_content=load_cell_map(raster.cell_map))
+
+    cell_ranges: List[CellRangeModel] = list(
+        CellRangeModel.objects.
+        filter(excel_sheet=excel_sheet).
+        select_related(None).
+        only("pk", "cell_range_id_by_order", *CellRangeModel.tree_fields)
+    )
+    changed: List[CellRangeModel] = []
+    for crm in cell_ranges:
+        node: Optional[CellNode] = tree.tree.get(crm.cell_range_id_by_order, None)
+        if node is None:
+            continue
+        fields: dict[str, Any] = CellRangeModel.get_tree_fields(node)
+        if all(getattr(crm, name) == value for name, value in fields.items()):
+            continue
+        for name, value in fields.items():
+            setattr(crm, name, value)
+        changed.append(crm)
+
+    with transaction.atomic():
+        CellRangeModel.objects.bulk_update(changed,
+                                           CellRangeModel.tree_fields,
+                                           batch_size=excel_sheet.bulk_batch_size)
+        raster.child_rate = child_rate
+        raster.analysis_time = timezone.now()
+        raster.save(update_fields=["child_rate", "analysis_time"])
+        # the display changes, so cached pages and exports must not be reused
+        if len(changed) > 0:
+            excel_sheet.touch()
+    return len(changed)
@@ -0,0 +1,123 @@
+from typing import Any, List, Tuple, TypeVar
+
+from django.db import connection
+from django.db.models import F, QuerySet
+from upload_excel.models import CellRangeModel
+from upload_excel.utils.ngram import is_too_short, tokenize
+
+_SB = TypeVar("_SB", bound="SearchBackend")
+
+# (cell_range pk, rank); a bigger rank is a better match.
+_Hit = Tuple[int, float]
+
+
+class SearchBackend:
+    vendor: str = ""
+
+    def scan(self, words: List[str], limit: int, offset: int) -> List[_Hit]:
+        # no index; a text containing every word matches
+        queryset: QuerySet = CellRangeModel.objects.all()
+        for word in dict.fromkeys(words):
+            queryset = queryset.filter(cell_text__text__icontains=word)
+        values: List[int] = queryset.\
+            order_by("pk").\
+            values_list("pk", flat=True)[offset:offset + limit]
+        return [(pk, 0.0) for pk in values]
+
+    def match(self, tokens: List[str], limit: int, offset: int) -> List[_Hit]:
+        # The n-grams of a word are all in a text containing the word.
+        return self.scan(tokens, limit, offset)
+
+    def substring(self, query: str, limit: int, offset: int) -> List[_Hit]:
+        return self.scan([query], limit, offset)
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[_Hit]:
+        tokens: List[str] = tokenize(query)
+        if len(tokens) == 0:
+            return []
+        if is_too_short(tokens):
+            return self.substring(query, limit, offset)
+        return self.match(tokens, limit, offset)
+
+
+class PostgresSearchBackend(SearchBackend):
+    vendor: str = "postgresql"
+    # Both expressions are backed by GIN indexes created in the migration.
+    match_sql: str = (
+        "SELECT s.cell_range_id, ts_rank(to_tsvector('simple', s.ngram_text), q) AS rank "
+        "FROM cell_search s, plainto_tsquery('simple', %s) q "
+        "WHERE to_tsvector('simple', s.ngram_text) @@ q "
+        "ORDER BY rank DESC, s.cell_range_id LIMIT %s OFFSET %s"
+    )
+    substring_sql: str = (
+        "SELECT r.id, similarity(t.text, %s) AS rank FROM cell_range r "
+        "JOIN cell_text t ON t.text_hash = r.cell_text_id "
+        "WHERE t.text ILIKE %s "
+        "ORDER BY rank DESC, r.id LIMIT %s OFFSET %s"
+    )
+
+    def match(self, tokens: List[str], limit: int, offset: int) -> List[_Hit]:
+        with connection.cursor() as cursor:
+            cursor.execute(self.match_sql, [" ".join(tokens), limit, offset])
+            return cursor.fetchall()
+
+    def substring(self, query: str, limit: int, offset: int) -> List[_Hit]:
+        pattern: str = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        with connection.cursor() as cursor:
+            cursor.execute(self.substring_sql, [query, pattern, limit, offset])
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    vendor: str = "sqlite"
+    # bm25() is smaller for a better match, so it is negated as the rank.
+    match_sql: str = (
+        "SELECT rowid, -bm25(cell_search_fts) AS rank FROM cell_search_fts "
+        "WHERE cell_search_fts MATCH %s "
+        "ORDER BY rank DESC, rowid LIMIT %s OFFSET %s"
+    )
+
+    def match(self, tokens: List[str], limit: int, offset: int) -> List[_Hit]:
+        fts_query: str = " ".join(f'"{token}"' for token in tokens)
+        with connection.cursor() as cursor:
+            cursor.execute(self.match_sql, [fts_query, limit, offset])
+            return cursor.fetchall()
+
+
+backends: dict[str, type] = {
+    PostgresSearchBackend.vendor: PostgresSearchBackend,
+    SQLiteSearchBackend.vendor: SQLiteSearchBackend,
+}
+
+
+def get_backend() -> _SB:
+    # Other databases fall back to a plain substring scan.
+    return backends.get(connection.vendor, SearchBackend)()
+
+
+def search_cells(query: str, page: int = 1, per_page: int = 20) -> Tuple[List[dict[str, Any]], bool]:
+    offset: int = (page - 1) * per_page
+    hits: List[_Hit] = get_backend().search(query, limit=per_page + 1, offset=offset)
+    has_next: bool = len(hits) > per_page
+    hits = hits[:per_page]
+
+    ranges: dict[int, dict[str, Any]] = {
+        value["pk"]: value
+        for value in CellRangeModel.objects.
+        filter(pk__in=[pk for pk, _ in hits]).
+        values("pk", "excel_sheet_id", "cell_range_id_by_order",
+               "cell_range_id", cell_content=F("cell_text__text"))
+    }
+    output: List[dict[str, Any]] = []
+    for pk, rank in hits:
+        if pk not in ranges:
+            continue
+        value: dict[str, Any] = ranges[pk]
+        output.append({
+            "sheet_id": str(value["excel_sheet_id"]),
+            "cell_range_id_by_order": value["cell_range_id_by_order"],
+            "cell_range_id": str(value["cell_range_id"]),
+            "content": value["cell_content"],
+            "rank": float(rank),
+        })
+    return output, has_next
@@ -1,3 +1,690 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import zipfile
+from typing import IO, Any, Callable, List, Optional, Tuple
+from unittest import mock
+from urllib.parse import unquote
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase)
+from django.urls import reverse
+from openpyxl.worksheet.cell_range import CellRange
+from upload_excel.bulk import find_sources, run_ingestion
+from upload_excel.models import (CellRangeModel, CellSearchModel,
+                                 CellTextModel, ContentHistoryModel,
+                                 ContentModel, ExcelSheetModel,
+                                 SheetRasterModel)
+from upload_excel.search import SearchBackend, search_cells
+from upload_excel.utils.cell_tree import CellNode, CellTree
+from upload_excel.utils.mapped import MappedFile
+from upload_excel.utils.queries import count_batches, query_budget
+from upload_excel.utils.sheet_data import SheetData, load_sheet_data
+from upload_excel.utils.stages import MemoryStageRecorder
+from upload_excel.utils.synthetic import WorkbookGenerator
+from upload_excel.utils.xlsx import UnsupportedWorkbook
+from upload_excel.views import CellUpdateView
+
+# rows of the synthetic sheets every budget is checked against
+sheet_sizes: tuple = (20, 60, 120)
+
+
+def make_workbook(rows: int) -> bytes:
+    buffer: io.BytesIO = io.BytesIO()
+    WorkbookGenerator(rows=rows).save(buffer)
+    return buffer.getvalue()
+
+
+def create_sheet(rows: int) -> ExcelSheetModel:
+    return ExcelSheetModel.create_from_binary(io.BytesIO(make_workbook(rows)))
+
+
+def get_upload_budget(excel_sheet: ExcelSheetModel) -> int:
+    # The sheet and the display cost a query each; only the INSERTs of the
+    # bulk creates grow with the sheet.
+    ranges: int = CellRangeModel.objects.filter(excel_sheet=excel_sheet).count()
+    texts: int = CellRangeModel.objects.filter(excel_sheet=excel_sheet).values("cell_text").distinct().count()
+    entries: int = CellSearchModel.objects.filter(excel_sheet=excel_sheet).count()
+    return 2 \
+        + count_batches(CellTextModel, texts, CellTextModel.bulk_batch_size) \
+        + count_batches(CellRangeModel, ranges, ExcelSheetModel.bulk_batch_size) \
+        + count_batches(CellSearchModel, entries, CellSearchModel.bulk_batch_size)
+
+
+def asgi_get(path: str, query_string: bytes = b"") -> Tuple[int, bytes]:
+    # The test clients read a streamed body after the view, off the event
+    # loop; the ASGI handler reads it on the loop, as a server does.
+    messages: List[dict[str, Any]] = []
+    scope: dict[str, Any] = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": unquote(path), "raw_path": path.encode(),
+        "query_string": query_string, "root_path": "", "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        messages.append(message)
+
+    # as the test clients do, the connection of the test is not closed
+    # at the end of the request
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    try:
+        async_to_sync(get_asgi_application())(scope, receive, send)
+    finally:
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+    body: bytes = b"".join(message.get("body", b"") for message in messages
+                           if message["type"] == "http.response.body")
+    return messages[0]["status"], body
+
+
+class QueryBudgetTests(TransactionTestCase):
+    # The budgets go through the routed views, so the async ones count the
+    # queries of their workers and the middleware's too. The workers only
+    # see committed rows, so the tests do not run in a transaction.
+    def get_first_content(self, excel_sheet: ExcelSheetModel) -> ContentModel:
+        return ContentModel.objects.\
+            filter(excel_sheet=excel_sheet, is_end_of_sheet=False).\
+            order_by("cell_range_id_by_order").\
+            first()
+
+    def update_kwargs(self, excel_sheet: ExcelSheetModel) -> dict[str, Any]:
+        content: ContentModel = self.get_first_content(excel_sheet)
+        return {"user_id": str(excel_sheet.sheet_id),
+                "cell_id": content.cell_range_id_by_order,
+                "cell_uuid": str(content.cell_range_id)}
+
+    def assert_budget(self,
+                      call: Callable[[], HttpResponse],
+                      budget: Any,
+                      label: str,
+                      status_code: int = 200) -> HttpResponse:
+        with query_budget(budget, label):
+            response: HttpResponse = call()
+            if response.streaming:
+                # a streamed body queries as it is read
+                response.streaming_content = [b"".join(response.streaming_content)]
+        self.assertEqual(response.status_code, status_code)
+        return response
+
+    def test_upload_post(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                data: dict[str, Any] = {"file": SimpleUploadedFile("sheet.xlsx", make_workbook(rows))}
+                self.assert_budget(
+                    lambda: self.client.post(reverse("index"), data),
+                    lambda: get_upload_budget(ExcelSheetModel.objects.latest("sheet_create_time")),
+                    "AsyncUploadExcelView.post", status_code=302,
+                )
+
+    def test_display_get(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                url: str = reverse("upload_excel:upload", kwargs={"user_id": str(esm.sheet_id)})
+                self.assert_budget(lambda: self.client.get(url), 3, "AsyncCellUploadView.get")
+
+    def test_update_get(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                url: str = reverse("upload_excel:update", kwargs=self.update_kwargs(esm))
+                self.assert_budget(lambda: self.client.get(url), 2, "AsyncCellUpdateView.get")
+
+    def test_update_post(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                url: str = reverse("upload_excel:update", kwargs=self.update_kwargs(esm))
+                self.assert_budget(lambda: self.client.post(url, {"cell_content": "edited"}), 12,
+                                   "AsyncCellUpdateView.post")
+                self.assertEqual(self.get_first_content(esm).cell_content, "edited")
+
+    def test_batch_update_post(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                contents: List[ContentModel] = list(
+                    ContentModel.objects.
+                    filter(excel_sheet=esm, is_end_of_sheet=False).
+                    order_by("cell_range_id_by_order")[:10]
+                )
+                body: str = json.dumps({"cells": [
+                    {"cell_range_id_by_order": content.cell_range_id_by_order,
+                     "cell_range_id": str(content.cell_range_id),
+                     "text": f"edited {n}"}
+                    for n, content in enumerate(contents)
+                ]})
+                url: str = reverse("upload_excel:batch_update", kwargs={"user_id": str(esm.sheet_id)})
+                # ten edits are written in bulk, so they cost what one does
+                self.assert_budget(lambda: self.client.post(url, body, content_type="application/json"),
+                                   11, "CellBatchUpdateView.post")
+
+    def test_ranges_get(self) -> None:
+        for rows in sheet_sizes:
+            with self.subTest(rows=rows):
+                esm: ExcelSheetModel = create_sheet(rows)
+                url: str = reverse("upload_excel:ranges", kwargs={"user_id": str(esm.sheet_id)})
+                # the conditional check, the sheet and one iterator over the ranges
+                response: HttpResponse = self.assert_budget(lambda: self.client.get(url), 3,
+                                                            "SheetRangesStreamView.get")
+                self.assertEqual(len(response.getvalue().splitlines()),
+                                 CellRangeModel.objects.filter(excel_sheet=esm).count())
+
+
+class CellUpdateTests(TestCase):
+    def setUp(self) -> None:
+        self.esm: ExcelSheetModel = create_sheet(20)
+        self.other: ExcelSheetModel = create_sheet(20)
+        self.content: ContentModel = ContentModel.objects.\
+            filter(excel_sheet=self.other, is_end_of_sheet=False).\
+            order_by("cell_range_id_by_order").\
+            first()
+
+    def get_url(self, user_id: str, cell_uuid: Optional[str] = None) -> str:
+        return reverse("upload_excel:update", kwargs={"user_id": user_id,
+                                                      "cell_id": self.content.cell_range_id_by_order,
+                                                      "cell_uuid": cell_uuid or str(self.content.cell_range_id)})
+
+    def test_other_sheet(self) -> None:
+        # the cell of another sheet is not edited through this one
+        url: str = self.get_url(str(self.esm.sheet_id))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(url, {"cell_content": "edited"}).status_code, 404)
+        for esm in [self.esm, self.other]:
+            esm.refresh_from_db()
+            self.assertEqual(esm.sheet_version, 1)
+        self.assertFalse(ContentHistoryModel.objects.exists())
+        self.assertNotEqual(ContentModel.objects.get(pk=self.content.pk).cell_content, "edited")
+
+    def test_malformed_id(self) -> None:
+        for url in [self.get_url("not-a-uuid"), self.get_url(str(self.other.sheet_id), "not-a-uuid")]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+                self.assertEqual(self.client.post(url, {"cell_content": "edited"}).status_code, 404)
+
+    def test_update_contents(self) -> None:
+        # the history of a sheet never records the cells of another one
+        self.content.cell_content = "edited"
+        with self.assertRaises(ValueError):
+            self.esm.update_contents([self.content])
+        self.esm.refresh_from_db()
+        self.assertEqual(self.esm.sheet_version, 1)
+        self.assertFalse(ContentHistoryModel.objects.exists())
+
+        self.other.update_contents([self.content])
+        self.assertEqual(list(ContentHistoryModel.objects.order_by("sheet_version").values_list("excel_sheet", "sheet_version")),
+                         [(self.other.sheet_id, 0), (self.other.sheet_id, 2)])
+
+    def test_sync_view(self) -> None:
+        request: Any = RequestFactory().post("/", {"cell_content": "edited"})
+        with self.assertRaises(Http404):
+            CellUpdateView.as_view()(request,
+                                     user_id=str(self.esm.sheet_id),
+                                     cell_id=self.content.cell_range_id_by_order,
+                                     cell_uuid=str(self.content.cell_range_id))
+        CellUpdateView.as_view()(request,
+                                 user_id=str(self.other.sheet_id),
+                                 cell_id=self.content.cell_range_id_by_order,
+                                 cell_uuid=str(self.content.cell_range_id))
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.sheet_version, 2)
+        self.assertEqual(ContentModel.objects.get(pk=self.content.pk).cell_content, "edited")
+
+
+class SheetRangesStreamTests(TestCase):
+    def test_asgi(self) -> None:
+        esm: ExcelSheetModel = create_sheet(60)
+        url: str = reverse("upload_excel:ranges", kwargs={"user_id": str(esm.sheet_id)})
+        status, body = asgi_get(url)
+        self.assertEqual(status, 200)
+        records: List[dict[str, Any]] = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(records), CellRangeModel.objects.filter(excel_sheet=esm).count())
+
+        status, body = asgi_get(url, b"is_space=0")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.splitlines()),
+                         CellRangeModel.objects.filter(excel_sheet=esm, is_space=False).count())
+
+    def test_missing_sheet(self) -> None:
+        for user_id in ["not-a-uuid", "00000000-0000-0000-0000-000000000000"]:
+            with self.subTest(user_id=user_id):
+                response: HttpResponse = self.client.get(reverse("upload_excel:ranges",
+                                                                 kwargs={"user_id": user_id}))
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"error": f"No such sheet; '{user_id}'."})
+
+
+class SheetDiffTests(TestCase):
+    def test_missing_sheet(self) -> None:
+        esm: ExcelSheetModel = create_sheet(20)
+        for user_id, other_id in [("not-a-uuid", str(esm.sheet_id)),
+                                  (str(esm.sheet_id), "not-a-uuid"),
+                                  (str(esm.sheet_id), "00000000-0000-0000-0000-000000000000")]:
+            with self.subTest(user_id=user_id, other_id=other_id):
+                url: str = reverse("upload_excel:diff", kwargs={"user_id": user_id, "other_id": other_id})
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_same_sheet(self) -> None:
+        esm: ExcelSheetModel = create_sheet(20)
+        url: str = reverse("upload_excel:diff", kwargs={"user_id": str(esm.sheet_id), "other_id": str(esm.sheet_id)})
+        response: HttpResponse = self.client.get(url, {"format": "json"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["edited"], [])
+
+
+class CellBatchUpdateTests(TestCase):
+    def post_edits(self, excel_sheet: ExcelSheetModel, edits: List[dict[str, Any]]) -> HttpResponse:
+        # the test client skips the CSRF check JsonApiCsrfTests covers
+        url: str = reverse("upload_excel:batch_update", kwargs={"user_id": str(excel_sheet.sheet_id)})
+        return self.client.post(url, json.dumps({"cells": edits}), content_type="application/json")
+
+    def test_missing_sheet(self) -> None:
+        for user_id in ["not-a-uuid", "00000000-0000-0000-0000-000000000000"]:
+            with self.subTest(user_id=user_id):
+                url: str = reverse("upload_excel:batch_update", kwargs={"user_id": user_id})
+                response: HttpResponse = self.client.post(url, json.dumps({"cells": []}),
+                                                          content_type="application/json")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"error": f"No such sheet; '{user_id}'."})
+
+    def test_duplicate_range(self) -> None:
+        esm: ExcelSheetModel = create_sheet(20)
+        content: ContentModel = ContentModel.objects.\
+            filter(excel_sheet=esm, is_end_of_sheet=False).\
+            order_by("cell_range_id_by_order").\
+            first()
+        edit: dict[str, Any] = {"cell_range_id_by_order": content.cell_range_id_by_order,
+                                "cell_range_id": str(content.cell_range_id)}
+        response: HttpResponse = self.post_edits(esm, [dict(edit, text="first"), dict(edit, text="second")])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(json.loads(response.content)["errors"]), ["1"])
+        esm.refresh_from_db()
+        self.assertEqual(esm.sheet_version, 1)
+        self.assertFalse(ContentHistoryModel.objects.filter(excel_sheet=esm).exists())
+
+    def test_update(self) -> None:
+        esm: ExcelSheetModel = create_sheet(20)
+        contents: List[ContentModel] = list(
+            ContentModel.objects.
+            filter(excel_sheet=esm, is_end_of_sheet=False).
+            order_by("cell_range_id_by_order")[:2]
+        )
+        response: HttpResponse = self.post_edits(esm, [
+            {"cell_range_id_by_order": content.cell_range_id_by_order,
+             "cell_range_id": str(content.cell_range_id),
+             "text": f"edited {n}"}
+            for n, content in enumerate(contents)
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {"updated": 2, "sheet_version": 2})
+        for n, content in enumerate(contents):
+            content.refresh_from_db()
+            self.assertEqual(content.cell_content, f"edited {n}")
+
+
+class JsonApiCsrfTests(TestCase):
+    def setUp(self) -> None:
+        self.client: Client = Client(enforce_csrf_checks=True)
+        self.esm: ExcelSheetModel = create_sheet(20)
+        self.other: ExcelSheetModel = create_sheet(20)
+        content: ContentModel = ContentModel.objects.\
+            filter(excel_sheet=self.esm, is_end_of_sheet=False).\
+            order_by("cell_range_id_by_order").\
+            first()
+        self.requests: List[Tuple[str, str]] = [
+            (reverse("upload_excel:batch_update", kwargs={"user_id": str(self.esm.sheet_id)}),
+             json.dumps({"cells": [{"cell_range_id_by_order": content.cell_range_id_by_order,
+                                    "cell_range_id": str(content.cell_range_id),
+                                    "text": "edited"}]})),
+            (reverse("upload_excel:transfer", kwargs={"user_id": str(self.esm.sheet_id)}),
+             json.dumps({"source": str(self.other.sheet_id)})),
+        ]
+
+    def test_without_token(self) -> None:
+        for url, body in self.requests:
+            with self.subTest(url=url):
+                response: HttpResponse = self.client.post(url, body, content_type="application/json")
+                self.assertEqual(response.status_code, 403)
+        self.esm.refresh_from_db()
+        self.assertEqual(self.esm.sheet_version, 1)
+
+    def test_token_header(self) -> None:
+        # the cookie of the index page goes back in the header
+        self.client.get(reverse("index"))
+        token: str = self.client.cookies[settings.CSRF_COOKIE_NAME].value
+        for url, body in self.requests:
+            with self.subTest(url=url):
+                response: HttpResponse = self.client.post(url, body, content_type="application/json",
+                                                          HTTP_X_CSRFTOKEN=token)
+                self.assertEqual(response.status_code, 200)
+
+
+class SheetTransferTests(TestCase):
+    def test_missing_sheet(self) -> None:
+        esm: ExcelSheetModel = create_sheet(20)
+        for user_id in ["not-a-uuid", "00000000-0000-0000-0000-000000000000"]:
+            with self.subTest(user_id=user_id):
+                url: str = reverse("upload_excel:transfer", kwargs={"user_id": user_id})
+                response: HttpResponse = self.client.post(url, json.dumps({"source": str(esm.sheet_id)}),
+                                                          content_type="application/json")
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {"error": f"No such sheet; '{user_id}'."})
+
+
+class FallbackSearchTests(TestCase):
+    # the backend of the databases with no full text index of their own
+    def setUp(self) -> None:
+        self.esm: ExcelSheetModel = create_sheet(20)
+        self.content: ContentModel = ContentModel.objects.\
+            filter(excel_sheet=self.esm, is_end_of_sheet=False).\
+            order_by("cell_range_id_by_order").\
+            first()
+        self.content.cell_content = "Python 案件管理"
+        self.esm.update_contents([self.content])
+
+    def search(self, query: str) -> List[int]:
+        return [pk for pk, _ in SearchBackend().search(query)]
+
+    def test_match(self) -> None:
+        self.assertEqual(self.search("案件管理"), [self.content.pk])
+        self.assertEqual(self.search("python 管理"), [self.content.pk])
+        self.assertEqual(self.search("案件 java"), [])
+
+    def test_substring(self) -> None:
+        self.assertEqual(self.search("管"), [self.content.pk])
+
+    def test_search_cells(self) -> None:
+        with mock.patch("upload_excel.search.get_backend", SearchBackend):
+            cells, has_next = search_cells("案件管理")
+        self.assertEqual([cell["content"] for cell in cells], ["Python 案件管理"])
+        self.assertFalse(has_next)
+
+
+class IngestionTests(TestCase):
+    def setUp(self) -> None:
+        self.directory: str = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for name, rows in [("a.xlsx", 20), ("b.xlsx", 20), ("c.xlsx", 60)]:
+            with open(os.path.join(self.directory, name), "wb") as fp:
+                fp.write(make_workbook(rows))
+
+    def ingest(self, **kwargs: Any) -> dict[str, dict[str, Any]]:
+        results: List[dict[str, Any]] = []
+        run_ingestion(find_sources(self.directory), results.append, workers=0, **kwargs)
+        return {os.path.basename(result["name"]): result for result in results}
+
+    def test_duplicate_in_run(self) -> None:
+        # a.xlsx and b.xlsx are the same workbook
+        results: dict[str, dict[str, Any]] = self.ingest()
+        self.assertEqual({name: result["status"] for name, result in results.items()},
+                         {"a.xlsx": "ingested", "b.xlsx": "skipped", "c.xlsx": "ingested"})
+        self.assertEqual(results["b.xlsx"]["duplicate_of"], results["a.xlsx"]["name"])
+        self.assertEqual(ExcelSheetModel.objects.count(), 2)
+
+    def test_resume(self) -> None:
+        self.ingest()
+        self.assertEqual({result["status"] for result in self.ingest().values()}, {"skipped"})
+        self.assertEqual(ExcelSheetModel.objects.count(), 2)
+        results: dict[str, dict[str, Any]] = self.ingest(resume=False)
+        self.assertEqual(results["b.xlsx"]["status"], "skipped")
+        self.assertEqual(ExcelSheetModel.objects.count(), 4)
+
+
+def make_typed_workbook() -> bytes:
+    # a cell of every kind the native reader decodes itself
+    workbook: openpyxl.Workbook = openpyxl.Workbook()
+    sheet: Any = workbook.active
+    sheet["A1"] = "merged"
+    sheet.merge_cells("A1:C2")
+    sheet["A3"] = datetime.datetime(2022, 4, 1, 9, 30)
+    sheet["B3"] = datetime.date(2022, 4, 1)
+    sheet["C3"] = datetime.time(18, 45, 30)
+    sheet["D3"] = datetime.timedelta(hours=26, minutes=5)
+    sheet["D3"].number_format = "[h]:mm:ss"
+    sheet["A4"] = True
+    sheet["B4"] = False
+    sheet["C4"] = 12
+    sheet["D4"] = 0.25
+    sheet["A5"] = "=SUM(C4:D4)"
+    sheet["B5"] = "_x000D_ is kept as text"
+    sheet["C5"] = "改行\nあり"
+    sheet["E7"] = "after a gap"
+    sheet.merge_cells("B6:D6")
+    buffer: io.BytesIO = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def share_strings(binary: bytes) -> bytes:
+    # openpyxl writes inline strings; Excel keeps them in sharedStrings.xml
+    # and escapes a literal '_x' as '_x005F_x'
+    strings: List[str] = []
+
+    def share(match: re.Match) -> str:
+        strings.append(match.group(2).replace("_x", "_x005F_x"))
+        return f'<c r="{match.group(1)}" t="s"><v>{len(strings) - 1}</v></c>'
+
+    buffer: io.BytesIO = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(binary)) as source, zipfile.ZipFile(buffer, "w") as target:
+        for name in source.namelist():
+            data: str = source.read(name).decode("utf-8")
+            if name == "xl/worksheets/sheet1.xml":
+                data = re.sub(r'<c r="(\w+)" t="inlineStr"><is><t>(.*?)</t></is></c>', share, data, flags=re.S)
+            elif name == "xl/_rels/workbook.xml.rels":
+                data = data.replace("</Relationships>",
+                                    '<Relationship Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                                    'relationships/sharedStrings" Target="sharedStrings.xml" Id="rId9" />'
+                                    "</Relationships>")
+            elif name == "[Content_Types].xml":
+                data = data.replace("</Types>",
+                                    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/'
+                                    'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml" />'
+                                    "</Types>")
+            target.writestr(name, data)
+        items: str = "".join(f'<si><t xml:space="preserve">{text}</t></si>' for text in strings)
+        target.writestr("xl/sharedStrings.xml",
+                        '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                        f'count="{len(strings)}" uniqueCount="{len(strings)}">{items}</sst>')
+    return buffer.getvalue()
+
+
+def read_sheet_data(binary: bytes, reader: str) -> dict[str, Any]:
+    sheet_data: SheetData = load_sheet_data(io.BytesIO(binary), reader)
+    try:
+        return {
+            "reader": sheet_data.reader,
+            "size": (sheet_data.max_row, sheet_data.max_column),
+            "merged_cells": sorted(cell_range.coord for cell_range in sheet_data.merged_cells.ranges),
+            "values": [list(row) for row in sheet_data.iter_values(
+                CellRange(min_row=1, min_col=1, max_row=sheet_data.max_row, max_col=sheet_data.max_column)
+            )],
+        }
+    finally:
+        sheet_data.close()
+
+
+class SheetDataTests(SimpleTestCase):
+    workbooks: dict[str, Callable[[], bytes]] = {
+        "typed": make_typed_workbook,
+        "typed, shared strings": lambda: share_strings(make_typed_workbook()),
+        "synthetic": lambda: make_workbook(60),
+    }
+
+    def test_native_parity(self) -> None:
+        for name, make in self.workbooks.items():
+            with self.subTest(workbook=name):
+                binary: bytes = make()
+                native: dict[str, Any] = read_sheet_data(binary, "native")
+                expected: dict[str, Any] = read_sheet_data(binary, "openpyxl")
+                self.assertEqual(native.pop("reader"), "native")
+                expected.pop("reader")
+                self.assertEqual(native, expected)
+
+    def test_typed_values(self) -> None:
+        values: List[List[Any]] = read_sheet_data(share_strings(make_typed_workbook()), "native")["values"]
+        self.assertEqual(values[0][:3], ["merged", None, None])
+        self.assertEqual(values[2], [datetime.datetime(2022, 4, 1, 9, 30), datetime.datetime(2022, 4, 1),
+                                     datetime.time(18, 45, 30), datetime.timedelta(hours=26, minutes=5), None])
+        self.assertEqual(values[3][:2], [True, False])
+        # a formula has no cached value in a workbook openpyxl wrote
+        self.assertEqual(values[4][:2], [None, "_x000D_ is kept as text"])
+
+    def test_unsupported_workbook(self) -> None:
+        # the stream the native reader has consumed is read again by openpyxl
+        def read_and_fail(binary: IO[bytes]) -> Any:
+            binary.read()
+            raise UnsupportedWorkbook("not handled")
+
+        binary: bytes = make_typed_workbook()
+        with mock.patch("upload_excel.utils.sheet_data.read_active_sheet", read_and_fail):
+            fallback: dict[str, Any] = read_sheet_data(binary, "native")
+        self.assertEqual(fallback, read_sheet_data(binary, "openpyxl"))
+
+
+class CellTreeEdgeTests(SimpleTestCase):
+    # 0 is the blank outside every range
+    raster: np.ndarray = np.array([[1, 2, 0],
+                                   [3, 2, 0],
+                                   [4, 4, 4]])
+
+    def test_next_rates(self) -> None:
+        tree: CellTree = CellTree(self.raster)
+        # right: 2 has a left edge of two rows, one next to 1 and one next to 3
+        self.assertEqual(tree.get_next_rates(use_dim=0),
+                         {1: [(2, 0.5)], 2: [(0, 0)], 3: [(2, 0.5)]})
+        # bottom: 4 has a top edge of three columns, one under each of 0, 2 and 3
+        self.assertEqual(tree.get_next_rates(use_dim=1),
+                         {0: [(4, 1 / 3)], 1: [(3, 1.0)], 2: [(4, 1 / 3)], 3: [(4, 1 / 3)]})
+
+    def test_make_edges(self) -> None:
+        tree: CellTree = CellTree(self.raster, child_rate=0.4)
+        tree.make_nodes(np.unique(self.raster).tolist(), {})
+        tree.make_edges(use_dim=0)
+        tree.make_edges(use_dim=1)
+        nodes: dict[int, CellNode] = tree.tree
+
+        def idx(cells: List[CellNode]) -> List[int]:
+            return [cell.idx for cell in cells]
+
+        self.assertEqual(idx(nodes[1].right_children), [2])
+        self.assertEqual(idx(nodes[3].right_children), [2])
+        self.assertEqual(set(idx(nodes[2].left_parents)), {1, 3})
+        self.assertEqual(idx(nodes[2].forced_right), [0])
+        self.assertEqual(idx(nodes[2].right_children), [])
+        self.assertEqual(idx(nodes[1].bottom_children), [3])
+        # a third of the top edge of 4 is under 3, less than child_rate
+        self.assertEqual(idx(nodes[3].bottom_children), [])
+        self.assertEqual(idx(nodes[3].forced_bottom), [4])
+        self.assertEqual(idx(nodes[0].right_children + nodes[0].bottom_children), [])
+
+
+class ReanalysisTests(TestCase):
+    def test_unchanged(self) -> None:
+        # the stored ranges are what the ingestion's own analysis gave
+        esm: ExcelSheetModel = create_sheet(60)
+        self.assertEqual(esm.reanalyze(), 0)
+        esm.refresh_from_db()
+        self.assertEqual(esm.sheet_version, 1)
+
+    def test_child_rate(self) -> None:
+        esm: ExcelSheetModel = create_sheet(60)
+        self.assertGreater(esm.reanalyze(child_rate=0.99), 0)
+        esm.refresh_from_db()
+        self.assertEqual(esm.sheet_version, 2)
+        self.assertEqual(SheetRasterModel.objects.get(excel_sheet=esm).child_rate, 0.99)
+        # back to the rate of the ingestion
+        self.assertGreater(esm.reanalyze(), 0)
+        self.assertEqual(esm.reanalyze(), 0)
+        esm.refresh_from_db()
+        self.assertEqual(esm.sheet_version, 3)
+
+
+class IngestCloseTests(TestCase):
+    def test_failure(self) -> None:
+        # a failing ingestion still closes the archive or map of the sheet
+        sheets: List[SheetData] = []
+
+        def load(*args: Any, **kwargs: Any) -> SheetData:
+            sheet: SheetData = load_sheet_data(*args, **kwargs)
+            sheet.close = mock.Mock(wraps=sheet.close)
+            sheets.append(sheet)
+            return sheet
+
+        for reader in ["native", "openpyxl"]:
+            with self.subTest(reader=reader):
+                with mock.patch("upload_excel.ingest.load_sheet_data", load), \
+                        mock.patch("upload_excel.ingest.create_cell_ranges", side_effect=RuntimeError("failed")):
+                    with self.assertRaises(RuntimeError):
+                        ExcelSheetModel.create_from_binary(io.BytesIO(make_workbook(20)), reader=reader)
+                sheets.pop().close.assert_called_once_with()
+
+
+class MappedFileTests(SimpleTestCase):
+    def test_not_a_zip(self) -> None:
+        # shorter than the end of central directory zipfile seeks back to
+        with tempfile.NamedTemporaryFile(suffix=".xlsx") as fp:
+            fp.write(b"not a zip")
+            fp.flush()
+            with MappedFile(fp.name) as binary:
+                with self.assertRaises(zipfile.BadZipFile):
+                    zipfile.ZipFile(binary)
+
+
+class MemoryStageRecorderTests(SimpleTestCase):
+    def test_overlapping_recorders(self) -> None:
+        # the first recorder to close must leave the tracing to the other one
+        first: MemoryStageRecorder = MemoryStageRecorder()
+        second: MemoryStageRecorder = MemoryStageRecorder()
+        second_started: threading.Event = threading.Event()
+        first_closed: threading.Event = threading.Event()
+        errors: List[BaseException] = []
+
+        def run_second() -> None:
+            try:
+                with second.stage("load"):
+                    second_started.set()
+                    first_closed.wait(10)
+                    data: bytes = bytes(100000)
+                with second.stage("tree"):
+                    del data
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                second.close()
+
+        with first.stage("load"):
+            thread: threading.Thread = threading.Thread(target=run_second)
+            thread.start()
+            second_started.wait(10)
+        first.close()
+        first_closed.set()
+        thread.join(10)
+
+        self.assertEqual(errors, [])
+        self.assertTrue(first.memory["load"]["shared"])
+        self.assertTrue(second.memory["load"]["shared"])
+        self.assertGreaterEqual(second.memory["load"]["retained_bytes"], 100000)
+        self.assertFalse(second.memory["tree"]["shared"])
+        self.assertFalse(tracemalloc.is_tracing())
@@ -0,0 +1,154 @@
+import hashlib
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, List, Optional, Tuple, TypeVar
+
+from django.core.cache import cache
+from django.db.models import F
+from upload_excel.models import ContentModel, ExcelSheetModel
+from upload_excel.utils.titles import get_section_title
+
+# numpy is imported by the methods rebuilding the tree, not with the views
+if TYPE_CHECKING:
+    import numpy as np
+    from upload_excel.utils.cell_tree import CellTree
+
+_ESM = TypeVar("_ESM", bound=ExcelSheetModel)
+
+# (target cell_range_id_by_order, source cell_range_id_by_order list)
+_Mapping = List[Tuple[int, List[int]]]
+
+layout_fields: Tuple[str, ...] = (
+    "cell_range_id_by_order", "min_row", "min_col", "max_row", "max_col",
+    "is_end_of_sheet", "include_title",
+)
+
+
+class SheetLayout:
+    def __init__(self, excel_sheet: _ESM) -> None:
+        self.excel_sheet = excel_sheet
+        self.ranges: dict[int, dict[str, Any]] = {
+            value["cell_range_id_by_order"]: value
+            for value in ContentModel.objects.
+            filter(excel_sheet=excel_sheet).
+            values(*layout_fields, cell_content=F("cell_text__text"))
+        }
+        self.titles: dict[int, str] = {}
+        for idx, value in self.ranges.items():
+            title: Optional[str] = get_section_title(value["cell_content"], value["include_title"])
+            if title is not None and not value["is_end_of_sheet"]:
+                self.titles[idx] = title
+
+    @property
+    def layout_hash(self) -> str:
+        # Only the structure is hashed; the text of the titles is a part of it,
+        # but any other content is not.
+        blake = hashlib.blake2b(digest_size=16)
+        for idx in sorted(self.ranges):
+            value: dict[str, Any] = self.ranges[idx]
+            blake.update(repr((idx, value["min_row"], value["min_col"],
+                               value["max_row"], value["max_col"],
+                               value["is_end_of_sheet"], self.titles.get(idx, ""))).encode())
+        return blake.hexdigest()
+
+    def position(self, idx: int) -> Tuple[int, int]:
+        return self.ranges[idx]["min_row"], self.ranges[idx]["min_col"]
+
+    def create_raster(self) -> "np.ndarray":
+        import numpy as np
+
+        # The label raster of the ingestion is rebuilt from the stored bounds;
+        # margins come last, so they never cover a cell range.
+        shape: Tuple[int, int] = (
+            max([value["max_row"] for value in self.ranges.values()], default=0),
+            max([value["max_col"] for value in self.ranges.values()], default=0),
+        )
+        raster: np.ndarray = np.zeros(shape, dtype=int)
+        for idx in sorted(self.ranges, key=lambda i: (self.ranges[i]["is_end_of_sheet"], i)):
+            value: dict[str, Any] = self.ranges[idx]
+            area: np.ndarray = raster[value["min_row"] - 1:value["max_row"],
+                                      value["min_col"] - 1:value["max_col"]]
+            area[area == 0] = idx
+        return raster
+
+    def create_tree(self) -> "CellTree":
+        from upload_excel.utils.cell_tree import CellTree
+
+        cell_content: dict[int, dict[str, Any]] = {
+            idx: {"text": value["cell_content"], "info": {"is_EOS": value["is_end_of_sheet"]}}
+            for idx, value in self.ranges.items()
+        }
+        return CellTree.create_tree(self.create_raster(), cell_content=cell_content)
+
+    def get_sections(self) -> dict[str, List[int]]:
+        # Children are walked from each title through right and bottom
+        # edges; a range belongs to the first title reaching it.
+        from upload_excel.utils.cell_tree import CellNode
+
+        tree: CellTree = self.create_tree()
+        sections: dict[str, List[int]] = {}
+        visited: set = set(self.titles)
+        for title_idx in sorted(self.titles, key=self.position):
+            children: List[int] = []
+            queue: Deque[CellNode] = deque([tree.tree[title_idx]])
+            while len(queue) > 0:
+                node: CellNode = queue.popleft()
+                for child in node.right_children + node.bottom_children:
+                    if not isinstance(child, CellNode) or child.idx in visited:
+                        continue
+                    visited.add(child.idx)
+                    if child.is_end_of_sheet():
+                        continue
+                    children.append(child.idx)
+                    queue.append(child)
+            sections.setdefault(self.titles[title_idx], []).extend(sorted(children, key=self.position))
+        return sections
+
+
+def align_layouts(source: SheetLayout, target: SheetLayout) -> _Mapping:
+    # Ranges of a section are paired in reading order; the leftover of a
+    # longer source section goes to the last range of the target section.
+    source_sections: dict[str, List[int]] = source.get_sections()
+    target_sections: dict[str, List[int]] = target.get_sections()
+    mapping: _Mapping = []
+    for title, target_children in target_sections.items():
+        source_children: List[int] = source_sections.get(title, [])
+        if len(target_children) == 0 or len(source_children) == 0:
+            continue
+        size: int = len(target_children)
+        for n, target_idx in enumerate(target_children):
+            sources: List[int] = source_children[n:n + 1]
+            if n == size - 1:
+                sources = source_children[n:]
+            if len(sources) > 0:
+                mapping.append((target_idx, sources))
+    return mapping
+
+
+def get_mapping(source: SheetLayout, target: SheetLayout, timeout: Optional[int] = None) -> _Mapping:
+    key: str = f"layout_transfer:{source.layout_hash}:{target.layout_hash}"
+    mapping: Optional[_Mapping] = cache.get(key)
+    if mapping is None:
+        mapping = align_layouts(source, target)
+        cache.set(key, mapping, timeout)
+    return mapping
+
+
+def transfer_contents(source_sheet: _ESM, target_sheet: _ESM) -> int:
+    source: SheetLayout = SheetLayout(source_sheet)
+    target: SheetLayout = SheetLayout(target_sheet)
+    mapping: _Mapping = get_mapping(source, target)
+
+    texts: dict[int, str] = {}
+    for target_idx, source_indices in mapping:
+        lines: List[str] = [source.ranges[idx]["cell_content"] for idx in source_indices
+                            if source.ranges[idx]["cell_content"]]
+        texts[target_idx] = "\n".join(lines)
+
+    contents: List[ContentModel] = list(
+        ContentModel.objects.filter(excel_sheet=target_sheet, cell_range_id_by_order__in=texts)
+    )
+    for content in contents:
+        content.cell_content = texts[content.cell_range_id_by_order]
+    if len(contents) > 0:
+        target_sheet.update_contents(contents)
+    return len(contents)
@@ -5,10 +5,30 @@ app_name = "upload_excel"
 urlpatterns = [
     path(
         "user=?<str:user_id>?",
-        views.CellUploadView.as_view(), name="upload"
+        views.AsyncCellUploadView.as_view(), name="upload"
     ),
     path(
         "user=?<str:user_id>?/cell=?<int:cell_id>@<str:cell_uuid>?",
-        views.CellUpdateView.as_view(), name="update"
+        views.AsyncCellUpdateView.as_view(), name="update"
     ),
-]
\ No newline at end of file
+    path(
+        "user=?<str:user_id>?/ranges/",
+        views.SheetRangesStreamView.as_view(), name="ranges"
+    ),
+    path(
+        "user=?<str:user_id>?/cells/",
+        views.CellBatchUpdateView.as_view(), name="batch_update"
+    ),
+    path(
+        "user=?<str:user_id>?/transfer/",
+        views.SheetTransferView.as_view(), name="transfer"
+    ),
+    path(
+        "user=?<str:user_id>?/diff=?<str:other_id>?/",
+        views.SheetDiffView.as_view(), name="diff"
+    ),
+    path(
+        "search/",
+        views.CellSearchView.as_view(), name="search"
+    ),
+]
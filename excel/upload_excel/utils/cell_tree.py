@@ -1,20 +1,13 @@
-from typing import Any, List, Optional, TypeVar, Union
+from typing import Any, List, Optional, Tuple, TypeVar, Union
 
 import numpy as np
+from upload_excel.utils.titles import (find_title,  # noqa: F401
+                                       get_section_title, titles)
 
 _CellNode = TypeVar("_CellNode", bound="CellNode")
 _CellTree = TypeVar("_CellTree", bound="CellTree")
 _N = TypeVar("_N", bound=List[Union[int, "CellNode"]])
 
-titles = [
-    "スタッフＩＤ",
-    "スペックシート", "ポートフォリオ",
-    "スキル要約", "扱ったデータ・モデル",
-    "アピールポイント", "資格",
-    "前職や研究内容など", "経験",
-    "待機期間", "業務外に取り組んでいること"
-]
-
 
 def is_num(txt: str) -> bool:
     try:
@@ -337,10 +330,14 @@ class CellNode:
     def find_next_cells(self, array, use_dim: int = 0, tree = {}):
         next_cells = self.get_next_cells(array, use_dim=use_dim)
         next_uniques = np.unique(next_cells)
-
-        for cell in next_uniques:
-            next_rate = self.calc_next_rate_by_cell(array, next_cells, cell, use_dim=use_dim)
-
+        next_rates: List[Tuple[int, float]] = [
+            (cell, self.calc_next_rate_by_cell(array, next_cells, cell, use_dim=use_dim))
+            for cell in next_uniques
+        ]
+        self.add_next_cells(next_rates, use_dim=use_dim, tree=tree)
+
+    def add_next_cells(self, next_rates: List[Tuple[int, float]], use_dim: int = 0, tree = {}) -> None:
+        for cell, next_rate in next_rates:
             if next_rate > self.child_rate:
                 self.add_child(tree.get(cell, cell), use_dim)
 
@@ -397,13 +394,33 @@ class CellTree:
         for child in children:
             self.tree[child.idx].add_parent(node, use_dim=use_dim)
 
+    def get_next_rates(self, use_dim: int = 0) -> dict[int, List[Tuple[int, float]]]:
+        # find_next_cells of every node at once: the cells next to each cell,
+        # and the share of their left (top) edge touching it, in one pass
+        array: np.ndarray = self.excel_array if use_dim == 0 else self.excel_array.T
+        before: np.ndarray = array[:, :-1]
+        after: np.ndarray = array[:, 1:]
+        border: np.ndarray = before != after
+        output: dict[int, List[Tuple[int, float]]] = {}
+        if not np.any(border):
+            return output
+
+        edge_labels, edge_counts = np.unique(np.r_[array[:, 0], after[border]], return_counts=True)
+        edges: dict[int, int] = dict(zip(edge_labels.tolist(), edge_counts.tolist()))
+        pairs, counts = np.unique(np.c_[before[border], after[border]], axis=0, return_counts=True)
+        for (cell, next_cell), count in zip(pairs.tolist(), counts.tolist()):
+            next_rate: float = count / edges[next_cell] if next_cell > 0 else 0
+            output.setdefault(cell, []).append((next_cell, next_rate))
+        return output
+
     def make_edges(self, use_dim: int = 0) -> None:
+        next_rates: dict[int, List[Tuple[int, float]]] = self.get_next_rates(use_dim)
         for idx, node in self.tree.items():
             if idx < 0:
                 continue
-            node.find_next_cells(self.excel_array,
-                                 use_dim=use_dim,
-                                 tree=self.tree)
+            node.add_next_cells(next_rates.get(idx, []),
+                                use_dim=use_dim,
+                                tree=self.tree)
 
             for list_method in ["get_next_list", "get_forced_next_list"]:
                 self.register_children_to_parents(node=node,
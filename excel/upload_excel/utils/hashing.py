@@ -0,0 +1,24 @@
+import hashlib
+from typing import IO, Optional
+
+# 128-bit digests; collisions are not a concern for the sizes of a sheet.
+digest_size: int = 16
+
+
+def hash_text(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=digest_size).hexdigest()
+
+
+def hash_coord(min_row: int, min_col: int, max_row: int, max_col: int) -> str:
+    return hash_text(f"{min_row}:{min_col}:{max_row}:{max_col}")
+
+
+def hash_content(content: Optional[str]) -> str:
+    return hash_text(content or "")
+
+
+def hash_stream(fp: IO[bytes], chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.blake2b(digest_size=digest_size)
+    for chunk in iter(lambda: fp.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
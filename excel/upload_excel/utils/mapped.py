@@ -0,0 +1,40 @@
+import io
+import mmap
+
+
+class MappedFile(io.RawIOBase):
+    # mmap of Python 3.11 lacks 'seekable', which zipfile asks for, so the
+    # map is read through this file object. Reads copy only what is asked
+    # for; the rest stays in the page cache.
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        with open(path, "rb") as fp:
+            self.buffer: mmap.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b: bytearray) -> int:
+        data: bytes = self.buffer.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # mmap raises ValueError out of range, where a file raises OSError;
+        # zipfile only turns the latter into BadZipFile
+        try:
+            self.buffer.seek(offset, whence)
+        except ValueError as e:
+            raise OSError(str(e)) from e
+        return self.buffer.tell()
+
+    def tell(self) -> int:
+        return self.buffer.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.buffer.close()
+        super().close()
@@ -0,0 +1,41 @@
+import re
+import unicodedata
+from typing import List
+
+# ASCII words stay whole; any other run of word characters (kanji, kana,
+# full-width letters...) has no spaces between words, so it is split into
+# overlapping n-grams.
+ascii_pattern: str = r"[0-9a-z]+"
+other_pattern: str = r"(?:(?![0-9a-z])[^\W_])+"
+token_finder = re.compile(f"{ascii_pattern}|{other_pattern}").finditer
+ascii_matcher = re.compile(ascii_pattern).fullmatch
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def ngrams(text: str, n: int = 2) -> List[str]:
+    if len(text) <= n:
+        return [text]
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def tokenize(text: str, n: int = 2) -> List[str]:
+    output: List[str] = []
+    for match in token_finder(normalize(text)):
+        word: str = match.group()
+        if ascii_matcher(word):
+            output.append(word)
+        else:
+            output += ngrams(word, n)
+    return output
+
+
+def to_document(text: str, n: int = 2) -> str:
+    return " ".join(tokenize(text, n))
+
+
+def is_too_short(tokens: List[str], n: int = 2) -> bool:
+    # a query made only of single characters cannot hit an n-gram index
+    return all(len(token) < n for token in tokens)
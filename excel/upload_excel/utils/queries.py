@@ -0,0 +1,99 @@
+import math
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, Optional, Tuple, Type, Union
+
+from django.db import connection, connections, models
+from django.db.backends.signals import connection_created
+
+literal_patterns: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\((?:\?,\s*)+\?\)"), "(...)"),
+    (re.compile(r"(?:\(\.\.\.\),\s*)+\(\.\.\.\)"), "(...)"),
+]
+
+# transaction control; TestCase turns every atomic block into a savepoint
+control_pattern: re.Pattern = re.compile(r"^\s*(?:BEGIN|SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b", re.I)
+
+
+def get_data_queries(queries: List[dict[str, str]]) -> List[dict[str, str]]:
+    return [query for query in queries if not control_pattern.match(query["sql"])]
+
+
+def normalize_sql(sql: str) -> str:
+    # Queries differing only by their parameters share a pattern.
+    for pattern, repl in literal_patterns:
+        sql = pattern.sub(repl, sql)
+    return sql
+
+
+def get_worst_patterns(queries: List[dict[str, str]], top: int = 5) -> List[Tuple[str, int]]:
+    counter: Counter = Counter(normalize_sql(query["sql"]) for query in queries)
+    return counter.most_common(top)
+
+
+def format_report(label: str, budget: int, queries: List[dict[str, str]], top: int = 5) -> str:
+    lines: List[str] = [f"{label} ran {len(queries)} queries over a budget of {budget}; the most repeated are"]
+    for sql, count in get_worst_patterns(queries, top):
+        lines.append(f"  {count:>5} x {sql[:300]}")
+    return "\n".join(lines)
+
+
+def count_batches(model: Type[models.Model], size: int, batch_size: Optional[int] = None) -> int:
+    # number of INSERTs a bulk_create of 'size' rows takes on this backend
+    if size == 0:
+        return 0
+    max_size: int = connection.ops.bulk_batch_size(model._meta.concrete_fields, range(size))
+    if batch_size is not None:
+        max_size = min(batch_size, max_size)
+    return math.ceil(size / max(max_size, 1))
+
+
+_captured_queries: ContextVar[Optional[List[dict[str, str]]]] = ContextVar("captured_queries", default=None)
+
+
+def capture_query(execute: Callable, sql: str, params: Any, many: bool, context: dict[str, Any]) -> Any:
+    queries: Optional[List[dict[str, str]]] = _captured_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    start: float = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if not many:
+            sql = context["connection"].ops.last_executed_query(context["cursor"], sql, params)
+        queries.append({"sql": sql, "time": f"{time.perf_counter() - start:.3f}"})
+
+
+def install_query_capture(sender: Any, connection: Any, **kwargs: Any) -> None:
+    if capture_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(capture_query)
+
+
+connection_created.connect(install_query_capture)
+
+
+@contextmanager
+def query_budget(budget: Union[int, Callable[[], int]],
+                 label: str = "the block",
+                 top: int = 5) -> Iterator[List[dict[str, str]]]:
+    # The queries are captured in the context of the block, which the
+    # async views hand to sync_to_async and to the ingest workers, so the
+    # queries of other threads count too. A callable budget is evaluated
+    # after the block, so it may depend on what the block has created.
+    for wrapper in connections.all():
+        install_query_capture(None, wrapper)
+    captured: List[dict[str, str]] = []
+    token: Any = _captured_queries.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured_queries.reset(token)
+    limit: int = budget() if callable(budget) else budget
+    queries: List[dict[str, str]] = get_data_queries(captured)
+    if len(queries) > limit:
+        raise AssertionError(format_report(label, limit, queries, top))
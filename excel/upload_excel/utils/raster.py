@@ -0,0 +1,35 @@
+import io
+from typing import Any
+
+import numpy as np
+
+# The label raster of a sheet and the text of its labels, as they are kept
+# by SheetRasterModel. They are all CellTree needs, so a sheet is analysed
+# again without its workbook or openpyxl.
+
+
+def dump_raster(labels: np.ndarray) -> bytes:
+    buffer: io.BytesIO = io.BytesIO()
+    np.savez_compressed(buffer, labels=labels.astype(np.int32))
+    return buffer.getvalue()
+
+
+def load_raster(blob: bytes) -> np.ndarray:
+    with np.load(io.BytesIO(blob)) as data:
+        return data["labels"]
+
+
+def dump_cell_map(out_map: dict[int, dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    # JSON keys are strings; the openpyxl range is kept as its coordinate
+    return {
+        str(idx): {
+            "text": outs["text"],
+            "coord": outs["merged_cell"].coord,
+            "info": outs.get("info", {}),
+        }
+        for idx, outs in out_map.items()
+    }
+
+
+def load_cell_map(cell_map: dict[str, dict[str, Any]]) -> dict[int, dict[str, Any]]:
+    return {int(idx): outs for idx, outs in cell_map.items()}
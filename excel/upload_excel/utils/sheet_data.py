@@ -0,0 +1,110 @@
+from abc import ABC, abstractmethod
+from typing import IO, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import openpyxl
+from openpyxl import Workbook
+from openpyxl.worksheet.cell_range import CellRange, MultiCellRange
+from openpyxl.worksheet.worksheet import Worksheet
+from upload_excel.utils.xlsx import UnsupportedWorkbook, read_active_sheet
+
+readers: Tuple[str, ...] = ("native", "openpyxl")
+
+
+class SheetData(ABC):
+    # What an ingestion reads of a sheet: its size, its merged ranges and
+    # the values of a range, row by row. Blank cells are None.
+    reader: str = ""
+
+    @property
+    @abstractmethod
+    def max_row(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def max_column(self) -> int:
+        ...
+
+    @property
+    @abstractmethod
+    def merged_cells(self) -> MultiCellRange:
+        ...
+
+    @abstractmethod
+    def iter_values(self, cell_range: CellRange) -> Iterator[Iterable[Any]]:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class WorksheetData(SheetData):
+    reader: str = "openpyxl"
+
+    def __init__(self, worksheet: Worksheet, workbook: Optional[Workbook] = None) -> None:
+        self.worksheet: Worksheet = worksheet
+        self.workbook: Optional[Workbook] = workbook
+
+    @property
+    def max_row(self) -> int:
+        return self.worksheet.max_row
+
+    @property
+    def max_column(self) -> int:
+        return self.worksheet.max_column
+
+    @property
+    def merged_cells(self) -> MultiCellRange:
+        return self.worksheet.merged_cells
+
+    def iter_values(self, cell_range: CellRange) -> Iterator[Iterable[Any]]:
+        return self.worksheet.iter_rows(min_row=cell_range.min_row,
+                                        max_row=cell_range.max_row,
+                                        min_col=cell_range.min_col,
+                                        max_col=cell_range.max_col,
+                                        values_only=True)
+
+    def close(self) -> None:
+        if self.workbook is not None:
+            self.workbook.close()
+
+
+class GridData(SheetData):
+    reader: str = "native"
+
+    def __init__(self, values: np.ndarray, merged_cells: List[str]) -> None:
+        self.values: np.ndarray = values
+        self._merged_cells: MultiCellRange = MultiCellRange([CellRange(ref) for ref in merged_cells])
+
+    @property
+    def max_row(self) -> int:
+        return self.values.shape[0]
+
+    @property
+    def max_column(self) -> int:
+        return self.values.shape[1]
+
+    @property
+    def merged_cells(self) -> MultiCellRange:
+        return self._merged_cells
+
+    def iter_values(self, cell_range: CellRange) -> Iterator[Iterable[Any]]:
+        return iter(self.values[cell_range.min_row - 1:cell_range.max_row,
+                                cell_range.min_col - 1:cell_range.max_col])
+
+
+def as_sheet_data(sheet: Union[SheetData, Worksheet]) -> SheetData:
+    return sheet if isinstance(sheet, SheetData) else WorksheetData(sheet)
+
+
+def load_sheet_data(binary: IO[bytes], reader: str = "native") -> SheetData:
+    if reader not in readers:
+        raise ValueError(f"'reader' must be one of {', '.join(readers)}")
+    if reader == "native":
+        try:
+            return GridData(*read_active_sheet(binary))
+        except UnsupportedWorkbook:
+            binary.seek(0)
+    workbook: Workbook = openpyxl.load_workbook(binary, data_only=True)
+    return WorksheetData(workbook.active, workbook)
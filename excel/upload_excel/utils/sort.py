@@ -108,7 +108,7 @@ class AbstractListMaker:
         remain_time: float = time_per_acc * not_accomplished_rate
         return remain_time
 
-    def progress_bar(self) -> str:
+    def progress_text(self) -> str:
         bar: str = self.accomplished_bar + self.not_accomplished_bar
         remain_sec: float = self.remain_time
         remain_day: int = int(remain_sec / 60 / 60 / 24)
@@ -126,6 +126,10 @@ class AbstractListMaker:
             f"\r進捗度|{bar}:{self.percent_progress:.1f}%  "
             f"残時間|{remain_day:.0f}日{remain_hr:.0f}時間{remain_min:.0f}分{abs(remain_sec):.0f}秒     "
         )
+        return text
+
+    def progress_bar(self) -> None:
+        text: str = self.progress_text()
         if self.assert_level != "none":
             print(text, end="")
 
@@ -0,0 +1,19 @@
+import tempfile
+from typing import IO, Iterable
+
+# Django 4.1 iterates a streamed body on the event loop under ASGI, where
+# the ORM may not run. A body that queries as it is read is written here,
+# in the thread of the view, and only the file is streamed.
+
+
+def spool_lines(lines: Iterable[str], max_size: int = 1024 * 1024) -> IO[bytes]:
+    # kept in memory up to max_size bytes, on disk beyond
+    buffer: IO[bytes] = tempfile.SpooledTemporaryFile(max_size=max_size)
+    try:
+        for line in lines:
+            buffer.write(line.encode("utf-8"))
+    except BaseException:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,112 @@
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Tuple
+
+# stages of an ingestion in the order they run
+ingest_stages: Tuple[str, ...] = ("load", "raster", "gap_fill", "tree", "classify", "persist")
+
+
+class StageRecorder:
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations.values())
+
+    def items(self) -> List[Tuple[str, float]]:
+        return list(self.durations.items())
+
+    def close(self) -> None:
+        pass
+
+
+# tracemalloc traces the whole process, and the profiled ingestions run in
+# several threads, so it is started by the first active recorder and
+# stopped by the last one.
+_tracing_lock: threading.Lock = threading.Lock()
+_tracing_users: int = 0
+_started_tracing: bool = False
+
+
+def acquire_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def release_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def get_tracing_users() -> int:
+    with _tracing_lock:
+        return _tracing_users
+
+
+class MemoryStageRecorder(StageRecorder):
+    # Sizes and peaks are of the whole process; a stage overlapping another
+    # profiled ingestion is marked 'shared', and its peak is not reset, so
+    # it may include the other ingestion or an earlier peak.
+    top_lines: int = 10
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.memory: dict[str, dict[str, Any]] = {}
+        self.tracing: bool = False
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.tracing:
+            acquire_tracing()
+            self.tracing = True
+        shared: bool = get_tracing_users() > 1
+        before: tracemalloc.Snapshot = self.take_snapshot()
+        start_size: int = tracemalloc.get_traced_memory()[0]
+        if not shared:
+            tracemalloc.reset_peak()
+        with super().stage(name):
+            yield
+        shared |= get_tracing_users() > 1
+        size, peak = tracemalloc.get_traced_memory()
+        after: tracemalloc.Snapshot = self.take_snapshot()
+        self.memory[name] = {
+            "peak_bytes": peak - start_size,
+            "retained_bytes": size - start_size,
+            "shared": shared,
+            "top_lines": [
+                {
+                    "file": stat.traceback[0].filename,
+                    "line": stat.traceback[0].lineno,
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in after.compare_to(before, "lineno")[:self.top_lines]
+            ],
+        }
+
+    def close(self) -> None:
+        if self.tracing:
+            release_tracing()
+            self.tracing = False
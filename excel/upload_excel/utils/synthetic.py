@@ -0,0 +1,95 @@
+import random
+from typing import IO, List, Tuple, Union
+
+from openpyxl import Workbook
+from openpyxl.worksheet.worksheet import Worksheet
+
+# characters of the free text, a mix like the one of real profiles
+text_chars: str = "あいうえおかきくけこ設計開発運用保守経験案件担当ABCDEFGHIJabcdefghij0123456789 "
+max_band_width: int = 8
+
+
+class WorkbookGenerator:
+    def __init__(self,
+                 rows: int = 60,
+                 columns: int = 30,
+                 merge_density: float = 0.8,
+                 text_length: int = 40,
+                 sections: int = 5,
+                 seed: int = 0) -> None:
+        # column letters of an ingestion are listed from a full alphabet
+        if columns < 26:
+            raise ValueError(f"'columns' must be 26 or more, but got {columns}.")
+        if sections < 1 or rows < sections * 2 + 2:
+            raise ValueError(f"{rows} rows cannot hold {sections} sections.")
+        if not 0.0 <= merge_density <= 1.0:
+            raise ValueError(f"'merge_density' must be within [0, 1], but got {merge_density}.")
+        self.rows: int = rows
+        self.columns: int = columns
+        self.merge_density: float = merge_density
+        self.text_length: int = text_length
+        self.sections: int = sections
+        self.random: random.Random = random.Random(seed)
+
+    @property
+    def params(self) -> dict[str, Union[int, float]]:
+        return {
+            "rows": self.rows,
+            "columns": self.columns,
+            "merge_density": self.merge_density,
+            "text_length": self.text_length,
+            "sections": self.sections,
+        }
+
+    def make_text(self) -> str:
+        size: int = self.random.randint(1, max(self.text_length, 1))
+        return "".join(self.random.choice(text_chars) for _ in range(size)).strip() or "x"
+
+    def merge(self, worksheet: Worksheet, text: str,
+              min_row: int, min_col: int, max_row: int, max_col: int) -> None:
+        worksheet.cell(row=min_row, column=min_col, value=text)
+        worksheet.merge_cells(start_row=min_row, start_column=min_col,
+                              end_row=max_row, end_column=max_col)
+
+    def split_columns(self, first_col: int, last_col: int) -> List[Tuple[int, int]]:
+        bands: List[Tuple[int, int]] = []
+        col: int = first_col
+        while col <= last_col:
+            width: int = self.random.randint(1, max_band_width)
+            if last_col - (col + width - 1) < 2:
+                width = last_col - col + 1
+            bands.append((col, col + width - 1))
+            col += width
+        return bands
+
+    def fill_body(self, worksheet: Worksheet, first_row: int, last_row: int) -> None:
+        # A section shares its columns among its rows, as forms do; a band
+        # left out of a merge keeps its text like an unmerged cell.
+        bands: List[Tuple[int, int]] = self.split_columns(2, self.columns - 1)
+        for row in range(first_row, last_row + 1):
+            for min_col, max_col in bands:
+                if min_col < max_col and self.random.random() < self.merge_density:
+                    self.merge(worksheet, self.make_text(), row, min_col, row, max_col)
+                else:
+                    worksheet.cell(row=row, column=min_col, value=self.make_text())
+
+    def create(self) -> Workbook:
+        workbook: Workbook = Workbook()
+        worksheet: Worksheet = workbook.active
+        # the first row and column are left blank as margins
+        body_rows: int = self.rows - 1
+        size: int = body_rows // self.sections
+        for n in range(self.sections):
+            title_row: int = 2 + n * size
+            last_row: int = title_row + size - 1 if n < self.sections - 1 else self.rows
+            self.merge(worksheet, f"セクション{n + 1}", title_row, 2, title_row, self.columns - 1)
+            if title_row < last_row:
+                self.fill_body(worksheet, title_row + 1, last_row)
+        # keeps the last column as a margin on the right
+        worksheet.cell(row=self.rows, column=self.columns, value=".")
+        return workbook
+
+    def save(self, fp: Union[str, IO[bytes]]) -> None:
+        workbook: Workbook = self.create()
+        workbook.save(fp)
+        workbook.close()
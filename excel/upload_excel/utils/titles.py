@@ -0,0 +1,26 @@
+from typing import List, Optional
+
+titles = [
+    "スタッフＩＤ",
+    "スペックシート", "ポートフォリオ",
+    "スキル要約", "扱ったデータ・モデル",
+    "アピールポイント", "資格",
+    "前職や研究内容など", "経験",
+    "待機期間", "業務外に取り組んでいること"
+]
+
+
+def find_title(content: Optional[str]) -> Optional[str]:
+    # The longest title wins, as a title may be a part of another one.
+    matched: List[str] = [title for title in titles if title in (content or "")]
+    if len(matched) == 0:
+        return None
+    return max(matched, key=len)
+
+
+def get_section_title(content: Optional[str], is_title: bool = False) -> Optional[str]:
+    # 'is_title' misses titles placed under other cells, so a range
+    # holding nothing but a title is taken as one too
+    if (content or "").strip() in titles:
+        return content.strip()
+    return find_title(content) if is_title else None
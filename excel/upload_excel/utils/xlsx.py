@@ -0,0 +1,254 @@
+import posixpath
+import zipfile
+from typing import IO, Any, List, Optional, Set, Tuple
+
+import numpy as np
+from openpyxl.cell.text import Text
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import (CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900,
+                                     from_excel, from_ISO8601)
+from openpyxl.xml.functions import fromstring, iterparse
+
+# Reads the values and merged ranges of the active sheet of an xlsx straight
+# from its XML, without the cell objects of openpyxl. The values are the
+# ones openpyxl gives with data_only=True; anything this reader does not
+# know raises UnsupportedWorkbook so that openpyxl reads the file instead.
+
+SHEET_MAIN_NS: str = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS: str = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+ROW_TAG: str = f"{{{SHEET_MAIN_NS}}}row"
+CELL_TAG: str = f"{{{SHEET_MAIN_NS}}}c"
+VALUE_TAG: str = f"{{{SHEET_MAIN_NS}}}v"
+INLINE_STRING_TAG: str = f"{{{SHEET_MAIN_NS}}}is"
+STRING_TAG: str = f"{{{SHEET_MAIN_NS}}}si"
+MERGE_CELL_TAG: str = f"{{{SHEET_MAIN_NS}}}mergeCell"
+HYPERLINK_TAG: str = f"{{{SHEET_MAIN_NS}}}hyperlink"
+
+data_types: Set[str] = {"n", "s", "b", "str", "d", "e", "inlineStr"}
+
+
+class UnsupportedWorkbook(Exception):
+    pass
+
+
+def cast_number(value: str) -> Any:
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def resolve_target(source: str, target: str) -> str:
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source), target))
+
+
+def get_rels_path(path: str) -> str:
+    folder, name = posixpath.split(path)
+    return posixpath.join(folder, "_rels", f"{name}.rels")
+
+
+class XlsxReader:
+    def __init__(self, archive: zipfile.ZipFile) -> None:
+        self.archive: zipfile.ZipFile = archive
+        self.names: Set[str] = set(archive.namelist())
+
+    def read_rels(self, source: str) -> dict[str, Tuple[str, str]]:
+        # id -> (type, path in the archive)
+        path: str = get_rels_path(source)
+        if path not in self.names:
+            return {}
+        rels: dict[str, Tuple[str, str]] = {}
+        for node in fromstring(self.archive.read(path)):
+            if node.get("TargetMode") == "External":
+                continue
+            rels[node.get("Id")] = (node.get("Type", ""), resolve_target(source, node.get("Target", "")))
+        return rels
+
+    def find_part(self, rels: dict[str, Tuple[str, str]], rel_type: str) -> Optional[str]:
+        for type_, path in rels.values():
+            if type_ == f"{REL_NS}/{rel_type}" and path in self.names:
+                return path
+        return None
+
+    def get_workbook_path(self) -> str:
+        for type_, path in self.read_rels("").values():
+            if type_ == f"{REL_NS}/officeDocument":
+                return path
+        raise UnsupportedWorkbook("the package has no workbook of transitional OOXML.")
+
+    def read_workbook(self, path: str) -> Tuple[dict[str, Tuple[str, str]], str, Tuple[Any, ...]]:
+        root: Any = fromstring(self.archive.read(path))
+        if root.tag != f"{{{SHEET_MAIN_NS}}}workbook":
+            raise UnsupportedWorkbook(f"{root.tag} is not a workbook.")
+        rels: dict[str, Tuple[str, str]] = self.read_rels(path)
+
+        properties: Any = root.find(f"{{{SHEET_MAIN_NS}}}workbookPr")
+        date1904: bool = properties is not None and properties.get("date1904", "0").lower() in ("1", "true")
+
+        active: int = 0
+        for view in root.iterfind(f"{{{SHEET_MAIN_NS}}}bookViews/{{{SHEET_MAIN_NS}}}workbookView"):
+            if view.get("activeTab") is not None:
+                active = int(view.get("activeTab"))
+                break
+
+        # the sheets openpyxl keeps, in the same order, so that activeTab
+        # points to the same one
+        sheets: List[Tuple[str, str]] = []
+        for sheet in root.iterfind(f"{{{SHEET_MAIN_NS}}}sheets/{{{SHEET_MAIN_NS}}}sheet"):
+            rel_id: Optional[str] = sheet.get(f"{{{REL_NS}}}id")
+            if not rel_id:
+                continue
+            if rel_id not in rels:
+                raise UnsupportedWorkbook(f"the relation {rel_id} of a sheet is missing.")
+            if rels[rel_id][1] in self.names:
+                sheets.append(rels[rel_id])
+        if not 0 <= active < len(sheets):
+            raise UnsupportedWorkbook("the active sheet does not exist.")
+        if sheets[active][0] != f"{REL_NS}/worksheet":
+            raise UnsupportedWorkbook("the active sheet is not a worksheet.")
+
+        return rels, sheets[active][1], CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+    def read_shared_strings(self, path: Optional[str]) -> List[str]:
+        strings: List[str] = []
+        if path is None:
+            return strings
+        with self.archive.open(path) as fp:
+            for _, node in iterparse(fp):
+                if node.tag == STRING_TAG:
+                    strings.append(Text.from_tree(node).content.replace("x005F_", ""))
+                    node.clear()
+        return strings
+
+    def read_date_styles(self, path: Optional[str]) -> Tuple[Set[int], Set[int]]:
+        # The stylesheet is small, so openpyxl decides which number
+        # formats are dates.
+        if path is None:
+            return set(), set()
+        stylesheet: Stylesheet = Stylesheet.from_tree(fromstring(self.archive.read(path)))
+        return set(stylesheet.date_formats), set(stylesheet.timedelta_formats)
+
+    def read_sheet(self,
+                   path: str,
+                   shared_strings: List[str],
+                   date_formats: Set[int],
+                   timedelta_formats: Set[int],
+                   epoch: Any) -> Tuple[np.ndarray, List[str]]:
+        rows: List[int] = []
+        columns: List[int] = []
+        values: List[Any] = []
+        merged_cells: List[str] = []
+        max_row: int = 0
+        max_col: int = 0
+
+        def add_bounds(ref: str) -> None:
+            nonlocal max_row, max_col
+            _, _, max_c, max_r = range_boundaries(ref)
+            max_row = max(max_row, max_r)
+            max_col = max(max_col, max_c)
+
+        row_counter: int = 0
+        with self.archive.open(path) as fp:
+            for _, node in iterparse(fp):
+                tag: str = node.tag
+                if tag == ROW_TAG:
+                    # cells are read at the end of their row, where the row
+                    # number they may leave out is known
+                    row_counter = int(node.get("r")) if node.get("r") else row_counter + 1
+                    col_counter: int = 0
+                    for element in node.iterfind(CELL_TAG):
+                        data_type: str = element.get("t", "n")
+                        if data_type not in data_types:
+                            raise UnsupportedWorkbook(f"unknown cell type {data_type}.")
+                        coordinate: Optional[str] = element.get("r")
+                        if coordinate:
+                            row, col_counter = coordinate_to_tuple(coordinate)
+                        else:
+                            col_counter += 1
+                            row = row_counter
+                        rows.append(row)
+                        columns.append(col_counter)
+                        values.append(self.read_value(element, data_type, shared_strings,
+                                                      date_formats, timedelta_formats, epoch))
+                    node.clear()
+                elif tag == MERGE_CELL_TAG:
+                    # openpyxl creates every cell of a merged range, and the
+                    # cells a hyperlink points to, so they count for the size
+                    merged_cells.append(node.get("ref"))
+                    add_bounds(node.get("ref"))
+                elif tag == HYPERLINK_TAG and node.get("ref"):
+                    add_bounds(node.get("ref"))
+
+        if len(rows) > 0:
+            max_row = max(max_row, max(rows))
+            max_col = max(max_col, max(columns))
+        grid: np.ndarray = np.full((max(max_row, 1), max(max_col, 1)), None, dtype=object)
+        if len(values) > 0:
+            cells: np.ndarray = np.empty(len(values), dtype=object)
+            cells[:] = values
+            grid[np.array(rows) - 1, np.array(columns) - 1] = cells
+
+        # as with openpyxl, only the top left cell of a merged range keeps its value
+        for ref in merged_cells:
+            min_c, min_r, max_c, max_r = range_boundaries(ref)
+            if min_c == max_c and min_r == max_r:
+                continue
+            top_left: Any = grid[min_r - 1, min_c - 1]
+            grid[min_r - 1:max_r, min_c - 1:max_c] = None
+            grid[min_r - 1, min_c - 1] = top_left
+
+        return grid, merged_cells
+
+    def read_value(self,
+                   element: Any,
+                   data_type: str,
+                   shared_strings: List[str],
+                   date_formats: Set[int],
+                   timedelta_formats: Set[int],
+                   epoch: Any) -> Any:
+        if data_type == "inlineStr":
+            child: Any = element.find(INLINE_STRING_TAG)
+            return Text.from_tree(child).content if child is not None else None
+
+        value: Optional[str] = element.findtext(VALUE_TAG, None) or None
+        if value is None:
+            return None
+        if data_type == "n":
+            style_id: int = int(element.get("s") or 0)
+            number: Any = cast_number(value)
+            if style_id not in date_formats:
+                return number
+            try:
+                return from_excel(number, epoch, timedelta=style_id in timedelta_formats)
+            except (OverflowError, ValueError):
+                return "#VALUE!"
+        if data_type == "s":
+            return shared_strings[int(value)]
+        if data_type == "b":
+            return bool(int(value))
+        if data_type == "d":
+            return from_ISO8601(value)
+        return value
+
+    def read_active_sheet(self) -> Tuple[np.ndarray, List[str]]:
+        workbook_path: str = self.get_workbook_path()
+        rels, sheet_path, epoch = self.read_workbook(workbook_path)
+        shared_strings: List[str] = self.read_shared_strings(self.find_part(rels, "sharedStrings"))
+        date_formats, timedelta_formats = self.read_date_styles(self.find_part(rels, "styles"))
+        return self.read_sheet(sheet_path, shared_strings, date_formats, timedelta_formats, epoch)
+
+
+def read_active_sheet(binary: IO[bytes]) -> Tuple[np.ndarray, List[str]]:
+    # Returns the values of the active sheet as an object array, blank
+    # cells as None, and the references of its merged ranges.
+    try:
+        with zipfile.ZipFile(binary) as archive:
+            return XlsxReader(archive).read_active_sheet()
+    except UnsupportedWorkbook:
+        raise
+    except (zipfile.BadZipFile, KeyError, IndexError, ValueError, TypeError, SyntaxError) as e:
+        # broken or unusual parts; SyntaxError covers the XML parse errors
+        raise UnsupportedWorkbook(str(e)) from e
@@ -1,15 +1,28 @@
+import json
 import string
-from typing import Any, Callable, List, Optional, Tuple, TypeVar, Union
+from typing import (Any, Callable, Iterable, Iterator, List, Optional, Tuple,
+                    TypeVar, Union)
 
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse
+from django.http import (FileResponse, Http404, HttpRequest, HttpResponse,
+                         JsonResponse)
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
-from django.views.generic import TemplateView
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_protect
+from django.views.generic import TemplateView, View
+from upload_excel.conditions import async_sheet_condition, sheet_condition
+from upload_excel.diff import diff_sheets
 from upload_excel.forms import ColumnForm, ContentForm, RowForm, UploadForm
 from upload_excel.models import (CellRangeModel, ColumnModel, ContentModel,
                                  ExcelSheetModel, RowModel)
+from upload_excel.search import search_cells
+from upload_excel.transfer import transfer_contents
 from upload_excel.utils.sort import A2ZListMaker
+from upload_excel.utils.spool import spool_lines
+from upload_excel.workers import run_in_worker
 
 _QS = TypeVar("_QS", bound=QuerySet)
 _CONTENT = TypeVar("_CONTENT", bound=Union[ColumnModel, ContentModel, RowModel])
@@ -76,22 +89,20 @@ class UploadExcelView(TemplateView):
     # -> 下/右に分けて、それぞれ横/縦のサイズを決定する; 基本的には上側/左側の方が大きいことを利用する
     # なぜやるか; html表示にする際に表として表示したかったのだが、最小サイズ以外だと下に欲しい項目が横に来ることがあったため。しね。
     def _make_display_context(self,
-                              excel_sheet_model: ExcelSheetModel) -> List[str]:
+                              excel_sheet_model: ExcelSheetModel,
+                              cell_ranges: Optional[Iterable[CellRangeModel]] = None) -> List[str]:
         excel_col_order: List[str] = self.get_excel_col_size(excel_sheet_model)
-        cell_ranges: _QS = excel_sheet_model.cell_ranges.all()
+        if cell_ranges is None:
+            cell_ranges = excel_sheet_model.cell_ranges.all()
         output: dict[int, List[dict[str, _CONTENT]]] = {}
         _out: dict[str, _CONTENT]
         for merged_cell in cell_ranges:
-            _out = {"merged_cell": merged_cell}
-
-            column = merged_cell.columns.filter(cell_range=merged_cell).all().last()
-            _out["column"] = column
-
-            row = merged_cell.rows.filter(cell_range=merged_cell).all().last()
-            _out["row"] = row
-
-            content = merged_cell.content.filter(cell_range=merged_cell).all().last()
-            _out["content"] = content
+            _out = {
+                "merged_cell": merged_cell,
+                "column": merged_cell.column,
+                "row": merged_cell.row,
+                "content": merged_cell.content,
+            }
 
             coord = int(_out["row"].cell_start)
             if coord not in output:
@@ -127,6 +138,7 @@ class UploadExcelView(TemplateView):
 
 
 
+@sheet_condition
 class CellUploadView(UploadExcelView):
     template_name:str = "upload_excel/upload.html"
     success_url: str = reverse_lazy("upload_excel:upload")
@@ -158,37 +170,34 @@ class CellUpdateView(UploadExcelView):
         url: str = self._get_url(kwargs)
         return reverse_lazy(url, kwargs=kwargs)
 
-    def get_cell_range_from_db(self, cell_id: int, cell_uuid: str) -> Tuple[str, str]:
-        cell_range: CellRangeModel = CellRangeModel.objects.\
-            get(cell_range_id_by_order=cell_id, cell_range_id=cell_uuid)
-        row_data: RowModel = RowModel.objects.get(cell_range=cell_range)
-        col_data: ColumnModel = ColumnModel.objects.get(cell_range=cell_range)
-
-        start: str = col_data.cell_start + row_data.cell_start
-        end: str = col_data.cell_end + row_data.cell_end
-        return (start, end)
-
-    def get_cell_text_from_db(self, cell_id: int, cell_uuid: str) -> str:
-        cell_range: CellRangeModel = CellRangeModel.objects.\
-            get(cell_range_id_by_order=cell_id, cell_range_id=cell_uuid)
-        content: ContentModel = ContentModel.objects.get(cell_range=cell_range)
-
-        return content.cell_content
+    def get_content_lookup(self) -> dict[str, Any]:
+        # An edit bumps the version of the sheet of the URL, so the cell
+        # must belong to it.
+        return {"excel_sheet__sheet_id": self.kwargs["user_id"],
+                "cell_range_id_by_order": self.kwargs["cell_id"],
+                "cell_range_id": self.kwargs["cell_uuid"]}
+
+    def get_content_from_db(self) -> ContentModel:
+        try:
+            return ContentModel.objects.select_related("excel_sheet").get(**self.get_content_lookup())
+        except (ContentModel.DoesNotExist, ValidationError):
+            raise Http404("No cell of the sheet matches the given query.")
+
+    async def aget_content_from_db(self) -> ContentModel:
+        try:
+            return await ContentModel.objects.select_related("excel_sheet").aget(**self.get_content_lookup())
+        except (ContentModel.DoesNotExist, ValidationError):
+            raise Http404("No cell of the sheet matches the given query.")
 
     def post(self, request: HttpRequest, *args, **kwargs):
         context: dict[str, Any] = self._get_basic_context()
         if request.method == "POST":
-            user_id: str = self.kwargs["user_id"]
-            cell_id: str = self.kwargs["cell_id"]
-            cell_uuid: str = self.kwargs["cell_uuid"]
-            cell_range: CellRangeModel = CellRangeModel.objects.\
-                get(cell_range_id_by_order=cell_id, cell_range_id=cell_uuid)
-            content: ContentModel = ContentModel.objects.get(cell_range=cell_range)
+            content: ContentModel = self.get_content_from_db()
             form = self.form_class(request.POST, initial_text=content.cell_content, instance=content)
+            esm: ExcelSheetModel = content.excel_sheet
             if form.is_valid():
-                form.save()
+                esm.update_contents([form.save(commit=False)])
 
-            esm: ExcelSheetModel = ExcelSheetModel.objects.get(sheet_id=user_id)
             context["excel_id"] = esm.sheet_id
             context["display"] = self._make_display_context(esm)
 
@@ -198,11 +207,83 @@ class CellUpdateView(UploadExcelView):
             *args: Tuple[Any, ...],
             **kwargs: dict[str, Any]) -> HttpResponse:
         context: dict[str, Any] = self._get_basic_context()
-        args: Tuple[str, str] = context["cell_id"], context["cell_uuid"]
-        context["cell"] = self.get_cell_range_from_db(*args)
-        context["content"] = self.form_class(initial_text=self.get_cell_text_from_db(*args))
+        content: ContentModel = self.get_content_from_db()
+        context["cell"] = (content.column_start + content.row_start,
+                           content.column_end + content.row_end)
+        context["content"] = self.form_class(initial_text=content.cell_content)
         return render(request, self.template_name, context)
 
+def get_sheet_or_404(sheet_id: str) -> ExcelSheetModel:
+    # The routes take any string as a sheet id; one that is not a UUID is
+    # missing like an unknown one.
+    try:
+        return ExcelSheetModel.objects.get(sheet_id=sheet_id)
+    except (ExcelSheetModel.DoesNotExist, ValidationError):
+        raise Http404(f"No such sheet; '{sheet_id}'.")
+
+
+async def aget_cell_ranges(excel_sheet_model: ExcelSheetModel) -> List[CellRangeModel]:
+    # The texts are joined by the manager, so no lazy query is left for
+    # the template, which may not touch the ORM in an async context.
+    return [cell_range async for cell_range in excel_sheet_model.cell_ranges.all()]
+
+
+class AsyncUploadExcelView(UploadExcelView):
+    url_tmp: str = "upload_excel:upload"
+
+    async def post(self, request: HttpRequest, *args, **kwargs):
+        esm: ExcelSheetModel = await run_in_worker(ExcelSheetModel.create_model,
+                                                   request,
+                                                   file_key="file",
+                                                   sheet_type="profile")
+        url = reverse_lazy(self.url_tmp, kwargs={"user_id": esm.sheet_id})
+        return redirect(url)
+
+    async def get(self, request: HttpRequest,
+                  *args: Tuple[Any, ...],
+                  **kwargs: dict[str, Any]) -> HttpResponse:
+        return UploadExcelView.get(self, request, *args, **kwargs)
+
+
+class AsyncCellUploadView(AsyncUploadExcelView, CellUploadView):
+    @async_sheet_condition
+    async def get(self, request: HttpRequest,
+                  *args: Tuple[Any, ...],
+                  **kwargs: dict[str, Any]) -> HttpResponse:
+        context: dict[str, Any] = self._get_basic_context()
+        esm: ExcelSheetModel = await ExcelSheetModel.objects.aget(sheet_id=self.kwargs["user_id"])
+        cell_ranges: List[CellRangeModel] = await aget_cell_ranges(esm)
+        context["excel_id"] = esm.sheet_id
+        # arranging and rendering a large sheet are left to a worker
+        context["display"] = await run_in_worker(self._make_display_context, esm, cell_ranges)
+        return await run_in_worker(render, request, self.template_name, context=context)
+
+
+class AsyncCellUpdateView(CellUpdateView):
+    async def post(self, request: HttpRequest, *args, **kwargs):
+        context: dict[str, Any] = self._get_basic_context()
+        content: ContentModel = await self.aget_content_from_db()
+        esm: ExcelSheetModel = content.excel_sheet
+        form = self.form_class(request.POST, initial_text=content.cell_content, instance=content)
+        if await sync_to_async(form.is_valid)():
+            await sync_to_async(esm.update_contents)([form.save(commit=False)])
+
+        cell_ranges: List[CellRangeModel] = await aget_cell_ranges(esm)
+        context["excel_id"] = esm.sheet_id
+        context["display"] = await run_in_worker(self._make_display_context, esm, cell_ranges)
+        return await run_in_worker(render, request, "upload_excel/upload.html", context=context)
+
+    async def get(self, request: HttpRequest,
+                  *args: Tuple[Any, ...],
+                  **kwargs: dict[str, Any]) -> HttpResponse:
+        context: dict[str, Any] = self._get_basic_context()
+        content: ContentModel = await self.aget_content_from_db()
+        context["cell"] = (content.column_start + content.row_start,
+                           content.column_end + content.row_end)
+        context["content"] = self.form_class(initial_text=content.cell_content)
+        return render(request, self.template_name, context)
+
+
 class DisplaySheetView(TemplateView):
     form_class = UploadForm
     template_name = "upload_excel/upload.html"
@@ -218,3 +299,268 @@ class DisplaySheetView(TemplateView):
             **kwargs: dict[str, Any]) -> HttpResponse:
         context: dict[str, Any] = self._get_basic_context()
         return render(request, self.template_name, context=context)
+
+
+@sheet_condition
+class SheetRangesStreamView(View):
+    content_type: str = "application/x-ndjson"
+    chunk_size: int = 2000
+    # the lines are assembled on disk beyond this size
+    spool_size: int = 1024 * 1024
+    truthy: Tuple[str, ...] = ("1", "true", "True")
+    falsy: Tuple[str, ...] = ("0", "false", "False")
+
+    def get_flags(self, request: HttpRequest) -> dict[str, bool]:
+        flags: dict[str, bool] = {}
+        for flag in CellRangeModel.flag_names:
+            val: Optional[str] = request.GET.get(flag, None)
+            if val is None:
+                continue
+            if val in self.truthy:
+                flags[flag] = True
+            elif val in self.falsy:
+                flags[flag] = False
+            else:
+                raise ValueError(
+                    f"'{flag}' must be one of {self.truthy + self.falsy}, but got '{val}'."
+                )
+        return flags
+
+    def get_version(self, request: HttpRequest, esm: ExcelSheetModel) -> Optional[int]:
+        val: Optional[str] = request.GET.get("version", None)
+        if val is None:
+            return None
+        try:
+            version: int = int(val)
+        except ValueError:
+            version = -1
+        if not (1 <= version <= esm.sheet_version):
+            raise ValueError(f"'version' must be an integer from 1 to {esm.sheet_version}, but got '{val}'.")
+        return version
+
+    def stream_lines(self, records: Iterator[dict[str, Any]]) -> Iterator[str]:
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        try:
+            esm: ExcelSheetModel = get_sheet_or_404(self.kwargs["user_id"])
+        except Http404 as e:
+            return JsonResponse({"error": str(e)}, status=404)
+        try:
+            flags: dict[str, bool] = self.get_flags(request)
+            version: Optional[int] = self.get_version(request, esm)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        records: Iterator[dict[str, Any]] = CellRangeModel.\
+            iter_records(esm, chunk_size=self.chunk_size, version=version, **flags)
+        return FileResponse(spool_lines(self.stream_lines(records), self.spool_size),
+                            content_type=self.content_type)
+
+
+# The JSON APIs keep the CSRF check of the forms. A tool reads the
+# 'csrftoken' cookie a page sets, e.g. the index, and sends it back in the
+# X-CSRFToken header; over HTTPS, with a Referer or Origin of this site.
+json_api = method_decorator(csrf_protect, name="dispatch")
+
+
+@json_api
+class CellBatchUpdateView(View):
+    form_class = ContentForm
+    edit_keys: Tuple[str, ...] = ("cell_range_id_by_order", "cell_range_id", "text")
+    max_edits: int = 1000
+
+    def parse_edits(self, request: HttpRequest) -> List[dict[str, Any]]:
+        try:
+            body: Any = json.loads(request.body)
+        except ValueError:
+            raise ValueError("A request body must be JSON.")
+
+        edits: Any = body.get("cells", None) if isinstance(body, dict) else body
+        if not isinstance(edits, list) or len(edits) == 0:
+            raise ValueError("'cells' must be a non-empty list of edits.")
+        if len(edits) > self.max_edits:
+            raise ValueError(f"At most {self.max_edits} cells can be edited at once.")
+
+        for edit in edits:
+            if not isinstance(edit, dict) or any(key not in edit for key in self.edit_keys):
+                raise ValueError(f"Each edit must have {self.edit_keys}.")
+            try:
+                edit["cell_range_id_by_order"] = int(edit["cell_range_id_by_order"])
+            except (TypeError, ValueError):
+                raise ValueError("'cell_range_id_by_order' must be an integer.")
+        return edits
+
+    def get_contents(self,
+                     esm: ExcelSheetModel,
+                     edits: List[dict[str, Any]]
+                     ) -> dict[Tuple[int, str], ContentModel]:
+        contents: _QS = ContentModel.objects.\
+            filter(excel_sheet=esm,
+                   cell_range_id_by_order__in=[edit["cell_range_id_by_order"] for edit in edits])
+        return {
+            (content.cell_range_id_by_order, str(content.cell_range_id)): content
+            for content in contents
+        }
+
+    def validate(self,
+                 esm: ExcelSheetModel,
+                 edits: List[dict[str, Any]]
+                 ) -> Tuple[List[ContentModel], dict[str, Any]]:
+        contents: dict[Tuple[int, str], ContentModel] = self.get_contents(esm, edits)
+        output: List[ContentModel] = []
+        errors: dict[str, Any] = {}
+        seen: set = set()
+        for idx, edit in enumerate(edits):
+            key: Tuple[int, str] = (edit["cell_range_id_by_order"], str(edit["cell_range_id"]))
+            if key not in contents:
+                errors[str(idx)] = {"cell_range_id": [{"message": "No such cell range in the sheet."}]}
+                continue
+            # a range is saved and recorded in the history once per version
+            if key in seen:
+                errors[str(idx)] = {"cell_range_id": [{"message": "The cell range is edited twice in the batch."}]}
+                continue
+            seen.add(key)
+
+            content: ContentModel = contents[key]
+            form: ContentForm = self.form_class({"cell_content": edit["text"]}, instance=content)
+            if not form.is_valid():
+                errors[str(idx)] = form.errors.get_json_data()
+                continue
+            output.append(form.save(commit=False))
+        return output, errors
+
+    def post(self, request: HttpRequest,
+             *args: Tuple[Any, ...],
+             **kwargs: dict[str, Any]) -> HttpResponse:
+        try:
+            esm: ExcelSheetModel = get_sheet_or_404(self.kwargs["user_id"])
+        except Http404 as e:
+            return JsonResponse({"error": str(e)}, status=404)
+        try:
+            edits: List[dict[str, Any]] = self.parse_edits(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        contents, errors = self.validate(esm, edits)
+        if len(errors) > 0:
+            return JsonResponse({"errors": errors}, status=400)
+
+        esm.update_contents(contents)
+        return JsonResponse({
+            "updated": len(contents),
+            "sheet_version": esm.sheet_version,
+        })
+
+
+class CellSearchView(View):
+    per_page: int = 20
+    max_per_page: int = 100
+
+    def get_page(self, request: HttpRequest) -> Tuple[int, int]:
+        try:
+            page: int = int(request.GET.get("page", 1))
+            per_page: int = int(request.GET.get("per_page", self.per_page))
+        except ValueError:
+            raise ValueError("'page' and 'per_page' must be integers.")
+        if page < 1 or not (0 < per_page <= self.max_per_page):
+            raise ValueError(
+                f"'page' must be 1 or bigger and 'per_page' must be in 1 to {self.max_per_page}."
+            )
+        return page, per_page
+
+    def group_by_sheet(self, cells: List[dict[str, Any]]) -> List[dict[str, Any]]:
+        # cells are ranked already, so a sheet is ranked by its best cell.
+        output: dict[str, dict[str, Any]] = {}
+        for cell in cells:
+            sheet: dict[str, Any] = output.setdefault(
+                cell["sheet_id"], {"sheet_id": cell["sheet_id"], "rank": cell["rank"], "hits": 0}
+            )
+            sheet["hits"] += 1
+        return list(output.values())
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        query: str = request.GET.get("q", "").strip()
+        try:
+            page, per_page = self.get_page(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        cells, has_next = search_cells(query, page=page, per_page=per_page)
+        return JsonResponse({
+            "query": query,
+            "page": page,
+            "per_page": per_page,
+            "has_next": has_next,
+            "sheets": self.group_by_sheet(cells),
+            "cells": cells,
+        }, json_dumps_params={"ensure_ascii": False})
+
+
+@json_api
+class SheetTransferView(View):
+    def get_source(self, request: HttpRequest) -> ExcelSheetModel:
+        try:
+            body: Any = json.loads(request.body) if request.content_type == "application/json" else request.POST
+        except ValueError:
+            raise ValueError("A request body must be JSON.")
+
+        source_id: Any = body.get("source", None) if hasattr(body, "get") else None
+        if not source_id:
+            raise ValueError("'source' must be the sheet_id of a sheet to copy from.")
+        try:
+            return ExcelSheetModel.objects.get(sheet_id=source_id)
+        except (ExcelSheetModel.DoesNotExist, ValidationError):
+            raise ValueError(f"No such sheet; '{source_id}'.")
+
+    def post(self, request: HttpRequest,
+             *args: Tuple[Any, ...],
+             **kwargs: dict[str, Any]) -> HttpResponse:
+        try:
+            esm: ExcelSheetModel = get_sheet_or_404(self.kwargs["user_id"])
+        except Http404 as e:
+            return JsonResponse({"error": str(e)}, status=404)
+        try:
+            source: ExcelSheetModel = self.get_source(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        updated: int = transfer_contents(source, esm)
+        return JsonResponse({
+            "source": str(source.sheet_id),
+            "updated": updated,
+            "sheet_version": esm.sheet_version,
+        })
+
+
+class SheetDiffView(TemplateView):
+    template_name: str = "upload_excel/diff.html"
+    kinds: Tuple[str, ...] = ("added", "removed", "moved", "edited")
+
+    def wants_json(self, request: HttpRequest) -> bool:
+        return request.GET.get("format", "") == "json" or \
+            "application/json" in request.headers.get("Accept", "")
+
+    def get(self, request: HttpRequest,
+            *args: Tuple[Any, ...],
+            **kwargs: dict[str, Any]) -> HttpResponse:
+        old: ExcelSheetModel = get_sheet_or_404(self.kwargs["user_id"])
+        new: ExcelSheetModel = get_sheet_or_404(self.kwargs["other_id"])
+        diff: dict[str, List[dict[str, Any]]] = diff_sheets(old, new)
+        if self.wants_json(request):
+            return JsonResponse({
+                "old": str(old.sheet_id),
+                "new": str(new.sheet_id),
+                **diff,
+            }, json_dumps_params={"ensure_ascii": False})
+
+        context: dict[str, Any] = self.get_context_data(**kwargs)
+        context["old"] = old
+        context["new"] = new
+        context["diff"] = [(kind, diff[kind]) for kind in self.kinds]
+        return render(request, self.template_name, context)
@@ -0,0 +1,38 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional, TypeVar
+
+from django.conf import settings
+from django.db import connections
+
+_R = TypeVar("_R")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Parsing and exporting are bounded by INGEST_WORKERS, so a burst of
+    # uploads queues up instead of starving the event loop's own threads.
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.INGEST_WORKERS,
+                                       thread_name_prefix="ingest")
+    return _executor
+
+
+def _call_and_close(func: Callable[..., _R], *args: Any, **kwargs: Any) -> _R:
+    # a worker thread opens its own DB connection, which is not reused
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+async def run_in_worker(func: Callable[..., _R], *args: Any, **kwargs: Any) -> _R:
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    # run_in_executor drops the context, which carries the request's metrics
+    context: contextvars.Context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(),
+                                      partial(context.run, _call_and_close, func, *args, **kwargs))